@@ -21,8 +21,10 @@ datastore.
 """
 
 import base64
+import functools
 import time
 
+from eventlet import greenpool
 from oslo.config import cfg
 
 from nova.api.ec2 import ec2utils
@@ -85,6 +87,10 @@ LOG = logging.getLogger(__name__)
 
 QUOTAS = quota.QUOTAS
 
+# Maximum number of volumes fetched at the same time when describing
+# instances.
+_VOLUME_GET_CONCURRENCY = 10
+
 
 def validate_ec2_id(val):
     if not validator.validate_str()(val):
@@ -227,14 +233,25 @@ class CloudController(object):
     def __str__(self):
         return 'CloudController'
 
+    @staticmethod
+    def _ec2_inst_ids_to_uuids(context, ec2_ids):
+        """Convert instance ids to uuids, failing if one is not found."""
+        instance_uuids = ec2utils.ec2_inst_ids_to_uuids(context, ec2_ids)
+        for ec2_id in ec2_ids:
+            if ec2_id not in instance_uuids:
+                raise exception.InstanceNotFound(instance_id=ec2_id)
+        return instance_uuids
+
     def _enforce_valid_instance_ids(self, context, instance_ids):
         # NOTE(mikal): Amazon's implementation of the EC2 API requires that
         # _all_ instance ids passed in be valid.
         instances = {}
         if instance_ids:
+            instance_uuids = self._ec2_inst_ids_to_uuids(context,
+                                                         instance_ids)
             for ec2_id in instance_ids:
-                instance_uuid = ec2utils.ec2_inst_id_to_uuid(context, ec2_id)
-                instance = self.compute_api.get(context, instance_uuid)
+                instance = self.compute_api.get(context,
+                                                instance_uuids[ec2_id])
                 instances[ec2_id] = instance
         return instances
 
@@ -1034,14 +1051,52 @@ class CloudController(object):
             instances_set.append(i)
         return {'instancesSet': instances_set}
 
+    def _get_instances_bdms(self, context, instance_uuids):
+        """Load the block device mappings of several instances at once.
+
+        Returns the legacy block device mappings by instance uuid, the
+        volumes they attach by volume id, and the ec2 ids of these volumes
+        by volume id.
+        """
+        bdms = db.block_device_mapping_get_all_by_instance_uuids(
+                context, instance_uuids)
+        volume_ids = set()
+        for instance_uuid in bdms:
+            bdms[instance_uuid] = block_device.legacy_mapping(
+                    bdms[instance_uuid])
+            for bdm in bdms[instance_uuid]:
+                if bdm['volume_id'] is not None and not bdm['no_device']:
+                    volume_ids.add(bdm['volume_id'])
+
+        # NOTE: The volume API cannot get several volumes by id, and
+        # listing all the volumes of the project costs more than getting
+        # the few the instances use, so they are fetched concurrently.
+        volume_ids = list(volume_ids)
+        pool = greenpool.GreenPool(_VOLUME_GET_CONCURRENCY)
+        volumes = dict(zip(volume_ids, pool.imap(
+                functools.partial(self.volume_api.get, context), volume_ids)))
+
+        ec2_volume_ids = ec2utils.id_to_ec2_vol_ids(volume_ids)
+        return bdms, volumes, ec2_volume_ids
+
     def _format_instance_bdm(self, context, instance_uuid, root_device_name,
-                             result):
-        """Format InstanceBlockDeviceMappingResponseItemType."""
+                             result, bdms=None, volumes=None,
+                             ec2_volume_ids=None):
+        """Format InstanceBlockDeviceMappingResponseItemType.
+
+        bdms, volumes and ec2_volume_ids are the values returned by
+        _get_instances_bdms() for this instance, when it was called for
+        several instances.  Otherwise they are loaded here.
+        """
+        if bdms is None:
+            bdms = block_device.legacy_mapping(
+                db.block_device_mapping_get_all_by_instance(context,
+                                                            instance_uuid))
+        volumes = volumes or {}
+        ec2_volume_ids = ec2_volume_ids or {}
         root_device_type = 'instance-store'
         mapping = []
-        for bdm in block_device.legacy_mapping(
-            db.block_device_mapping_get_all_by_instance(context,
-                                                        instance_uuid)):
+        for bdm in bdms:
             volume_id = bdm['volume_id']
             if (volume_id is None or bdm['no_device']):
                 continue
@@ -1051,10 +1106,15 @@ class CloudController(object):
                 assert not bdm['virtual_name']
                 root_device_type = 'ebs'
 
-            vol = self.volume_api.get(context, volume_id)
+            vol = volumes.get(volume_id)
+            if vol is None:
+                vol = self.volume_api.get(context, volume_id)
             LOG.debug(_("vol = %s\n"), vol)
+            ec2_volume_id = ec2_volume_ids.get(volume_id)
+            if ec2_volume_id is None:
+                ec2_volume_id = ec2utils.id_to_ec2_vol_id(volume_id)
             # TODO(yamahata): volume attach time
-            ebs = {'volumeId': ec2utils.id_to_ec2_vol_id(volume_id),
+            ebs = {'volumeId': ec2_volume_id,
                    'deleteOnTermination': bdm['delete_on_termination'],
                    'attachTime': vol['attach_time'] or '',
                    'status': vol['attach_status'], }
@@ -1099,15 +1159,17 @@ class CloudController(object):
         # NOTE(vish): instance_id is an optional list of ids to filter by
         if instance_id:
             instances = []
+            instance_uuids = ec2utils.ec2_inst_ids_to_uuids(
+                    context, [ec2_id for ec2_id in instance_id
+                              if ec2_id not in instances_cache])
             for ec2_id in instance_id:
                 if ec2_id in instances_cache:
                     instances.append(instances_cache[ec2_id])
-                else:
+                elif ec2_id in instance_uuids:
                     try:
-                        instance_uuid = ec2utils.ec2_inst_id_to_uuid(context,
-                                                                     ec2_id)
-                        instance = self.compute_api.get(context, instance_uuid,
-                                                        want_objects=True)
+                        instance = self.compute_api.get(
+                                context, instance_uuids[ec2_id],
+                                want_objects=True)
                     except exception.NotFound:
                         continue
                     instances.append(instance)
@@ -1122,18 +1184,37 @@ class CloudController(object):
             except exception.NotFound:
                 instances = []
 
+        if not context.is_admin:
+            instances = [instance for instance in instances
+                         if not pipelib.is_vpn_image(instance['image_ref'])]
+
+        # NOTE: Load what is not part of the instances for the whole result
+        # set up front, rather than making several queries per instance.
+        instance_uuids = [instance['uuid'] for instance in instances]
+        ec2_instance_ids = ec2utils.id_to_ec2_inst_ids(instance_uuids)
+        image_uuids = set()
+        for instance in instances:
+            image_uuids.add(instance['image_ref'])
+            image_uuids.update(image_uuid for image_uuid in
+                               (instance['kernel_id'], instance['ramdisk_id'])
+                               if image_uuid)
+        image_ids = ec2utils.glance_ids_to_ids(context, image_uuids)
+        bdms, volumes, ec2_volume_ids = self._get_instances_bdms(
+                context, instance_uuids)
+        zones = {}
+
         for instance in instances:
-            if not context.is_admin:
-                if pipelib.is_vpn_image(instance['image_ref']):
-                    continue
             i = {}
             instance_uuid = instance['uuid']
-            ec2_id = ec2utils.id_to_ec2_inst_id(instance_uuid)
-            i['instanceId'] = ec2_id
+            i['instanceId'] = ec2_instance_ids[instance_uuid]
             image_uuid = instance['image_ref']
-            i['imageId'] = ec2utils.glance_id_to_ec2_id(context, image_uuid)
-            self._format_kernel_id(context, instance, i, 'kernelId')
-            self._format_ramdisk_id(context, instance, i, 'ramdiskId')
+            i['imageId'] = ec2utils.image_ec2_id(image_ids[image_uuid])
+            if instance['kernel_id']:
+                i['kernelId'] = ec2utils.image_ec2_id(
+                        image_ids[instance['kernel_id']], 'aki')
+            if instance['ramdisk_id']:
+                i['ramdiskId'] = ec2utils.image_ec2_id(
+                        image_ids[instance['ramdisk_id']], 'ari')
             i['instanceState'] = _state_description(
                 instance['vm_state'], instance['shutdown_terminate'])
 
@@ -1160,7 +1241,8 @@ class CloudController(object):
             for k, v in utils.instance_meta(instance).iteritems():
                 i['tagSet'].append({'key': k, 'value': v})
 
-            client_token = self._get_client_token(context, instance_uuid)
+            client_token = utils.instance_sys_meta(instance).get(
+                    'EC2_client_token')
             if client_token:
                 i['clientToken'] = client_token
 
@@ -1174,11 +1256,15 @@ class CloudController(object):
             i['launchTime'] = instance['created_at']
             i['amiLaunchIndex'] = instance['launch_index']
             self._format_instance_root_device_name(instance, i)
-            self._format_instance_bdm(context, instance['uuid'],
-                                      i['rootDeviceName'], i)
+            self._format_instance_bdm(context, instance_uuid,
+                                      i['rootDeviceName'], i,
+                                      bdms=bdms[instance_uuid],
+                                      volumes=volumes,
+                                      ec2_volume_ids=ec2_volume_ids)
             host = instance['host']
-            zone = ec2utils.get_availability_zone_by_host(host)
-            i['placement'] = {'availabilityZone': zone}
+            if host not in zones:
+                zones[host] = ec2utils.get_availability_zone_by_host(host)
+            i['placement'] = {'availabilityZone': zones[host]}
             if instance['reservation_id'] not in reservations:
                 r = {}
                 r['reservationId'] = instance['reservation_id']
@@ -1344,11 +1430,6 @@ class CloudController(object):
                     context, instance_uuid, {'EC2_client_token': client_token},
                     delete=False)
 
-    def _get_client_token(self, context, instance_uuid):
-        """Get client token for a given instance."""
-        sys_meta = db.instance_system_metadata_get(context, instance_uuid)
-        return sys_meta.get('EC2_client_token')
-
     def _remove_client_token(self, context, instance_ids):
         """Remove client token to reservation ID mapping."""
 
@@ -1381,7 +1462,9 @@ class CloudController(object):
         extra = ['system_metadata', 'metadata']
         for ec2_id in instance_id:
             validate_ec2_id(ec2_id)
-            instance_uuid = ec2utils.ec2_inst_id_to_uuid(context, ec2_id)
+        instance_uuids = self._ec2_inst_ids_to_uuids(context, instance_id)
+        for ec2_id in instance_id:
+            instance_uuid = instance_uuids[ec2_id]
             if objects:
                 instance = instance_obj.Instance.get_by_uuid(
                     context, instance_uuid, expected_attrs=extra)
@@ -14,9 +14,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import functools
 import re
 
+from oslo.config import cfg
+
 from nova import availability_zones
 from nova import context
 from nova import db
@@ -25,32 +28,121 @@ from nova.network import model as network_model
 from nova.objects import instance as instance_obj
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 from nova.openstack.common import timeutils
 from nova.openstack.common import uuidutils
 
+ec2utils_opts = [
+    cfg.IntOpt('ec2_id_mapping_cache_size',
+               default=100000,
+               help='Number of mappings between uuids and ec2 ids cached '
+                    'by each API process. The mappings never change, so '
+                    'they are only evicted when the cache is full'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(ec2utils_opts)
+
 LOG = logging.getLogger(__name__)
-# NOTE(vish): cache mapping for one week
-_CACHE_TIME = 7 * 24 * 60 * 60
 _CACHE = None
 
+# Memoized functions resolving the two directions of the same mappings.
+# Resolving one direction caches the other as well.
+_REVERSE_FUNCTIONS = {}
+for _names in (('glance_id_to_id', 'id_to_glance_id'),
+               ('get_int_id_from_instance_uuid',
+                'get_instance_uuid_from_int_id'),
+               ('get_int_id_from_volume_uuid', 'get_volume_uuid_from_int_id'),
+               ('get_int_id_from_snapshot_uuid',
+                'get_snapshot_uuid_from_int_id')):
+    _REVERSE_FUNCTIONS[_names[0]] = _names[1]
+    _REVERSE_FUNCTIONS[_names[1]] = _names[0]
+del _names
+
+
+class LRUCache(object):
+    """Cache of a bounded size, evicting the least recently used keys.
+
+    The ec2 id mappings never expire, so unlike memorycache there is no
+    expiry time to check, and getting a key does not scan the whole cache.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._items = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        value = self._items.pop(key, None)
+        if value is not None:
+            self._items[key] = value
+        return value
+
+    def set(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+
+def _get_cache():
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = LRUCache(CONF.ec2_id_mapping_cache_size)
+    return _CACHE
+
+
+def _cache_key(name, reqid):
+    return str("%s:%s" % (name, reqid))
+
+
+def _cache_set(cache, name, reqid, value):
+    if value is None:
+        return
+    cache.set(_cache_key(name, reqid), value)
+    reverse_name = _REVERSE_FUNCTIONS.get(name)
+    if reverse_name is not None and reqid is not None:
+        cache.set(_cache_key(reverse_name, value), reqid)
+
 
 def memoize(func):
     @functools.wraps(func)
     def memoizer(context, reqid):
-        global _CACHE
-        if not _CACHE:
-            _CACHE = memorycache.get_client()
-        key = "%s:%s" % (func.__name__, reqid)
-        key = str(key)
-        value = _CACHE.get(key)
+        cache = _get_cache()
+        value = cache.get(_cache_key(func.__name__, reqid))
         if value is None:
             value = func(context, reqid)
-            _CACHE.set(key, value, time=_CACHE_TIME)
+            _cache_set(cache, func.__name__, reqid, value)
         return value
     return memoizer
 
 
+def memoize_many(name, reqids, lookup):
+    """Resolve several ids, sharing the cache of a memoized function.
+
+    name is the name of the memoized function resolving a single id.  lookup
+    is called once with the list of the ids missing from the cache, and
+    returns a dict of their values.  Returns a dict of the values of reqids
+    found.
+    """
+    cache = _get_cache()
+    result = {}
+    missing = []
+    for reqid in set(reqids):
+        value = cache.get(_cache_key(name, reqid))
+        if value is None:
+            missing.append(reqid)
+        else:
+            result[reqid] = value
+    if missing:
+        found = lookup(missing)
+        for reqid, value in found.iteritems():
+            _cache_set(cache, name, reqid, value)
+        result.update(found)
+    return result
+
+
 def reset_cache():
     global _CACHE
     _CACHE = None
@@ -115,6 +207,24 @@ def glance_id_to_id(context, glance_id):
         return db.s3_image_create(context, glance_id)['id']
 
 
+def glance_ids_to_ids(context, glance_ids):
+    """Convert several glance ids to internal (db) ids.
+
+    Returns a dict keyed by glance id.
+    """
+    def lookup(glance_ids):
+        ids = dict((image['uuid'], image['id']) for image in
+                   db.s3_image_get_all_by_uuids(context, glance_ids))
+        for glance_id in glance_ids:
+            if glance_id not in ids:
+                ids[glance_id] = db.s3_image_create(context, glance_id)['id']
+        return ids
+
+    glance_ids = [glance_id for glance_id in glance_ids
+                  if glance_id is not None]
+    return memoize_many('glance_id_to_id', glance_ids, lookup)
+
+
 def ec2_id_to_glance_id(context, ec2_id):
     image_id = ec2_id_to_id(ec2_id)
     return id_to_glance_id(context, image_id)
@@ -197,11 +307,52 @@ def ec2_inst_id_to_uuid(context, ec2_id):
     return get_instance_uuid_from_int_id(context, int_id)
 
 
+def id_to_ec2_inst_ids(instance_ids):
+    """Get or create the ec2 instance IDs of several uuids.
+
+    Returns a dict keyed by uuid.
+    """
+    ctxt = context.get_admin_context()
+    int_ids = get_int_ids_from_instance_uuids(
+            ctxt, [instance_id for instance_id in instance_ids
+                   if uuidutils.is_uuid_like(instance_id)])
+    result = {}
+    for instance_id in instance_ids:
+        if instance_id in int_ids:
+            result[instance_id] = id_to_ec2_id(int_ids[instance_id])
+        else:
+            result[instance_id] = id_to_ec2_inst_id(instance_id)
+    return result
+
+
+def ec2_inst_ids_to_uuids(context, ec2_ids):
+    """Convert several instance ids to uuids.
+
+    Returns a dict keyed by ec2 id, without the ids which are not mapped to
+    an instance.
+    """
+    int_ids = dict((ec2_id, ec2_id_to_id(ec2_id)) for ec2_id in ec2_ids)
+    uuids = get_instance_uuids_from_int_ids(context, int_ids.values())
+    return dict((ec2_id, uuids[int_id])
+                for ec2_id, int_id in int_ids.iteritems() if int_id in uuids)
+
+
 @memoize
 def get_instance_uuid_from_int_id(context, int_id):
     return db.get_instance_uuid_by_ec2_id(context, int_id)
 
 
+def get_instance_uuids_from_int_ids(context, int_ids):
+    """Get the uuids of several ec2 instance ids (int).
+
+    Returns a dict keyed by int id, without the ids which are not mapped to
+    an instance.
+    """
+    return memoize_many('get_instance_uuid_from_int_id', int_ids,
+                        lambda int_ids: db.get_instance_uuids_by_ec2_ids(
+                                context, int_ids))
+
+
 def id_to_ec2_snap_id(snapshot_id):
     """Get or create an ec2 volume ID (vol-[base 16 number]) from uuid."""
     if uuidutils.is_uuid_like(snapshot_id):
@@ -222,6 +373,24 @@ def id_to_ec2_vol_id(volume_id):
         return id_to_ec2_id(volume_id, 'vol-%08x')
 
 
+def id_to_ec2_vol_ids(volume_ids):
+    """Get or create the ec2 volume IDs of several uuids.
+
+    Returns a dict keyed by uuid.
+    """
+    ctxt = context.get_admin_context()
+    int_ids = get_int_ids_from_volume_uuids(
+            ctxt, [volume_id for volume_id in volume_ids
+                   if uuidutils.is_uuid_like(volume_id)])
+    result = {}
+    for volume_id in volume_ids:
+        if volume_id in int_ids:
+            result[volume_id] = id_to_ec2_id(int_ids[volume_id], 'vol-%08x')
+        else:
+            result[volume_id] = id_to_ec2_vol_id(volume_id)
+    return result
+
+
 def ec2_vol_id_to_uuid(ec2_id):
     """Get the corresponding UUID for the given ec2-id."""
     ctxt = context.get_admin_context()
@@ -284,6 +453,25 @@ def get_int_id_from_instance_uuid(context, instance_uuid):
         return db.ec2_instance_create(context, instance_uuid)['id']
 
 
+def get_int_ids_from_instance_uuids(context, instance_uuids):
+    """Get or create the ec2 instance ids (int) of several uuids.
+
+    Returns a dict keyed by uuid.
+    """
+    def lookup(instance_uuids):
+        ids = db.get_ec2_instance_ids_by_uuids(context, instance_uuids)
+        for instance_uuid in instance_uuids:
+            if instance_uuid not in ids:
+                ids[instance_uuid] = db.ec2_instance_create(
+                        context, instance_uuid)['id']
+        return ids
+
+    instance_uuids = [instance_uuid for instance_uuid in instance_uuids
+                      if instance_uuid is not None]
+    return memoize_many('get_int_id_from_instance_uuid', instance_uuids,
+                        lookup)
+
+
 @memoize
 def get_int_id_from_volume_uuid(context, volume_uuid):
     if volume_uuid is None:
@@ -294,6 +482,24 @@ def get_int_id_from_volume_uuid(context, volume_uuid):
         return db.ec2_volume_create(context, volume_uuid)['id']
 
 
+def get_int_ids_from_volume_uuids(context, volume_uuids):
+    """Get or create the ec2 volume ids (int) of several uuids.
+
+    Returns a dict keyed by uuid.
+    """
+    def lookup(volume_uuids):
+        ids = db.get_ec2_volume_ids_by_uuids(context, volume_uuids)
+        for volume_uuid in volume_uuids:
+            if volume_uuid not in ids:
+                ids[volume_uuid] = db.ec2_volume_create(
+                        context, volume_uuid)['id']
+        return ids
+
+    volume_uuids = [volume_uuid for volume_uuid in volume_uuids
+                    if volume_uuid is not None]
+    return memoize_many('get_int_id_from_volume_uuid', volume_uuids, lookup)
+
+
 @memoize
 def get_volume_uuid_from_int_id(context, int_id):
     return db.get_volume_uuid_by_ec2_id(context, int_id)
@@ -0,0 +1,26 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova.api.openstack import extensions
+
+
+class Aggregate_cache_images(extensions.ExtensionDescriptor):
+    """Image cache warming on the hosts of an aggregate."""
+
+    name = "AggregateCacheImages"
+    alias = "os-aggregate-cache-images"
+    namespace = ("http://docs.openstack.org/compute/ext/"
+                 "aggregate_cache_images/api/v2")
+    updated = "2014-04-01T00:00:00+00:00"
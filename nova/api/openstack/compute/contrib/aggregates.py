@@ -17,6 +17,7 @@
 
 import datetime
 
+import webob
 from webob import exc
 
 from nova.api.openstack import extensions
@@ -47,8 +48,9 @@ def get_host_from_body(fn):
 
 class AggregateController(object):
     """The Host Aggregates API controller for the OpenStack API."""
-    def __init__(self):
+    def __init__(self, ext_mgr=None):
         self.api = compute_api.AggregateAPI()
+        self.ext_mgr = ext_mgr
 
     def index(self, req):
         """Returns a list a host aggregate's id, name, availability_zone."""
@@ -153,6 +155,9 @@ class AggregateController(object):
             'remove_host': self._remove_host,
             'set_metadata': self._set_metadata,
         }
+        if (self.ext_mgr is not None and
+                self.ext_mgr.is_loaded('os-aggregate-cache-images')):
+            _actions['cache_images'] = self._cache_images
         for action, data in body.iteritems():
             if action not in _actions.keys():
                 msg = _('Aggregates does not have %s action') % action
@@ -220,6 +225,29 @@ class AggregateController(object):
 
         return self._marshall_aggregate(aggregate)
 
+    def _cache_images(self, req, id, body):
+        """Fetches images into the image cache of the aggregate hosts."""
+        context = _get_context(req)
+        authorize(context)
+
+        try:
+            image_ids = body["image_ids"]
+        except (KeyError, TypeError):
+            raise exc.HTTPBadRequest()
+        if (not isinstance(image_ids, list) or not image_ids or
+                not all(isinstance(image_id, basestring)
+                        for image_id in image_ids)):
+            msg = _("image_ids must be a non-empty list of image ids")
+            raise exc.HTTPBadRequest(explanation=msg)
+        try:
+            self.api.cache_images(context, id, image_ids)
+        except exception.AggregateNotFound:
+            LOG.info(_('Cannot cache images in aggregate %s'), id)
+            raise exc.HTTPNotFound()
+        except exception.ImageNotFound as e:
+            raise exc.HTTPBadRequest(explanation=e.format_message())
+        return webob.Response(status_int=202)
+
     def _marshall_aggregate(self, aggregate):
         _aggregate = {}
         for key, value in aggregate.items():
@@ -241,7 +269,7 @@ class Aggregates(extensions.ExtensionDescriptor):
     def get_resources(self):
         resources = []
         res = extensions.ResourceExtension('os-aggregates',
-                AggregateController(),
+                AggregateController(self.ext_mgr),
                 member_actions={"action": "POST", })
         resources.append(res)
         return resources
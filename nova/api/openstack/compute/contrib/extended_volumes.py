@@ -14,6 +14,8 @@
 
 """The Extended Volumes API extension."""
 
+import functools
+
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
@@ -28,12 +30,28 @@ class ExtendedVolumesController(wsgi.Controller):
         super(ExtendedVolumesController, self).__init__(*args, **kwargs)
         self.compute_api = compute.API()
 
-    def _extend_server(self, context, server, instance):
-        bdms = block_device_obj.BlockDeviceMappingList.get_by_instance_uuid(
-                context, instance['uuid'])
-        volume_ids = [bdm.volume_id for bdm in bdms if bdm.volume_id]
+    @staticmethod
+    def _get_volume_ids(context, instances):
+        """Return the ids of the volumes attached to instances, by
+        instance uuid.
+        """
+        bdms = block_device_obj.BlockDeviceMappingList.get_by_instance_uuids(
+                context, [instance['uuid'] for instance in instances])
+        volume_ids = {}
+        for bdm in bdms:
+            if bdm.volume_id:
+                volume_ids.setdefault(bdm.instance_uuid, []).append(
+                        bdm.volume_id)
+        return volume_ids
+
+    def _extend_server(self, context, req, server):
+        # The volumes of all the instances of the request are looked up
+        # at once.
+        volume_ids = req.get_prefetched('volume_ids',
+                functools.partial(self._get_volume_ids, context))
         key = "%s:volumes_attached" % Extended_volumes.alias
-        server[key] = [{'id': volume_id} for volume_id in volume_ids]
+        server[key] = [{'id': volume_id}
+                       for volume_id in volume_ids.get(server['id'], [])]
 
     @wsgi.extends
     def show(self, req, resp_obj, id):
@@ -42,10 +60,9 @@ class ExtendedVolumesController(wsgi.Controller):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedVolumesServerTemplate())
             server = resp_obj.obj['server']
-            db_instance = req.get_db_instance(server['id'])
             # server['id'] is guaranteed to be in the cache due to
             # the core API adding it in its 'show' method.
-            self._extend_server(context, server, db_instance)
+            self._extend_server(context, req, server)
 
     @wsgi.extends
     def detail(self, req, resp_obj):
@@ -55,10 +72,9 @@ class ExtendedVolumesController(wsgi.Controller):
             resp_obj.attach(xml=ExtendedVolumesServersTemplate())
             servers = list(resp_obj.obj['servers'])
             for server in servers:
-                db_instance = req.get_db_instance(server['id'])
                 # server['id'] is guaranteed to be in the cache due to
                 # the core API adding it in its 'detail' method.
-                self._extend_server(context, server, db_instance)
+                self._extend_server(context, req, server)
 
 
 class Extended_volumes(extensions.ExtensionDescriptor):
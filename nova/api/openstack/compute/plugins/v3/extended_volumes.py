@@ -13,6 +13,8 @@
 #   under the License.
 
 """The Extended Volumes API extension."""
+import functools
+
 import webob
 from webob import exc
 
@@ -45,12 +47,28 @@ class ExtendedVolumesController(wsgi.Controller):
         self.compute_api = compute.API()
         self.volume_api = volume.API()
 
-    def _extend_server(self, context, server, instance):
-        bdms = block_device_obj.BlockDeviceMappingList.get_by_instance_uuid(
-                context, instance['uuid'])
-        volume_ids = [bdm['volume_id'] for bdm in bdms if bdm['volume_id']]
+    @staticmethod
+    def _get_volume_ids(context, instances):
+        """Return the ids of the volumes attached to instances, by
+        instance uuid.
+        """
+        bdms = block_device_obj.BlockDeviceMappingList.get_by_instance_uuids(
+                context, [instance['uuid'] for instance in instances])
+        volume_ids = {}
+        for bdm in bdms:
+            if bdm.volume_id:
+                volume_ids.setdefault(bdm.instance_uuid, []).append(
+                        bdm.volume_id)
+        return volume_ids
+
+    def _extend_server(self, context, req, server):
+        # The volumes of all the instances of the request are looked up
+        # at once.
+        volume_ids = req.get_prefetched('volume_ids',
+                functools.partial(self._get_volume_ids, context))
         key = "%s:volumes_attached" % ExtendedVolumes.alias
-        server[key] = [{'id': volume_id} for volume_id in volume_ids]
+        server[key] = [{'id': volume_id}
+                       for volume_id in volume_ids.get(server['id'], [])]
 
     @extensions.expected_errors((400, 404, 409))
     @wsgi.action('swap_volume_attachment')
@@ -106,10 +124,9 @@ class ExtendedVolumesController(wsgi.Controller):
         context = req.environ['nova.context']
         if authorize(context):
             server = resp_obj.obj['server']
-            db_instance = req.get_db_instance(server['id'])
             # server['id'] is guaranteed to be in the cache due to
             # the core API adding it in its 'show' method.
-            self._extend_server(context, server, db_instance)
+            self._extend_server(context, req, server)
 
     @wsgi.extends
     def detail(self, req, resp_obj):
@@ -117,10 +134,9 @@ class ExtendedVolumesController(wsgi.Controller):
         if authorize(context):
             servers = list(resp_obj.obj['servers'])
             for server in servers:
-                db_instance = req.get_db_instance(server['id'])
                 # server['id'] is guaranteed to be in the cache due to
                 # the core API adding it in its 'detail' method.
-                self._extend_server(context, server, db_instance)
+                self._extend_server(context, req, server)
 
     @extensions.expected_errors((400, 404, 409))
     @wsgi.response(202)
@@ -75,7 +75,7 @@ class Request(webob.Request):
 
     def __init__(self, *args, **kwargs):
         super(Request, self).__init__(*args, **kwargs)
-        self._extension_data = {'db_items': {}}
+        self._extension_data = {'db_items': {}, 'prefetched': {}}
 
     def cache_db_items(self, key, items, item_key='id'):
         """Allow API methods to store objects from a DB query to be
@@ -141,6 +141,23 @@ class Request(webob.Request):
     def get_db_compute_node(self, id):
         return self.get_db_item('compute_nodes', id)
 
+    def get_prefetched(self, key, loader):
+        """Allow API extensions needing more data about the instances of
+        a request to load it for all of them at once, rather than for one
+        instance at a time.
+
+        The first time data is asked for a key, loader is called with the
+        list of the instances stored by cache_db_instances() and returns
+        the data, typically a dict by instance uuid.  Later calls for the
+        same key within the same API request, including from other API
+        extensions, return the same data.
+        """
+        prefetched = self._extension_data['prefetched']
+        if key not in prefetched:
+            instances = self._extension_data['db_items'].get('instances', {})
+            prefetched[key] = loader(instances.values())
+        return prefetched[key]
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'nova.best_content_type' not in self.environ:
@@ -148,3 +148,34 @@ def get_instance_availability_zone(context, instance):
         az = get_host_availability_zone(elevated, host)
         cache.set(cache_key, az, AZ_CACHE_SECONDS)
     return az
+
+
+def get_instances_availability_zones(context, instances):
+    """Return the availability zones of several instances, by instance
+    uuid.  The zones of the hosts missing from the cache are looked up at
+    once.
+    """
+    cache = _get_cache()
+    azs_by_host = {}
+    missing_hosts = []
+    for instance in instances:
+        host = str(instance.get('host'))
+        if not host or host in azs_by_host:
+            continue
+        azs_by_host[host] = cache.get(_make_cache_key(host))
+        if not azs_by_host[host]:
+            missing_hosts.append(host)
+
+    if missing_hosts:
+        metadata = db.aggregate_host_get_by_metadata_key(context.elevated(),
+                key='availability_zone')
+        for host in missing_hosts:
+            if metadata.get(host):
+                az = list(metadata[host])[0]
+            else:
+                az = CONF.default_availability_zone
+            cache.set(_make_cache_key(host), az, AZ_CACHE_SECONDS)
+            azs_by_host[host] = az
+
+    return dict((instance['uuid'], azs_by_host.get(str(instance.get('host'))))
+                for instance in instances)
@@ -93,6 +93,7 @@ class CellsManager(manager.Manager):
                 CONF.cells.driver)
         self.driver = cells_driver_cls()
         self.instances_to_heal = iter([])
+        self.instance_batches_to_heal = iter([])
 
     def post_start_hook(self):
         """Have the driver start its servers for inter-cell communication.
@@ -136,12 +137,19 @@ class CellsManager(manager.Manager):
         setting defines the maximum number of seconds old the updated_at
         can be.  Ie, a threshold of 3600 means to only update instances
         that have modified in the last hour.
+
+        If CONF.cells.instance_sync_batch_size is set, the instances are
+        rather fetched and sent in batches, see _heal_instance_batches().
         """
 
         if not self.state_manager.get_parent_cells():
             # No need to sync up if we have no parents.
             return
 
+        if CONF.cells.instance_sync_batch_size > 0:
+            self._heal_instance_batches(ctxt)
+            return
+
         info = {'updated_list': False}
 
         def _next_instance():
@@ -150,14 +158,9 @@ class CellsManager(manager.Manager):
             except StopIteration:
                 if info['updated_list']:
                     return
-                threshold = CONF.cells.instance_updated_at_threshold
-                updated_since = None
-                if threshold > 0:
-                    updated_since = timeutils.utcnow() - datetime.timedelta(
-                            seconds=threshold)
                 self.instances_to_heal = cells_utils.get_instances_to_sync(
-                        ctxt, updated_since=updated_since, shuffle=True,
-                        uuids_only=True)
+                        ctxt, updated_since=self._get_heal_updated_since(),
+                        shuffle=True, uuids_only=True)
                 info['updated_list'] = True
                 try:
                     instance = self.instances_to_heal.next()
@@ -182,6 +185,43 @@ class CellsManager(manager.Manager):
                 self._sync_instance(ctxt, instance)
                 break
 
+    def _get_heal_updated_since(self):
+        threshold = CONF.cells.instance_updated_at_threshold
+        if threshold > 0:
+            return timeutils.utcnow() - datetime.timedelta(seconds=threshold)
+        return None
+
+    def _heal_instance_batches(self, ctxt):
+        """Send updates for about 'CONF.cells.instance_update_num_instances'
+        instances to parent cells, in batches.
+
+        Rather than shuffling the list of instances, we page through the
+        instances and keep our position between the runs of the periodic
+        task, starting over once all of them were synced.
+        """
+        batch_size = min(CONF.cells.instance_sync_batch_size,
+                         CONF.cells.instance_update_num_instances)
+
+        def _next_batches():
+            num_instances = 0
+            restarted = False
+            while num_instances < CONF.cells.instance_update_num_instances:
+                try:
+                    instances = self.instance_batches_to_heal.next()
+                except StopIteration:
+                    if restarted:
+                        return
+                    restarted = True
+                    self.instance_batches_to_heal = (
+                            cells_utils.get_instance_batches_to_sync(
+                                ctxt, batch_size,
+                                updated_since=self._get_heal_updated_since()))
+                    continue
+                num_instances += len(instances)
+                yield instances
+
+        self.msg_runner.sync_instances_at_top(ctxt, _next_batches())
+
     def _sync_instance(self, ctxt, instance):
         """Broadcast an instance_update or instance_destroy message up to
         parent cells.
@@ -27,8 +27,11 @@ reached.
 The interface into this module is the MessageRunner class.
 """
 import sys
+import time
 import traceback
 
+from eventlet import greenpool
+from eventlet import greenthread
 from eventlet import queue
 from oslo.config import cfg
 from oslo import messaging
@@ -64,7 +67,36 @@ cell_messaging_opts = [
             help='Maximum number of hops for cells routing.'),
     cfg.StrOpt('scheduler',
             default='nova.cells.scheduler.CellsScheduler',
-            help='Cells scheduler to use')]
+            help='Cells scheduler to use'),
+    cfg.BoolOpt('delta_updates',
+            default=False,
+            help='Send only the changes of our capabilities and capacities '
+                 'to parent cells, rather than all of them on every '
+                 'update.  All the parent cells need to support it.'),
+    cfg.IntOpt('full_update_interval',
+            default=10,
+            help='Number of delta updates of the capabilities and '
+                 'capacities sent to parent cells between full updates.'),
+    cfg.FloatOpt('instance_update_batch_window',
+            default=0.0,
+            help='Number of seconds for which the updates of instances '
+                 'sent to the top level cell are accumulated, to be sent '
+                 'as a single message.  The top level cells need to '
+                 'support it.  0 sends every update right away.'),
+    cfg.IntOpt('instance_update_batch_size',
+            default=100,
+            help='Maximum number of instances whose updates are sent to '
+                 'the top level cell in a single message.'),
+    cfg.IntOpt('instance_sync_batch_size',
+            default=0,
+            help='Number of instances fetched at a time and sent to the '
+                 'top level cell in a single message when healing or '
+                 'syncing instances.  The top level cells need to support '
+                 'it.  0 sends every instance in its own message.'),
+    cfg.IntOpt('instance_sync_concurrency',
+            default=4,
+            help='Number of batches of instances sent at the same time '
+                 'when healing or syncing instances.')]
 
 CONF = cfg.CONF
 CONF.import_opt('name', 'nova.cells.opts', group='cells')
@@ -73,6 +105,10 @@ CONF.register_opts(cell_messaging_opts, group='cells')
 
 LOG = logging.getLogger(__name__)
 
+# Number of seconds between the reports of the progress of a sync of
+# instances.
+_SYNC_PROGRESS_INTERVAL = 60
+
 # Separator used between cell names for the 'full cell name' and routing
 # path.
 _PATH_CELL_SEP = cells_utils.PATH_CELL_SEP
@@ -714,17 +750,48 @@ class _TargetedMessageMethods(_BaseMessageMethods):
         # Go ahead and update our parents now that a child updated us
         self.msg_runner.tell_parents_our_capacities(message.ctxt)
 
+    def update_capabilities_delta(self, message, cell_name, seq, full,
+                                  changed, removed):
+        """A child cell told us about the changes of their capabilities."""
+        LOG.debug(_("Received capabilities update %(seq)s from child cell "
+                    "%(cell_name)s: %(changed)s, removed %(removed)s"),
+                  {'cell_name': cell_name, 'seq': seq, 'changed': changed,
+                   'removed': removed})
+        if not self.state_manager.update_cell_capabilities_delta(
+                cell_name, seq, full, changed, removed):
+            self.msg_runner.ask_children_for_capabilities(
+                    message.ctxt, cell_name=cell_name)
+            return
+        # Go ahead and update our parents now that a child updated us
+        self.msg_runner.tell_parents_our_capabilities(message.ctxt)
+
+    def update_capacities_delta(self, message, cell_name, seq, full,
+                                changed, removed):
+        """A child cell told us about the changes of their capacity."""
+        LOG.debug(_("Received capacities update %(seq)s from child cell "
+                    "%(cell_name)s: %(changed)s, removed %(removed)s"),
+                  {'cell_name': cell_name, 'seq': seq, 'changed': changed,
+                   'removed': removed})
+        if not self.state_manager.update_cell_capacities_delta(
+                cell_name, seq, full, changed, removed):
+            self.msg_runner.ask_children_for_capacities(
+                    message.ctxt, cell_name=cell_name)
+            return
+        # Go ahead and update our parents now that a child updated us
+        self.msg_runner.tell_parents_our_capacities(message.ctxt)
+
     def announce_capabilities(self, message):
         """A parent cell has told us to send our capabilities, so let's
         do so.
         """
-        self.msg_runner.tell_parents_our_capabilities(message.ctxt)
+        self.msg_runner.tell_parents_our_capabilities(message.ctxt,
+                                                      full=True)
 
     def announce_capacities(self, message):
         """A parent cell has told us to send our capacity, so let's
         do so.
         """
-        self.msg_runner.tell_parents_our_capacities(message.ctxt)
+        self.msg_runner.tell_parents_our_capacities(message.ctxt, full=True)
 
     def service_get_by_compute_host(self, message, host_name):
         """Return the service entry for a compute host."""
@@ -1003,10 +1070,10 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
             if expected is not None:
                 instance_info['expected_task_state'] = expected
 
-    def instance_update_at_top(self, message, instance, **kwargs):
-        """Update an instance in the DB if we're a top level cell."""
-        if not self._at_the_top():
-            return
+    def _prepare_instance_update(self, message, instance):
+        """Fix up an instance update received from a child cell before
+        applying it to the DB.  Returns the info_cache to update, if any.
+        """
         instance_uuid = instance['uuid']
 
         # Remove things that we can't update in the top level cells.
@@ -1036,6 +1103,20 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
 
         self._apply_expected_states(instance)
 
+        if info_cache:
+            network_info = info_cache.get('network_info')
+            if isinstance(network_info, list):
+                if not isinstance(network_info, network_model.NetworkInfo):
+                    network_info = network_model.NetworkInfo.hydrate(
+                            network_info)
+                info_cache['network_info'] = network_info.json()
+        return info_cache
+
+    def _update_instance(self, message, instance, info_cache):
+        """Update an instance prepared by _prepare_instance_update() in the
+        DB, creating it if it does not exist.
+        """
+        instance_uuid = instance['uuid']
         # It's possible due to some weird condition that the instance
         # was already set as deleted... so we'll attempt to update
         # it with permissions that allows us to read deleted.
@@ -1048,12 +1129,6 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
                 # if we actually want this code to remain..
                 self.db.instance_create(message.ctxt, instance)
         if info_cache:
-            network_info = info_cache.get('network_info')
-            if isinstance(network_info, list):
-                if not isinstance(network_info, network_model.NetworkInfo):
-                    network_info = network_model.NetworkInfo.hydrate(
-                            network_info)
-                info_cache['network_info'] = network_info.json()
             try:
                 self.db.instance_info_cache_update(
                         message.ctxt, instance_uuid, info_cache)
@@ -1062,6 +1137,53 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
                 # network information.
                 pass
 
+    def instance_update_at_top(self, message, instance, **kwargs):
+        """Update an instance in the DB if we're a top level cell."""
+        if not self._at_the_top():
+            return
+        info_cache = self._prepare_instance_update(message, instance)
+        self._update_instance(message, instance, info_cache)
+
+    def instance_update_at_top_batch(self, message, instances, **kwargs):
+        """Update several instances in the DB if we're a top level cell.
+
+        The updates are applied in a single transaction.  The instances
+        that could not be updated that way, like the ones that do not
+        exist yet, are then updated one at a time.
+        """
+        if not self._at_the_top():
+            return
+        prepared = {}
+        updates = {}
+        for instance in instances:
+            info_cache = self._prepare_instance_update(message, instance)
+            prepared[instance['uuid']] = (instance, info_cache)
+            updates[instance['uuid']] = dict(instance)
+            if info_cache:
+                updates[instance['uuid']]['info_cache'] = info_cache
+
+        with utils.temporary_mutation(message.ctxt, read_deleted="yes"):
+            try:
+                failures = self.db.instance_update_batch(message.ctxt,
+                                                         updates)
+            except Exception:
+                LOG.exception(_("Error updating %(num)s instances at once, "
+                                "updating them one at a time"),
+                              {'num': len(updates)})
+                failures = dict.fromkeys(updates, None)
+
+        for instance_uuid, exc in failures.iteritems():
+            if exc is not None and not isinstance(exc, exception.NotFound):
+                LOG.warn(_("Failed to update instance: %(exc)s"),
+                         {'exc': exc}, instance_uuid=instance_uuid)
+                continue
+            instance, info_cache = prepared[instance_uuid]
+            try:
+                self._update_instance(message, instance, info_cache)
+            except Exception:
+                LOG.exception(_("Failed to update instance"),
+                              instance_uuid=instance_uuid)
+
     def instance_destroy_at_top(self, message, instance, **kwargs):
         """Destroy an instance from the DB if we're a top level cell."""
         if not self._at_the_top():
@@ -1122,6 +1244,17 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
                  {'projid_str': projid_str, 'since_str': since_str})
         if updated_since is not None:
             updated_since = timeutils.parse_isotime(updated_since)
+        batch_size = CONF.cells.instance_sync_batch_size
+        if batch_size > 0:
+            start = time.time()
+            batches = cells_utils.get_instance_batches_to_sync(message.ctxt,
+                    batch_size, updated_since=updated_since,
+                    project_id=project_id, deleted=deleted)
+            num_instances = self.msg_runner.sync_instances_at_top(
+                    message.ctxt, batches)
+            LOG.info(_("Synced %(num)s instances in %(secs).1f seconds"),
+                     {'num': num_instances, 'secs': time.time() - start})
+            return
         instances = cells_utils.get_instances_to_sync(message.ctxt,
                 updated_since=updated_since, project_id=project_id,
                 deleted=deleted)
@@ -1262,6 +1395,14 @@ class MessageRunner(object):
                 CONF.cells.scheduler)
         self.scheduler = cells_scheduler_cls(self)
         self.response_queues = {}
+        # Last delta updates sent to parent cells, by kind: the sequence
+        # number, values sent and number of deltas since the last full
+        # update.
+        self.delta_updates_sent = {}
+        # Updates of instances waiting to be sent to the top level cell,
+        # by instance uuid, and the timer sending them.
+        self.pending_instance_updates = {}
+        self._instance_updates_timer = None
         self.methods_by_type = {}
         self.our_name = CONF.cells.name
         for msg_type, cls in _CELL_MESSAGE_TYPE_TO_METHODS_CLS.iteritems():
@@ -1352,29 +1493,74 @@ class MessageRunner(object):
         message_cls = _CELL_MESSAGE_TYPE_TO_MESSAGE_CLS[message_type]
         return message_cls(self, **message_dict)
 
-    def ask_children_for_capabilities(self, ctxt):
+    def _get_child_cells(self, cell_name=None):
+        if cell_name is None:
+            return self.state_manager.get_child_cells()
+        child_cell = self.state_manager.get_child_cell(cell_name)
+        return [child_cell] if child_cell else []
+
+    def ask_children_for_capabilities(self, ctxt, cell_name=None):
         """Tell child cells to send us capabilities.  This is typically
-        called on startup of the nova-cells service.
+        called on startup of the nova-cells service, or when we missed
+        delta updates from a child cell, in which case only cell_name is
+        asked.
         """
-        child_cells = self.state_manager.get_child_cells()
+        child_cells = self._get_child_cells(cell_name)
         for child_cell in child_cells:
             message = _TargetedMessage(self, ctxt,
                                         'announce_capabilities',
                                         dict(), 'down', child_cell)
             message.process()
 
-    def ask_children_for_capacities(self, ctxt):
+    def ask_children_for_capacities(self, ctxt, cell_name=None):
         """Tell child cells to send us capacities.  This is typically
-        called on startup of the nova-cells service.
+        called on startup of the nova-cells service, or when we missed
+        delta updates from a child cell, in which case only cell_name is
+        asked.
         """
-        child_cells = self.state_manager.get_child_cells()
+        child_cells = self._get_child_cells(cell_name)
         for child_cell in child_cells:
             message = _TargetedMessage(self, ctxt, 'announce_capacities',
                                         dict(), 'down', child_cell)
             message.process()
 
-    def tell_parents_our_capabilities(self, ctxt):
-        """Send our capabilities to parent cells."""
+    def _tell_parents_delta(self, ctxt, parent_cells, kind, values, full):
+        """Send the changes of our capabilities or capacities since the
+        last update to parent cells.
+
+        Every update has a sequence number, so that parent cells can tell
+        when they missed one and ask for a full update.  A full update is
+        also sent every CONF.cells.full_update_interval updates.
+        """
+        seq, last_values, num_deltas = self.delta_updates_sent.get(
+                kind, (-1, None, 0))
+        seq += 1
+        if (full or last_values is None or
+                num_deltas >= CONF.cells.full_update_interval):
+            full = True
+            num_deltas = 0
+            changed, removed = cells_utils.dict_delta({}, values)
+        else:
+            num_deltas += 1
+            changed, removed = cells_utils.dict_delta(last_values, values)
+        self.delta_updates_sent[kind] = (seq, values, num_deltas)
+
+        method_kwargs = {'cell_name': self.state_manager.get_my_state().name,
+                         'seq': seq,
+                         'full': full,
+                         'changed': changed,
+                         'removed': removed}
+        for cell in parent_cells:
+            message = _TargetedMessage(self, ctxt, 'update_%s_delta' % kind,
+                    method_kwargs, 'up', cell, fanout=True)
+            message.process()
+
+    def tell_parents_our_capabilities(self, ctxt, full=False):
+        """Send our capabilities to parent cells.
+
+        If CONF.cells.delta_updates is set, only the changes since the last
+        update are sent, unless full is True.
+        """
         parent_cells = self.state_manager.get_parent_cells()
         if not parent_cells:
             return
@@ -1383,9 +1569,14 @@ class MessageRunner(object):
         LOG.debug(_("Updating parents with our capabilities: %(capabs)s"),
                   {'capabs': capabs})
         # We have to turn the sets into lists so they can potentially
-        # be json encoded when the raw message is sent.
+        # be json encoded when the raw message is sent.  Sorted, so that
+        # they can be compared to the ones sent last.
         for key, values in capabs.items():
-            capabs[key] = list(values)
+            capabs[key] = sorted(values)
+        if CONF.cells.delta_updates:
+            self._tell_parents_delta(ctxt, parent_cells, 'capabilities',
+                                     capabs, full)
+            return
         method_kwargs = {'cell_name': my_cell_info.name,
                          'capabilities': capabs}
         for cell in parent_cells:
@@ -1393,8 +1584,12 @@ class MessageRunner(object):
                     method_kwargs, 'up', cell, fanout=True)
             message.process()
 
-    def tell_parents_our_capacities(self, ctxt):
-        """Send our capacities to parent cells."""
+    def tell_parents_our_capacities(self, ctxt, full=False):
+        """Send our capacities to parent cells.
+
+        If CONF.cells.delta_updates is set, only the changes since the last
+        update are sent, unless full is True.
+        """
         parent_cells = self.state_manager.get_parent_cells()
         if not parent_cells:
             return
@@ -1402,6 +1597,10 @@ class MessageRunner(object):
         capacities = self.state_manager.get_our_capacities()
         LOG.debug(_("Updating parents with our capacities: %(capacities)s"),
                   {'capacities': capacities})
+        if CONF.cells.delta_updates:
+            self._tell_parents_delta(ctxt, parent_cells, 'capacities',
+                                     capacities, full)
+            return
         method_kwargs = {'cell_name': my_cell_info.name,
                          'capacities': capacities}
         for cell in parent_cells:
@@ -1435,14 +1634,102 @@ class MessageRunner(object):
         return message.process()
 
     def instance_update_at_top(self, ctxt, instance):
-        """Update an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_update_at_top',
-                                    dict(instance=instance), 'up',
+        """Update an instance at the top level cell.
+
+        If CONF.cells.instance_update_batch_window is set, the update is
+        merged with the other updates of the instance during the window,
+        the last value of each field winning, and sent along with the
+        updates of other instances by flush_instance_updates().
+        """
+        window = CONF.cells.instance_update_batch_window
+        if window <= 0:
+            message = _BroadcastMessage(self, ctxt, 'instance_update_at_top',
+                                        dict(instance=instance), 'up',
+                                        run_locally=False)
+            message.process()
+            return
+        pending = self.pending_instance_updates.setdefault(
+                instance['uuid'], {})
+        pending.update(instance)
+        if (len(self.pending_instance_updates) >=
+                CONF.cells.instance_update_batch_size):
+            self.flush_instance_updates()
+        elif self._instance_updates_timer is None:
+            self._instance_updates_timer = greenthread.spawn_after(
+                    window, self.flush_instance_updates)
+
+    def flush_instance_updates(self):
+        """Send the pending updates of instances to the top level cell, in
+        a single message.
+        """
+        if self._instance_updates_timer is not None:
+            # Does nothing if we are the timer.
+            self._instance_updates_timer.cancel()
+            self._instance_updates_timer = None
+        if not self.pending_instance_updates:
+            return
+        instances = self.pending_instance_updates.values()
+        self.pending_instance_updates = {}
+        # The instances may belong to different projects.
+        ctxt = context.get_admin_context()
+        self.instance_update_at_top_batch(ctxt, instances)
+
+    def instance_update_at_top_batch(self, ctxt, instances):
+        """Update several instances at the top level cell, in a single
+        message.
+        """
+        message = _BroadcastMessage(self, ctxt,
+                                    'instance_update_at_top_batch',
+                                    dict(instances=instances), 'up',
                                     run_locally=False)
         message.process()
 
+    def sync_instances_at_top(self, ctxt, batches):
+        """Sync lists of instances, as returned by
+        cells_utils.get_instance_batches_to_sync(), with the top level
+        cell.
+
+        The active instances of each list are sent in a single message,
+        and CONF.cells.instance_sync_concurrency lists are sent at the same
+        time.  Returns the number of instances synced.
+        """
+        pool = greenpool.GreenPool(CONF.cells.instance_sync_concurrency)
+        start = time.time()
+        progress = {'num_instances': 0, 'last_report': start}
+
+        def _sync_batch(instances):
+            updates = []
+            try:
+                for instance in instances:
+                    if instance['deleted']:
+                        self.instance_destroy_at_top(ctxt, instance)
+                    else:
+                        updates.append(instance)
+                if updates:
+                    self.instance_update_at_top_batch(ctxt, updates)
+            except Exception:
+                LOG.exception(_("Failed to sync %(num)s instances"),
+                              {'num': len(instances)})
+                return
+            progress['num_instances'] += len(instances)
+            now = time.time()
+            if now - progress['last_report'] >= _SYNC_PROGRESS_INTERVAL:
+                progress['last_report'] = now
+                LOG.info(_("Synced %(num)s instances so far, "
+                           "%(rate).1f instances per second"),
+                         {'num': progress['num_instances'],
+                          'rate': progress['num_instances'] / (now - start)})
+
+        for instances in batches:
+            # Waits for a free greenthread if there's none.
+            pool.spawn_n(_sync_batch, instances)
+        pool.waitall()
+        return progress['num_instances']
+
     def instance_destroy_at_top(self, ctxt, instance):
         """Destroy an instance at the top level cell."""
+        # A pending update must not be applied after the destroy.
+        self.pending_instance_updates.pop(instance['uuid'], None)
         message = _BroadcastMessage(self, ctxt, 'instance_destroy_at_top',
                                     dict(instance=instance), 'up',
                                     run_locally=False)
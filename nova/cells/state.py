@@ -23,6 +23,7 @@ import functools
 from oslo.config import cfg
 
 from nova.cells import rpc_driver
+from nova.cells import utils as cells_utils
 from nova import context
 from nova.db import base
 from nova import exception
@@ -65,6 +66,10 @@ class CellState(object):
         self.last_seen = datetime.datetime.min
         self.capabilities = {}
         self.capacities = {}
+        # Sequence numbers of the last delta updates received, or None
+        # until a full update is received.
+        self.capabilities_seq = None
+        self.capacities_seq = None
         self.db_info = {}
         # TODO(comstud): The DB will specify the driver to use to talk
         # to this cell, but there's no column for this yet.  The only
@@ -117,6 +122,62 @@ class CellState(object):
         return "Cell '%s' (%s)" % (self.name, me)
 
 
+class FreeUnits(object):
+    """Number of instances of each size fitting on the compute hosts.
+
+    The contribution of each host is computed from the space usable on it,
+    and kept up to date as the usable space of the hosts changes, so that
+    updating a host costs time proportional to the number of sizes (slots)
+    rather than to the number of hosts.
+    """
+
+    def __init__(self, slots):
+        self.slots = frozenset(slots)
+        # Sorted, so that the slots larger than the space usable on a host
+        # can be skipped.  A slot of 0 always has 0 units.
+        self._sorted_slots = sorted(slot for slot in self.slots if slot > 0)
+        self._keys = dict((slot, str(slot)) for slot in self.slots)
+        self.units = dict.fromkeys(self.slots, 0)
+        self.usable = {}
+
+    def _add(self, usable, count):
+        for slot in self._sorted_slots:
+            if slot > usable:
+                break
+            self.units[slot] += int(usable / slot) * count
+
+    def set_hosts(self, usable_by_host):
+        """Set the space usable on all the hosts."""
+        self.units = dict.fromkeys(self.slots, 0)
+        self.usable = dict(usable_by_host)
+        # Hosts of the same model, or empty, often have the same usable space
+        hosts_by_usable = {}
+        for usable in self.usable.itervalues():
+            hosts_by_usable[usable] = hosts_by_usable.get(usable, 0) + 1
+        for usable, count in hosts_by_usable.iteritems():
+            self._add(usable, count)
+
+    def set_host(self, host, usable):
+        """Set the space usable on a host."""
+        old_usable = self.usable.get(host)
+        if old_usable == usable:
+            return
+        if old_usable is not None:
+            self._add(old_usable, -1)
+        self._add(usable, 1)
+        self.usable[host] = usable
+
+    def remove_host(self, host):
+        old_usable = self.usable.pop(host, None)
+        if old_usable is not None:
+            self._add(old_usable, -1)
+
+    def to_dict(self):
+        """Return the units by slot, keyed by the slot as a string."""
+        return dict((self._keys[slot], units)
+                    for slot, units in self.units.iteritems())
+
+
 def sync_before(f):
     """Use as a decorator to wrap methods that use cell information to
     make sure they sync the latest information from the DB periodically.
@@ -168,6 +229,11 @@ class CellStateManager(base.Base):
         self.parent_cells = {}
         self.child_cells = {}
         self.last_cell_db_check = datetime.datetime.min
+        # State of the last capacity update, see _update_our_capacity()
+        self._compute_hosts = {}
+        self._reserve_level = None
+        self._ram_free_units = None
+        self._disk_free_units = None
 
         self._cell_data_sync(force=True)
 
@@ -260,29 +326,21 @@ class CellStateManager(base.Base):
                 if not service or service['disabled']:
                     continue
                 host = service['host']
-                compute_hosts[host] = {
-                        'free_ram_mb': compute['free_ram_mb'],
-                        'free_disk_mb': compute['free_disk_gb'] * 1024,
-                        'total_ram_mb': compute['memory_mb'],
-                        'total_disk_mb': compute['local_gb'] * 1024}
+                compute_hosts[host] = (compute['free_ram_mb'],
+                                       compute['free_disk_gb'] * units.Ki,
+                                       compute['memory_mb'],
+                                       compute['local_gb'] * units.Ki)
 
         _get_compute_hosts()
         if not compute_hosts:
+            self._compute_hosts = {}
+            self._ram_free_units = None
+            self._disk_free_units = None
             self.my_cell_state.update_capacities({})
             return
 
-        ram_mb_free_units = {}
-        disk_mb_free_units = {}
-        total_ram_mb_free = 0
-        total_disk_mb_free = 0
-
-        def _free_units(total, free, per_inst):
-            if per_inst:
-                min_free = total * reserve_level
-                free = max(0, free - min_free)
-                return int(free / per_inst)
-            else:
-                return 0
+        def _usable(total, free):
+            return max(0, free - total * reserve_level)
 
         instance_types = self.db.flavor_get_all(ctxt)
         memory_mb_slots = frozenset(
@@ -291,24 +349,45 @@ class CellStateManager(base.Base):
                 [(inst_type['root_gb'] + inst_type['ephemeral_gb']) * units.Ki
                     for inst_type in instance_types])
 
-        for compute_values in compute_hosts.values():
-            total_ram_mb_free += compute_values['free_ram_mb']
-            total_disk_mb_free += compute_values['free_disk_mb']
-            for memory_mb_slot in memory_mb_slots:
-                ram_mb_free_units.setdefault(str(memory_mb_slot), 0)
-                free_units = _free_units(compute_values['total_ram_mb'],
-                        compute_values['free_ram_mb'], memory_mb_slot)
-                ram_mb_free_units[str(memory_mb_slot)] += free_units
-            for disk_mb_slot in disk_mb_slots:
-                disk_mb_free_units.setdefault(str(disk_mb_slot), 0)
-                free_units = _free_units(compute_values['total_disk_mb'],
-                        compute_values['free_disk_mb'], disk_mb_slot)
-                disk_mb_free_units[str(disk_mb_slot)] += free_units
-
+        if (self._ram_free_units is None or
+                self._ram_free_units.slots != memory_mb_slots or
+                self._disk_free_units.slots != disk_mb_slots or
+                self._reserve_level != reserve_level):
+            # Compute the free units of all the hosts from scratch.
+            self._reserve_level = reserve_level
+            self._ram_free_units = FreeUnits(memory_mb_slots)
+            self._ram_free_units.set_hosts(
+                    dict((host, _usable(values[2], values[0]))
+                         for host, values in compute_hosts.iteritems()))
+            self._disk_free_units = FreeUnits(disk_mb_slots)
+            self._disk_free_units.set_hosts(
+                    dict((host, _usable(values[3], values[1]))
+                         for host, values in compute_hosts.iteritems()))
+        else:
+            # Only update the hosts whose compute node changed.
+            for host in self._compute_hosts:
+                if host not in compute_hosts:
+                    self._ram_free_units.remove_host(host)
+                    self._disk_free_units.remove_host(host)
+            for host, values in compute_hosts.iteritems():
+                if self._compute_hosts.get(host) == values:
+                    continue
+                free_ram_mb, free_disk_mb, total_ram_mb, total_disk_mb = values
+                self._ram_free_units.set_host(
+                        host, _usable(total_ram_mb, free_ram_mb))
+                self._disk_free_units.set_host(
+                        host, _usable(total_disk_mb, free_disk_mb))
+        self._compute_hosts = compute_hosts
+
+        total_ram_mb_free = sum(values[0] for values in compute_hosts.values())
+        total_disk_mb_free = sum(values[1]
+                                 for values in compute_hosts.values())
         capacities = {'ram_free': {'total_mb': total_ram_mb_free,
-                                   'units_by_mb': ram_mb_free_units},
+                                   'units_by_mb':
+                                       self._ram_free_units.to_dict()},
                       'disk_free': {'total_mb': total_disk_mb_free,
-                                    'units_by_mb': disk_mb_free_units}}
+                                    'units_by_mb':
+                                        self._disk_free_units.to_dict()}}
         self.my_cell_state.update_capacities(capacities)
 
     @sync_before
@@ -357,6 +436,7 @@ class CellStateManager(base.Base):
         for capab_name, values in capabilities.items():
             capabilities[capab_name] = set(values)
         cell.update_capabilities(capabilities)
+        cell.capabilities_seq = None
 
     @sync_before
     def update_cell_capacities(self, cell_name, capacities):
@@ -369,6 +449,75 @@ class CellStateManager(base.Base):
                       {'cell_name': cell_name})
             return
         cell.update_capacities(capacities)
+        cell.capacities_seq = None
+
+    def _apply_cell_delta(self, cell, kind, seq, full, changed, removed):
+        """Apply a delta update of the capabilities or capacities of a
+        cell, as sent by MessageRunner.tell_parents_our_capabilities() or
+        tell_parents_our_capacities().
+
+        Returns the updated values, or None if updates were missed since
+        the last one applied, in which case a full update is needed.
+        """
+        last_seq = getattr(cell, kind + '_seq')
+        if full:
+            values = {}
+        elif last_seq is None or seq != last_seq + 1:
+            LOG.debug(_("Missed %(kind)s updates from cell %(cell_name)s, "
+                        "got %(seq)s after %(last_seq)s"),
+                      {'kind': kind, 'cell_name': cell.name, 'seq': seq,
+                       'last_seq': last_seq})
+            return None
+        else:
+            values = copy.deepcopy(getattr(cell, kind))
+        cells_utils.apply_dict_delta(values, changed, removed)
+        setattr(cell, kind + '_seq', seq)
+        return values
+
+    @sync_before
+    def update_cell_capabilities_delta(self, cell_name, seq, full, changed,
+                                       removed):
+        """Update capabilities for a cell from a delta update.
+
+        Returns False if updates were missed and a full update is needed.
+        """
+        cell = (self.child_cells.get(cell_name) or
+                self.parent_cells.get(cell_name))
+        if not cell:
+            LOG.error(_("Unknown cell '%(cell_name)s' when trying to "
+                        "update capabilities"),
+                      {'cell_name': cell_name})
+            return True
+        capabilities = self._apply_cell_delta(cell, 'capabilities', seq,
+                                              full, changed, removed)
+        if capabilities is None:
+            return False
+        # Make sure capabilities are sets.
+        for capab_name, values in capabilities.items():
+            capabilities[capab_name] = set(values)
+        cell.update_capabilities(capabilities)
+        return True
+
+    @sync_before
+    def update_cell_capacities_delta(self, cell_name, seq, full, changed,
+                                     removed):
+        """Update capacities for a cell from a delta update.
+
+        Returns False if updates were missed and a full update is needed.
+        """
+        cell = (self.child_cells.get(cell_name) or
+                self.parent_cells.get(cell_name))
+        if not cell:
+            LOG.error(_("Unknown cell '%(cell_name)s' when trying to "
+                        "update capacities"),
+                      {'cell_name': cell_name})
+            return True
+        capacities = self._apply_cell_delta(cell, 'capacities', seq,
+                                            full, changed, removed)
+        if capacities is None:
+            return False
+        cell.update_capacities(capacities)
+        return True
 
     @sync_before
     def get_our_capabilities(self, include_children=True):
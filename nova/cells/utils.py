@@ -16,9 +16,15 @@
 """
 Cells Utility Methods
 """
+import copy
 import random
 
 from nova import db
+from nova import exception
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
 
 # Separator used between cell names for the 'full cell name' and routing
 # path
@@ -54,6 +60,54 @@ def get_instances_to_sync(context, updated_since=None, project_id=None,
             yield instance
 
 
+def get_instance_batches_to_sync(context, batch_size, updated_since=None,
+        project_id=None, deleted=True):
+    """Return a generator that will return lists of at most batch_size
+    active and deleted instances to sync with parent cells.
+
+    Rather than loading all of the instances at once, the instances are
+    fetched a page at a time, when the next list is asked for.
+    """
+    filters = {}
+    if updated_since is not None:
+        filters['changes-since'] = updated_since
+    if project_id is not None:
+        filters['project_id'] = project_id
+    if not deleted:
+        filters['deleted'] = False
+    # The marker needs to be found even if it was deleted meanwhile.
+    context = context.elevated(read_deleted='yes')
+    marker = None
+    # (created_at, id) of the last instance returned.  Unlike deleted or
+    # updated_at, these never change, so the instances created after the
+    # walk started sort after the marker and none is skipped.
+    last_key = None
+    while True:
+        try:
+            instances = db.instance_get_all_by_filters(
+                    context, filters, 'created_at', 'asc', limit=batch_size,
+                    marker=marker)
+        except exception.MarkerNotFound:
+            # The marker was archived meanwhile.  Scan again from the
+            # start, skipping the instances which were already returned.
+            LOG.info(_("Instance %s used as marker is gone, restarting "
+                       "the instance sync scan"), marker)
+            marker = None
+            continue
+        last_page = len(instances) < batch_size
+        if instances:
+            marker = instances[-1]['uuid']
+        if last_key is not None:
+            instances = [instance for instance in instances
+                         if (instance['created_at'],
+                             instance['id']) > last_key]
+        if instances:
+            last_key = (instances[-1]['created_at'], instances[-1]['id'])
+            yield instances
+        if last_page:
+            return
+
+
 def cell_with_item(cell_name, item):
     """Turn cell_name and item into <cell_name>@<item>."""
     if cell_name is None:
@@ -103,3 +157,48 @@ def add_cell_to_task_log(task_log, cell_name):
     """
     task_log['id'] = cell_with_item(cell_name, task_log['id'])
     task_log['host'] = cell_with_item(cell_name, task_log['host'])
+
+
+def dict_delta(old, new):
+    """Return the changes from dict old to dict new.
+
+    Nested dicts are compared key by key.  Returns a list of [path, value]
+    pairs for the values added or changed, and a list of the paths of the
+    values removed, where a path is the list of the keys leading to a value.
+    Both lists can be json encoded, and are applied by apply_dict_delta().
+    """
+    changed = []
+    removed = []
+
+    def _delta(old, new, path):
+        for key, value in new.iteritems():
+            old_value = old.get(key)
+            if isinstance(value, dict) and isinstance(old_value, dict):
+                _delta(old_value, value, path + [key])
+            elif key not in old or old_value != value:
+                changed.append([path + [key], value])
+        for key in old:
+            if key not in new:
+                removed.append(path + [key])
+
+    _delta(old, new, [])
+    return changed, removed
+
+
+def apply_dict_delta(target, changed, removed):
+    """Apply the changes returned by dict_delta() to the dict target."""
+    for path in removed:
+        parent = target
+        for key in path[:-1]:
+            parent = parent.get(key)
+            if not isinstance(parent, dict):
+                break
+        else:
+            parent.pop(path[-1], None)
+    for path, value in changed:
+        parent = target
+        for key in path[:-1]:
+            if not isinstance(parent.get(key), dict):
+                parent[key] = {}
+            parent = parent[key]
+        parent[path[-1]] = copy.deepcopy(value)
@@ -75,8 +75,10 @@ from nova.openstack.common.db import exception as db_exc
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
+from nova import profiler
 from nova import quota
 from nova import rpc
+from nova.scheduler import rpcapi as scheduler_rpcapi
 from nova import servicegroup
 from nova import version
 
@@ -1170,6 +1172,57 @@ class GetLogCommands(object):
             print(_('No nova entries in syslog!'))
 
 
+class SchedulerCommands(object):
+    """Show statistics about the scheduler."""
+
+    @args('--reset', action="store_true",
+          help='Clear the statistics after showing them')
+    def stats(self, reset=False):
+        """Show the time spent in each scheduler filter and weigher.
+
+        The statistics are only recorded when filter_profiling_sample_rate
+        is set in the configuration of the scheduler.  Times are in
+        milliseconds, p50 and p99 are the upper bounds of the histogram
+        buckets holding these percentiles.
+        """
+        ctxt = context.get_admin_context()
+        stats = scheduler_rpcapi.SchedulerAPI().get_profiling_stats(
+                ctxt, reset=reset)
+        if not stats:
+            print(_('No statistics recorded.'))
+            return
+
+        def _format_ms(value):
+            return '-' if value is None else '%.2f' % value
+
+        print_format = "%-8s %-36s %-8s %-8s %-8s %-8s %-8s %-8s %-8s %-8s"
+        print(print_format % (
+                    _('Kind'),
+                    _('Name'),
+                    _('Runs'),
+                    _('Avg'),
+                    _('p50'),
+                    _('p99'),
+                    _('Max'),
+                    _('Avg_In'),
+                    _('Avg_Out'),
+                    _('Avg_DB')))
+        for kind in sorted(stats):
+            for name, stat in sorted(stats[kind].items()):
+                count = float(stat['count'])
+                print(print_format % (
+                        kind, name, stat['count'],
+                        _format_ms(stat['total_time'] * 1000 / count),
+                        _format_ms(profiler.percentile(stat['histogram'],
+                                                       50)),
+                        _format_ms(profiler.percentile(stat['histogram'],
+                                                       99)),
+                        _format_ms(stat['max_time'] * 1000),
+                        '%.1f' % (stat['objs_in'] / count),
+                        '%.1f' % (stat['objs_out'] / count),
+                        '%.1f' % (stat['db_queries'] / count)))
+
+
 class CellCommands(object):
     """Commands for managing cells."""
 
@@ -1252,6 +1305,7 @@ CATEGORIES = {
     'logs': GetLogCommands,
     'network': NetworkCommands,
     'project': ProjectCommands,
+    'scheduler': SchedulerCommands,
     'service': ServiceCommands,
     'shell': ShellCommands,
     'vm': VmCommands,
@@ -23,12 +23,14 @@ from oslo.config import cfg
 from nova import config
 from nova.openstack.common import log as logging
 from nova.openstack.common.report import guru_meditation_report as gmr
+from nova.scheduler import host_claims
 from nova import service
 from nova import utils
 from nova import version
 
 CONF = cfg.CONF
 CONF.import_opt('scheduler_topic', 'nova.scheduler.rpcapi')
+CONF.import_opt('scheduler_workers', 'nova.scheduler.manager')
 
 
 def main():
@@ -40,5 +42,11 @@ def main():
 
     server = service.Service.create(binary='nova-scheduler',
                                     topic=CONF.scheduler_topic)
-    service.serve(server)
+    workers = None
+    if CONF.scheduler_workers > 1:
+        # The workers need to be forked after the claims table is created
+        # to share it
+        host_claims.init()
+        workers = CONF.scheduler_workers
+    service.serve(server, workers=workers)
     service.wait()
@@ -3441,6 +3441,30 @@ class AggregateAPI(base.Base):
                                                     aggregate_payload)
         return self._reformat_aggregate_info(aggregate)
 
+    @wrap_exception()
+    def cache_images(self, context, aggregate_id, image_ids):
+        """Fetches images into the image cache of the aggregate hosts.
+
+        The hosts fetch the images in the background and report their
+        progress with compute.cache_images notifications.
+        """
+        aggregate = aggregate_obj.Aggregate.get_by_id(context, aggregate_id)
+        image_service = glance.get_default_image_service()
+        for image_id in image_ids:
+            # validates the image; ImageNotFound is raised if invalid
+            image_service.show(context, image_id)
+        aggregate_payload = {'aggregate_id': aggregate_id,
+                             'image_ids': image_ids}
+        compute_utils.notify_about_aggregate_update(context,
+                                                    "cacheimages.start",
+                                                    aggregate_payload)
+        for host in aggregate.hosts:
+            self.compute_rpcapi.cache_images(context, host=host,
+                                             image_ids=image_ids)
+        compute_utils.notify_about_aggregate_update(context,
+                                                    "cacheimages.end",
+                                                    aggregate_payload)
+
     def _reformat_aggregate_info(self, aggregate):
         """Builds a dictionary with aggregate props, metadata and hosts."""
         return dict(aggregate.iteritems())
@@ -35,6 +35,7 @@ import traceback
 import uuid
 
 import eventlet.event
+from eventlet import greenpool
 from eventlet import greenthread
 import eventlet.timeout
 from oslo.config import cfg
@@ -120,6 +121,17 @@ compute_opts = [
     cfg.IntOpt('network_allocate_retries',
                default=0,
                help="Number of times to retry network allocation on failures"),
+    cfg.IntOpt('sync_power_state_pool_size',
+               default=1,
+               help='Number of greenthreads used by the sync_power_state '
+                    'periodic task to correct the power states of the '
+                    'instances which are out of sync with the hypervisor. '
+                    'Set to 1 to correct them one at a time.'),
+    cfg.IntOpt('image_cache_concurrency',
+               default=1,
+               help='Number of images fetched at the same time when the '
+                    'image cache of this host is filled ahead of boot by '
+                    'the cache_images aggregate action'),
     ]
 
 interval_opts = [
@@ -224,6 +236,17 @@ get_notifier = functools.partial(rpc.get_notifier, service='compute')
 wrap_exception = functools.partial(exception.wrap_exception,
                                    get_notifier=get_notifier)
 
+# Power states for which _sync_instance_power_state() stops an instance, by
+# vm_state.  The instances in any other combination of vm_state and power
+# state do not need to be synced once their power state is in the database.
+_SYNC_POWER_STATES_TO_STOP = {
+    vm_states.ACTIVE: (power_state.SHUTDOWN, power_state.CRASHED,
+                       power_state.SUSPENDED),
+    vm_states.STOPPED: (power_state.RUNNING, power_state.PAUSED,
+                        power_state.SUSPENDED, power_state.BUILDING),
+    vm_states.PAUSED: (power_state.SHUTDOWN, power_state.CRASHED),
+}
+
 
 @utils.expects_func_args('migration')
 def errors_out_migration(function):
@@ -569,7 +592,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
 class ComputeManager(manager.Manager):
     """Manages the running instances from creation to destruction."""
 
-    target = messaging.Target(version='3.23')
+    target = messaging.Target(version='3.24')
 
     def __init__(self, compute_driver=None, *args, **kwargs):
         """Load configuration options and connect to the hypervisor."""
@@ -5186,17 +5209,21 @@ class ComputeManager(manager.Manager):
     def _sync_power_states(self, context):
         """Align power states between the database and the hypervisor.
 
-        To sync power state data we make a DB call to get the number of
-        virtual machines known by the hypervisor and if the number matches the
-        number of virtual machines known by the database, we proceed in a lazy
-        loop, one database record at a time, checking if the hypervisor has the
-        same power state as is in the database.
+        The power states of all the virtual machines known by the hypervisor
+        are fetched in one call, and only the instances whose power state
+        does not match the database are synced.  Drivers which cannot return
+        all the power states at once are queried one instance at a time.
         """
         db_instances = instance_obj.InstanceList.get_by_host(context,
                                                              self.host,
                                                              use_slave=True)
 
-        num_vm_instances = self.driver.get_num_instances()
+        try:
+            vm_power_states = self.driver.get_power_states()
+            num_vm_instances = len(vm_power_states)
+        except NotImplementedError:
+            vm_power_states = None
+            num_vm_instances = self.driver.get_num_instances()
         num_db_instances = len(db_instances)
 
         if num_vm_instances != num_db_instances:
@@ -5205,33 +5232,63 @@ class ComputeManager(manager.Manager):
                      {'num_db_instances': num_db_instances,
                       'num_vm_instances': num_vm_instances})
 
+        pool = None
+        if CONF.sync_power_state_pool_size > 1:
+            pool = greenpool.GreenPool(CONF.sync_power_state_pool_size)
+
         for db_instance in db_instances:
             if db_instance['task_state'] is not None:
                 LOG.info(_("During sync_power_state the instance has a "
                            "pending task. Skip."), instance=db_instance)
                 continue
-            # No pending tasks. Now try to figure out the real vm_power_state.
-            try:
+            vm_power_state = None
+            if vm_power_states is not None:
+                vm_power_state = vm_power_states.get(db_instance['uuid'],
+                                                     power_state.NOSTATE)
+                if self._power_state_in_sync(db_instance, vm_power_state):
+                    continue
+            if pool:
+                pool.spawn_n(self._query_driver_power_state_and_sync,
+                             context, db_instance, vm_power_state)
+            else:
+                self._query_driver_power_state_and_sync(context, db_instance,
+                                                        vm_power_state)
+
+        if pool:
+            pool.waitall()
+
+    def _power_state_in_sync(self, db_instance, vm_power_state):
+        """Whether _sync_instance_power_state() has nothing to correct."""
+        if db_instance['power_state'] != vm_power_state:
+            return False
+        return vm_power_state not in _SYNC_POWER_STATES_TO_STOP.get(
+                db_instance['vm_state'], ())
+
+    def _query_driver_power_state_and_sync(self, context, db_instance,
+                                           vm_power_state=None):
+        # No pending tasks. Now try to figure out the real vm_power_state.
+        try:
+            if vm_power_state is None:
                 try:
                     vm_instance = self.driver.get_info(db_instance)
                     vm_power_state = vm_instance['state']
                 except exception.InstanceNotFound:
                     vm_power_state = power_state.NOSTATE
-                # Note(maoy): the above get_info call might take a long time,
-                # for example, because of a broken libvirt driver.
-                try:
-                    self._sync_instance_power_state(context,
-                                                    db_instance,
-                                                    vm_power_state,
-                                                    use_slave=True)
-                except exception.InstanceNotFound:
-                    # NOTE(hanlind): If the instance gets deleted during sync,
-                    # silently ignore and move on to next instance.
-                    continue
-            except Exception:
-                LOG.exception(_("Periodic sync_power_state task had an error "
-                                "while processing an instance."),
-                                instance=db_instance)
+            # Note(maoy): the above get_info call might take a long time,
+            # for example, because of a broken libvirt driver.
+            try:
+                self._sync_instance_power_state(context,
+                                                db_instance,
+                                                vm_power_state,
+                                                use_slave=True)
+            except exception.InstanceNotFound:
+                # NOTE(hanlind): If the instance gets deleted during sync,
+                # silently ignore and move on to next instance.
+                pass
+        except Exception:
+            LOG.exception(_("Periodic sync_power_state task had an error "
+                            "while processing an instance."),
+                            instance=db_instance)
 
     def _sync_instance_power_state(self, context, db_instance, vm_power_state,
                                    use_slave=False):
@@ -5616,6 +5673,49 @@ class ComputeManager(manager.Manager):
             else:
                 self._process_instance_event(instance, event)
 
+    def _cache_image(self, context, image_id):
+        """Returns (image_id, error message or None)."""
+        try:
+            self.driver.cache_image(context, image_id)
+        except NotImplementedError:
+            return image_id, _('Caching images is not supported by the '
+                               'virt driver')
+        except Exception as e:
+            LOG.exception(_('Failed to cache image %s'), image_id)
+            return image_id, unicode(e)
+        return image_id, None
+
+    @wrap_exception()
+    def cache_images(self, context, image_ids):
+        """Fetch images into the local image cache ahead of boot.
+
+        Sends a compute.cache_images.progress notification as each image
+        is done, with the error message if it could not be cached.
+        """
+        total = len(image_ids)
+        payload = {'host': self.host, 'image_ids': image_ids}
+        self.notifier.info(context, 'compute.cache_images.start', payload)
+
+        pool = greenpool.GreenPool(CONF.image_cache_concurrency)
+        results = pool.imap(functools.partial(self._cache_image, context),
+                            image_ids)
+        failed = []
+        for index, (image_id, error) in enumerate(results, 1):
+            msg_args = {'image_id': image_id, 'index': index, 'total': total,
+                        'error': error}
+            if error:
+                failed.append(image_id)
+                LOG.warn(_('Image %(image_id)s (%(index)d of %(total)d) was '
+                           'not cached: %(error)s'), msg_args)
+            else:
+                LOG.info(_('Cached image %(image_id)s (%(index)d of '
+                           '%(total)d)'), msg_args)
+            self.notifier.info(context, 'compute.cache_images.progress',
+                               dict(msg_args, host=self.host))
+
+        self.notifier.info(context, 'compute.cache_images.end',
+                           dict(payload, failed=failed))
+
     @periodic_task.periodic_task(spacing=CONF.image_cache_manager_interval,
                                  external_process_ok=True)
     def _run_image_cache_manager_pass(self, context):
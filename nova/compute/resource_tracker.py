@@ -39,6 +39,7 @@ from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.pci import pci_manager
 from nova import rpc
+from nova.scheduler import rpcapi as scheduler_rpcapi
 from nova import utils
 
 resource_tracker_opts = [
@@ -48,7 +49,13 @@ resource_tracker_opts = [
                help='Amount of memory in MB to reserve for the host'),
     cfg.StrOpt('compute_stats_class',
                default='nova.compute.stats.Stats',
-               help='Class that will manage stats for the local compute host')
+               help='Class that will manage stats for the local compute host'),
+    cfg.BoolOpt('compute_resource_updates',
+                default=False,
+                help='Send the changes of the compute node resources to the '
+                     'schedulers, so that the CachingScheduler can keep its '
+                     'host states up to date without reloading them from '
+                     'the database'),
 ]
 
 CONF = cfg.CONF
@@ -57,6 +64,14 @@ CONF.register_opts(resource_tracker_opts)
 LOG = logging.getLogger(__name__)
 COMPUTE_RESOURCE_SEMAPHORE = "compute_resources"
 
+# Fields of the compute node record sent to the schedulers when they change
+RESOURCE_UPDATE_FIELDS = ('vcpus', 'vcpus_used', 'memory_mb',
+                          'memory_mb_used', 'free_ram_mb', 'local_gb',
+                          'local_gb_used', 'free_disk_gb',
+                          'disk_available_least', 'running_vms',
+                          'current_workload', 'stats', 'pci_stats',
+                          'metrics')
+
 CONF.import_opt('my_ip', 'nova.netconf')
 
 
@@ -75,6 +90,8 @@ class ResourceTracker(object):
         self.tracked_instances = {}
         self.tracked_migrations = {}
         self.conductor_api = conductor.API()
+        self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
+        self.published_resources = {}
         monitor_handler = monitors.ResourceMonitorHandler()
         self.monitors = monitor_handler.choose_monitors(self)
         self.notifier = rpc.get_notifier()
@@ -383,6 +400,7 @@ class ResourceTracker(object):
         # initialize load stats from existing instances:
         self.compute_node = self.conductor_api.compute_node_create(context,
                                                                    values)
+        self._publish_resources(context)
 
     def _get_service(self, context):
         try:
@@ -449,6 +467,24 @@ class ResourceTracker(object):
             context, self.compute_node, values)
         if self.pci_tracker:
             self.pci_tracker.save(context)
+        self._publish_resources(context)
+
+    def _publish_resources(self, context):
+        """Send the resources which changed since the last update to the
+        schedulers.
+        """
+        if not CONF.compute_resource_updates:
+            return
+        resources = dict((field, self.compute_node.get(field))
+                         for field in RESOURCE_UPDATE_FIELDS)
+        values = dict((field, value) for field, value in resources.items()
+                      if self.published_resources.get(field) != value)
+        if not values:
+            return
+        values['updated_at'] = self.compute_node.get('updated_at')
+        self.scheduler_rpcapi.update_compute_node_resources(context,
+                self.host, self.nodename, jsonutils.to_primitive(values))
+        self.published_resources = resources
 
     def _update_usage(self, resources, usage, sign=1):
         mem_usage = usage['memory_mb']
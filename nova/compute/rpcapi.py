@@ -241,6 +241,7 @@ class ComputeAPI(object):
         3.21 - Made rebuild take new-world BDM objects
         3.22 - Made terminate_instance take new-world BDM objects
         3.23 - Added external_instance_event()
+        3.24 - Added cache_images()
     '''
 
     VERSION_ALIASES = {
@@ -968,6 +969,10 @@ class ComputeAPI(object):
         cctxt.cast(ctxt, 'external_instance_event', instances=instances,
                    events=events)
 
+    def cache_images(self, ctxt, host, image_ids):
+        cctxt = self.client.prepare(server=host, version='3.24')
+        cctxt.cast(ctxt, 'cache_images', image_ids=image_ids)
+
 
 class SecurityGroupAPI(object):
     '''Client side of the security group rpc API.
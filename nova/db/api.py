@@ -194,6 +194,22 @@ def compute_node_get_all(context, no_date_fields=False):
     return IMPL.compute_node_get_all(context, no_date_fields)
 
 
+def compute_node_get_changes(context, changes_since):
+    """Get the compute nodes that changed since a point in time.
+
+    :param context: The security context
+    :param changes_since: Datetime; nodes created or updated at or after
+                          this time are considered changed
+
+    :returns: A tuple (changed, unchanged).  'changed' is a list of the
+              changed compute nodes in the format of compute_node_get_all().
+              'unchanged' is a list of dictionaries with only the 'id',
+              'service_id', 'hypervisor_hostname' and 'service' keys, one
+              for each of the other compute nodes.
+    """
+    return IMPL.compute_node_get_changes(context, changes_since)
+
+
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     """Get compute nodes by hypervisor hostname.
 
@@ -720,6 +736,19 @@ def instance_update(context, instance_uuid, values, update_cells=True):
     return rv
 
 
+def instance_update_batch(context, updates):
+    """Update several instances, and their info caches, in a single
+    transaction.  Cells are not notified.
+
+    :param updates: = dict of instance uuid to the values to set, which may
+                      include the values of an 'info_cache'
+
+    :returns: a dict of the uuids of the instances that were not updated
+              to the exception raised for them, e.g. InstanceNotFound
+    """
+    return IMPL.instance_update_batch(context, updates)
+
+
 # FIXME(comstud): 'update_cells' is temporary as we transition to using
 # objects.  When everything is using Instance.save(), we can remove the
 # argument and the RPC to nova-cells.
@@ -1146,6 +1175,14 @@ def get_volume_uuid_by_ec2_id(context, ec2_id):
     return IMPL.get_volume_uuid_by_ec2_id(context, ec2_id)
 
 
+def get_ec2_volume_ids_by_uuids(context, volume_ids):
+    """Get the ec2 ids of several volumes, as a dict keyed by uuid.
+
+    Volumes without an ec2 id are left out.
+    """
+    return IMPL.get_ec2_volume_ids_by_uuids(context, volume_ids)
+
+
 def ec2_volume_create(context, volume_id, forced_id=None):
     return IMPL.ec2_volume_create(context, volume_id, forced_id)
 
@@ -1191,6 +1228,13 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                                                          use_slave)
 
 
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    """Get the block device mappings of several instances, by instance uuid."""
+    return IMPL.block_device_mapping_get_all_by_instance_uuids(
+            context, instance_uuids, use_slave)
+
+
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
     """Get block device mapping for a given volume."""
@@ -1682,6 +1726,11 @@ def s3_image_get_by_uuid(context, image_uuid):
     return IMPL.s3_image_get_by_uuid(context, image_uuid)
 
 
+def s3_image_get_all_by_uuids(context, image_uuids):
+    """Find the local s3 images represented by the provided uuids."""
+    return IMPL.s3_image_get_all_by_uuids(context, image_uuids)
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid."""
     return IMPL.s3_image_create(context, image_uuid)
@@ -1848,11 +1897,27 @@ def get_ec2_instance_id_by_uuid(context, instance_id):
     return IMPL.get_ec2_instance_id_by_uuid(context, instance_id)
 
 
+def get_ec2_instance_ids_by_uuids(context, instance_ids):
+    """Get the ec2 ids of several instances, as a dict keyed by uuid.
+
+    Instances without an ec2 id are left out.
+    """
+    return IMPL.get_ec2_instance_ids_by_uuids(context, instance_ids)
+
+
 def get_instance_uuid_by_ec2_id(context, ec2_id):
     """Get uuid through ec2 id from instance_id_mappings table."""
     return IMPL.get_instance_uuid_by_ec2_id(context, ec2_id)
 
 
+def get_instance_uuids_by_ec2_ids(context, ec2_ids):
+    """Get the uuids of several instances, as a dict keyed by ec2 id.
+
+    Ec2 ids without an instance are left out.
+    """
+    return IMPL.get_instance_uuids_by_ec2_ids(context, ec2_ids)
+
+
 def ec2_instance_create(context, instance_uuid, id=None):
     """Create the ec2 id to instance uuid mapping on demand."""
     return IMPL.ec2_instance_create(context, instance_uuid, id)
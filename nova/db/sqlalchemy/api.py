@@ -611,6 +611,61 @@ def compute_node_get_all(context, no_date_fields):
     return compute_nodes
 
 
+@require_admin_context
+def compute_node_get_changes(context, changes_since):
+    engine = get_engine()
+
+    compute_node = models.ComputeNode.__table__
+    service = models.Service.__table__
+
+    with engine.begin() as conn:
+        # The JSON columns are what make compute nodes expensive to fetch,
+        # so only load the full rows of the nodes that changed and just
+        # enough of the others to know they still exist.
+        all_query = select([compute_node.c.id,
+                            compute_node.c.service_id,
+                            compute_node.c.hypervisor_hostname]).\
+                        where(compute_node.c.deleted == 0).\
+                        order_by(compute_node.c.service_id)
+        all_rows = conn.execute(all_query).fetchall()
+
+        changed_query = select([compute_node]).\
+                            where((compute_node.c.deleted == 0) &
+                                  or_(compute_node.c.updated_at >=
+                                          changes_since,
+                                      compute_node.c.created_at >=
+                                          changes_since)).\
+                            order_by(compute_node.c.service_id)
+        changed_rows = conn.execute(changed_query).fetchall()
+
+        service_query = select([service]).\
+                            where((service.c.deleted == 0) &
+                                  (service.c.binary == 'nova-compute')).\
+                            order_by(service.c.id)
+        service_rows = conn.execute(service_query).fetchall()
+
+    services = {}
+    for proxy in service_rows:
+        services[proxy['id']] = dict(proxy.items())
+
+    changed = []
+    for proxy in changed_rows:
+        node = dict(proxy.items())
+        node['service'] = services.get(proxy['service_id'])
+        changed.append(node)
+
+    changed_ids = set(node['id'] for node in changed)
+    unchanged = []
+    for proxy in all_rows:
+        if proxy['id'] in changed_ids:
+            continue
+        node = dict(proxy.items())
+        node['service'] = services.get(proxy['service_id'])
+        unchanged.append(node)
+
+    return changed, unchanged
+
+
 @require_admin_context
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
@@ -2243,63 +2298,113 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False,
         instance_ref = _instance_get_by_uuid(context, instance_uuid,
                                              session=session,
                                              columns_to_join=columns_to_join)
-        if "expected_task_state" in values:
-            # it is not a db column so always pop out
-            expected = values.pop("expected_task_state")
-            if not isinstance(expected, (tuple, list, set)):
-                expected = (expected,)
-            actual_state = instance_ref["task_state"]
-            if actual_state not in expected:
-                if actual_state == task_states.DELETING:
-                    raise exception.UnexpectedDeletingTaskStateError(
-                            actual=actual_state, expected=expected)
-                else:
-                    raise exception.UnexpectedTaskStateError(
-                            actual=actual_state, expected=expected)
-        if "expected_vm_state" in values:
-            expected = values.pop("expected_vm_state")
-            if not isinstance(expected, (tuple, list, set)):
-                expected = (expected,)
-            actual_state = instance_ref["vm_state"]
-            if actual_state not in expected:
-                raise exception.UnexpectedVMStateError(actual=actual_state,
-                                                       expected=expected)
-
-        instance_hostname = instance_ref['hostname'] or ''
-        if ("hostname" in values and
-                values["hostname"].lower() != instance_hostname.lower()):
-                _validate_unique_server_name(context,
-                                             session,
-                                             values['hostname'])
-
-        if copy_old_instance:
-            old_instance_ref = copy.copy(instance_ref)
-        else:
-            old_instance_ref = None
-
-        metadata = values.get('metadata')
-        if metadata is not None:
-            _instance_metadata_update_in_place(context, instance_ref,
-                                               'metadata',
-                                               models.InstanceMetadata,
-                                               values.pop('metadata'),
-                                               session)
-
-        system_metadata = values.get('system_metadata')
-        if system_metadata is not None:
-            _instance_metadata_update_in_place(context, instance_ref,
-                                               'system_metadata',
-                                               models.InstanceSystemMetadata,
-                                               values.pop('system_metadata'),
-                                               session)
-
-        _handle_objects_related_type_conversions(values)
-        instance_ref.update(values)
-        session.add(instance_ref)
+        old_instance_ref = _instance_update_ref(context, instance_ref, values,
+                                                session, copy_old_instance)
 
     return (old_instance_ref, instance_ref)
 
 
+def _instance_update_ref(context, instance_ref, values, session,
+                         copy_old_instance=False):
+    """Update an instance already loaded in the session.
+
+    The expected states and the hostname are checked before anything is
+    changed, so that a failed check leaves the transaction usable.
+    """
+    if "expected_task_state" in values:
+        # it is not a db column so always pop out
+        expected = values.pop("expected_task_state")
+        if not isinstance(expected, (tuple, list, set)):
+            expected = (expected,)
+        actual_state = instance_ref["task_state"]
+        if actual_state not in expected:
+            if actual_state == task_states.DELETING:
+                raise exception.UnexpectedDeletingTaskStateError(
+                        actual=actual_state, expected=expected)
+            else:
+                raise exception.UnexpectedTaskStateError(
+                        actual=actual_state, expected=expected)
+    if "expected_vm_state" in values:
+        expected = values.pop("expected_vm_state")
+        if not isinstance(expected, (tuple, list, set)):
+            expected = (expected,)
+        actual_state = instance_ref["vm_state"]
+        if actual_state not in expected:
+            raise exception.UnexpectedVMStateError(actual=actual_state,
+                                                   expected=expected)
+
+    instance_hostname = instance_ref['hostname'] or ''
+    if ("hostname" in values and
+            values["hostname"].lower() != instance_hostname.lower()):
+            _validate_unique_server_name(context,
+                                         session,
+                                         values['hostname'])
+
+    if copy_old_instance:
+        old_instance_ref = copy.copy(instance_ref)
+    else:
+        old_instance_ref = None
+
+    metadata = values.get('metadata')
+    if metadata is not None:
+        _instance_metadata_update_in_place(context, instance_ref,
+                                           'metadata',
+                                           models.InstanceMetadata,
+                                           values.pop('metadata'),
+                                           session)
+
+    system_metadata = values.get('system_metadata')
+    if system_metadata is not None:
+        _instance_metadata_update_in_place(context, instance_ref,
+                                           'system_metadata',
+                                           models.InstanceSystemMetadata,
+                                           values.pop('system_metadata'),
+                                           session)
+
+    _handle_objects_related_type_conversions(values)
+    instance_ref.update(values)
+    session.add(instance_ref)
+    return old_instance_ref
+
+
+@require_context
+def instance_update_batch(context, updates):
+    failures = {}
+    session = get_session()
+    with session.begin():
+        instance_refs = {}
+        if updates:
+            query = _build_instance_get(context, session=session).\
+                        filter(models.Instance.uuid.in_(updates.keys()))
+            for instance_ref in query.all():
+                instance_refs[instance_ref['uuid']] = instance_ref
+
+        for instance_uuid, values in updates.iteritems():
+            instance_ref = instance_refs.get(instance_uuid)
+            if instance_ref is None:
+                failures[instance_uuid] = exception.InstanceNotFound(
+                        instance_id=instance_uuid)
+                continue
+            values = dict(values)
+            info_cache = values.pop('info_cache', None)
+            try:
+                _instance_update_ref(context, instance_ref, values, session)
+            except (exception.InstanceExists,
+                    exception.UnexpectedTaskStateError,
+                    exception.UnexpectedVMStateError) as exc:
+                failures[instance_uuid] = exc
+                continue
+            if info_cache is not None:
+                try:
+                    _instance_info_cache_update(context, instance_uuid,
+                                                dict(info_cache), session)
+                except exception.InstanceInfoCacheNotFound:
+                    # Deleted instances have their info cache deleted.
+                    pass
+
+    return failures
+
+
 def instance_add_security_group(context, instance_uuid, security_group_id):
     """Associate the given security group with the given instance."""
     sec_group_ref = models.SecurityGroupInstanceAssociation()
@@ -2342,26 +2447,31 @@ def instance_info_cache_update(context, instance_uuid, values):
     """
     session = get_session()
     with session.begin():
-        info_cache = model_query(context, models.InstanceInfoCache,
-                                 session=session).\
-                         filter_by(instance_uuid=instance_uuid).\
-                         first()
-        if info_cache and info_cache['deleted']:
-            raise exception.InstanceInfoCacheNotFound(
-                    instance_uuid=instance_uuid)
-        elif not info_cache:
-            # NOTE(tr3buchet): just in case someone blows away an instance's
-            #                  cache entry, re-create it.
-            info_cache = models.InstanceInfoCache()
-            values['instance_uuid'] = instance_uuid
+        return _instance_info_cache_update(context, instance_uuid, values,
+                                           session)
 
-        try:
-            info_cache.update(values)
-        except db_exc.DBDuplicateEntry:
-            # NOTE(sirp): Possible race if two greenthreads attempt to
-            # recreate the instance cache entry at the same time. First one
-            # wins.
-            pass
+
+def _instance_info_cache_update(context, instance_uuid, values, session):
+    info_cache = model_query(context, models.InstanceInfoCache,
+                             session=session).\
+                     filter_by(instance_uuid=instance_uuid).\
+                     first()
+    if info_cache and info_cache['deleted']:
+        raise exception.InstanceInfoCacheNotFound(
+                instance_uuid=instance_uuid)
+    elif not info_cache:
+        # NOTE(tr3buchet): just in case someone blows away an instance's
+        #                  cache entry, re-create it.
+        info_cache = models.InstanceInfoCache()
+        values['instance_uuid'] = instance_uuid
+
+    try:
+        info_cache.update(values)
+    except db_exc.DBDuplicateEntry:
+        # NOTE(sirp): Possible race if two greenthreads attempt to
+        # recreate the instance cache entry at the same time. First one
+        # wins.
+        pass
 
     return info_cache
 
@@ -3415,6 +3525,18 @@ def get_ec2_volume_id_by_uuid(context, volume_id):
     return result['id']
 
 
+@require_context
+def get_ec2_volume_ids_by_uuids(context, volume_ids):
+    if not volume_ids:
+        return {}
+
+    rows = _ec2_volume_get_query(context).\
+                    filter(models.VolumeIdMapping.uuid.in_(volume_ids)).\
+                    all()
+
+    return dict((row['uuid'], row['id']) for row in rows)
+
+
 @require_context
 def get_volume_uuid_by_ec2_id(context, ec2_id):
     result = _ec2_volume_get_query(context).\
@@ -3561,6 +3683,24 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                  all()
 
 
+@require_context
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    output = dict((instance_uuid, []) for instance_uuid in instance_uuids)
+    if not instance_uuids:
+        return output
+
+    rows = _block_device_mapping_get_query(context, use_slave=use_slave).\
+                 filter(models.BlockDeviceMapping.instance_uuid.in_(
+                     instance_uuids)).\
+                 all()
+
+    for row in rows:
+        output[row['instance_uuid']].append(row)
+
+    return output
+
+
 @require_context
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
@@ -4969,6 +5109,16 @@ def s3_image_get_by_uuid(context, image_uuid):
     return result
 
 
+def s3_image_get_all_by_uuids(context, image_uuids):
+    """Find the local s3 images represented by the provided uuids."""
+    if not image_uuids:
+        return []
+
+    return model_query(context, models.S3Image, read_deleted="yes").\
+                 filter(models.S3Image.uuid.in_(image_uuids)).\
+                 all()
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid."""
     try:
@@ -5465,6 +5615,18 @@ def get_ec2_instance_id_by_uuid(context, instance_id):
     return result['id']
 
 
+@require_context
+def get_ec2_instance_ids_by_uuids(context, instance_ids):
+    if not instance_ids:
+        return {}
+
+    rows = _ec2_instance_get_query(context).\
+                    filter(models.InstanceIdMapping.uuid.in_(instance_ids)).\
+                    all()
+
+    return dict((row['uuid'], row['id']) for row in rows)
+
+
 @require_context
 def get_instance_uuid_by_ec2_id(context, ec2_id):
     result = _ec2_instance_get_query(context).\
@@ -5477,6 +5639,18 @@ def get_instance_uuid_by_ec2_id(context, ec2_id):
     return result['uuid']
 
 
+@require_context
+def get_instance_uuids_by_ec2_ids(context, ec2_ids):
+    if not ec2_ids:
+        return {}
+
+    rows = _ec2_instance_get_query(context).\
+                    filter(models.InstanceIdMapping.id.in_(ec2_ids)).\
+                    all()
+
+    return dict((row['id'], row['uuid']) for row in rows)
+
+
 def _ec2_instance_get_query(context, session=None):
     return model_query(context,
                        models.InstanceIdMapping,
@@ -1419,6 +1419,10 @@ class PluginRetriesExceeded(NovaException):
     msg_fmt = _("Number of retries to plugin (%(num_retries)d) exceeded.")
 
 
+class ImageDownloadFailed(NovaException):
+    msg_fmt = _("Download of image %(image_id)s failed: %(reason)s")
+
+
 class ImageDownloadModuleError(NovaException):
     msg_fmt = _("There was an error with the download module %(module)s. "
                 "%(reason)s")
@@ -20,6 +20,7 @@ Filter support
 from nova import loadables
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
+from nova import profiler
 
 LOG = logging.getLogger(__name__)
 
@@ -68,18 +69,25 @@ class BaseFilterHandler(loadables.BaseLoader):
             filter_properties, index=0):
         list_objs = list(objs)
         LOG.debug(_("Starting with %d host(s)"), len(list_objs))
+        sample = profiler.sample('filter')
         for filter_cls in filter_classes:
             cls_name = filter_cls.__name__
             filter = filter_cls()
 
             if filter.run_filter_for_index(index):
+                if sample:
+                    sample.start(cls_name, len(list_objs))
                 objs = filter.filter_all(list_objs,
                                                filter_properties)
                 if objs is None:
+                    if sample:
+                        sample.stop(0)
                     LOG.debug(_("Filter %(cls_name)s says to stop filtering"),
                           {'cls_name': cls_name})
                     return
                 list_objs = list(objs)
+                if sample:
+                    sample.stop(len(list_objs))
                 if not list_objs:
                     LOG.info(_("Filter %s returned 0 hosts"), cls_name)
                     break
@@ -0,0 +1,356 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Download of images from the image cache of other compute hosts.
+
+When many compute hosts boot the same image, downloading it from the image
+cache of the hosts which already hold it spares the glance API servers.
+Each compute host runs nova-image-peer, which serves its image cache over
+HTTP and periodically records the images it holds in a registry, a JSON
+file on storage shared by the compute hosts.  Adding 'peer' to
+allowed_direct_url_schemes makes the downloads try up to max_peers hosts
+holding the image before falling back to glance.
+
+The requests between hosts are signed with an HMAC of the [image_peer]
+shared_secret, which must be the same on all the compute hosts, and the
+downloaded images are checked against their glance checksum.
+
+The registry records the md5 of the image cached by each host, and only the
+hosts whose image matches the glance checksum are tried.  The images
+converted to raw by force_raw_images differ from the ones held by glance, so
+only the images cached in their original format, such as the raw images
+with force_raw_images, are downloaded from other hosts.
+
+Several compute hosts can be run on a single machine by giving each of them
+its own instances_path and [image_peer] url, and the same registry_path.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import time
+
+from oslo.config import cfg
+from six.moves import urllib
+import webob
+import webob.dec
+import webob.exc
+
+from nova import exception
+import nova.image.download.base as xfer_base
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova import utils
+from nova.virt.libvirt import imagecache
+from nova import wsgi
+
+
+peer_opts = [
+    cfg.StrOpt('registry_path',
+               help='Path of the file, on storage shared by the compute '
+                    'hosts, recording the images held by the image cache '
+                    'of each host.  Images are not downloaded from other '
+                    'compute hosts if unset'),
+    cfg.StrOpt('url',
+               default='http://$my_ip:9494',
+               help='URL at which nova-image-peer serves the image cache of '
+                    'this host to the other compute hosts'),
+    cfg.StrOpt('shared_secret',
+               secret=True,
+               help='Secret shared by the compute hosts, used to sign the '
+                    'requests for the images of their image cache.  Images '
+                    'are not downloaded from other compute hosts if unset'),
+    cfg.StrOpt('listen',
+               default='$my_ip',
+               help='IP address on which nova-image-peer listens'),
+    cfg.IntOpt('listen_port',
+               default=9494,
+               help='Port on which nova-image-peer listens'),
+    cfg.IntOpt('registry_interval',
+               default=60,
+               help='Number of seconds between the updates of the registry '
+                    'by nova-image-peer.  Hosts which did not update the '
+                    'registry for 3 intervals are not used'),
+    cfg.IntOpt('max_peers',
+               default=3,
+               help='Maximum number of compute hosts tried before '
+                    'downloading an image from glance'),
+    cfg.IntOpt('timeout',
+               default=60,
+               help='Timeout in seconds of the connections to other '
+                    'compute hosts'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(peer_opts, group='image_peer')
+CONF.import_opt('my_ip', 'nova.netconf')
+CONF.import_opt('instances_path', 'nova.compute.manager')
+CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
+
+LOG = logging.getLogger(__name__)
+
+# Only the images downloaded from glance are served, not the kernels stored
+# under their image id, nor the ephemeral disks or the files being written.
+_CACHE_FNAME_RE = re.compile('^[0-9a-f]{40}$')
+
+_CHUNK_SIZE = 65536
+
+# Number of seconds during which a signed request is accepted.
+_SIGNATURE_LIFETIME = 300
+
+# md5 of the cached images, keyed by path, with the size and modification
+# time they were computed for, so that each image is only read once.
+_CHECKSUMS = {}
+
+
+def _get_cache_dir():
+    return os.path.join(CONF.instances_path,
+                        CONF.image_cache_subdirectory_name)
+
+
+def _read_registry():
+    try:
+        with open(CONF.image_peer.registry_path) as f:
+            return json.loads(f.read())
+    except IOError:
+        return {}
+    except ValueError:
+        LOG.warning(_("Cannot decode JSON from %s"),
+                    CONF.image_peer.registry_path)
+        return {}
+
+
+def _is_enabled():
+    return bool(CONF.image_peer.registry_path and
+                CONF.image_peer.shared_secret)
+
+
+def _sign(fname, expires):
+    return hmac.new(CONF.image_peer.shared_secret,
+                    '%s:%d' % (fname, expires),
+                    hashlib.sha256).hexdigest()
+
+
+def _signature_matches(signature, expected):
+    # Compare in constant time, so that the signature cannot be guessed
+    # from the response times.
+    if len(signature) != len(expected):
+        return False
+    result = 0
+    for x, y in zip(signature, expected):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+def _get_checksum(path):
+    st = os.stat(path)
+    cached = _CHECKSUMS.get(path)
+    if cached and cached[:2] == (st.st_size, st.st_mtime):
+        return cached[2]
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), ''):
+            md5.update(chunk)
+    _CHECKSUMS[path] = (st.st_size, st.st_mtime, md5.hexdigest())
+    return md5.hexdigest()
+
+
+def register_cache(cache_dir=None):
+    """Record the images held by the image cache of this host."""
+    if not _is_enabled():
+        return
+    registry_path = CONF.image_peer.registry_path
+    cache_dir = cache_dir or _get_cache_dir()
+    checksums = {}
+    if os.path.isdir(cache_dir):
+        for fname in os.listdir(cache_dir):
+            if not _CACHE_FNAME_RE.match(fname):
+                continue
+            try:
+                checksums[fname] = _get_checksum(os.path.join(cache_dir,
+                                                              fname))
+            except (IOError, OSError):
+                # Removed by the image cache manager meanwhile
+                continue
+    url = CONF.image_peer.url
+
+    @utils.synchronized('image-peer-registry', external=True,
+                        lock_path=os.path.dirname(registry_path))
+    def do_register_cache():
+        registry = _read_registry()
+        now = time.time()
+        for fname in set(registry) | set(checksums):
+            peers = registry.setdefault(fname, {})
+            if fname in checksums:
+                peers[url] = {'updated_at': now,
+                              'checksum': checksums[fname]}
+            else:
+                peers.pop(url, None)
+            if not peers:
+                del registry[fname]
+
+        # NOTE: the registry is read without the lock, so it is replaced
+        # rather than rewritten in place.
+        tmp_path = '%s.%s' % (registry_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(registry))
+        os.rename(tmp_path, registry_path)
+
+    do_register_cache()
+
+
+def get_peers(fname, checksum):
+    """Return the URLs of the other hosts holding a cached image.
+
+    Only the hosts whose image matches checksum are returned.
+    """
+    if not _is_enabled():
+        return []
+    oldest = time.time() - 3 * CONF.image_peer.registry_interval
+    peers = []
+    for url, entry in _read_registry().get(fname, {}).items():
+        if (url != CONF.image_peer.url and entry['updated_at'] >= oldest and
+                entry['checksum'] == checksum):
+            peers.append(url)
+    random.shuffle(peers)
+    return peers
+
+
+def _fetch_from_peer(peer_url, fname, dst_path, checksum):
+    expires = int(time.time()) + _SIGNATURE_LIFETIME
+    req = urllib.request.Request(
+            '%s/%s' % (peer_url.rstrip('/'), fname),
+            headers={'X-Image-Peer-Expires': str(expires),
+                     'X-Image-Peer-Signature': _sign(fname, expires)})
+    resp = urllib.request.urlopen(req, timeout=CONF.image_peer.timeout)
+    md5 = hashlib.md5()
+    try:
+        length = int(resp.info().getheader('Content-Length'))
+        copied = 0
+        with open(dst_path, 'wb') as f:
+            for chunk in iter(lambda: resp.read(_CHUNK_SIZE), ''):
+                f.write(chunk)
+                md5.update(chunk)
+                copied += len(chunk)
+    finally:
+        resp.close()
+    if copied != length:
+        raise IOError(_("received %(copied)d of %(length)d bytes") %
+                      {'copied': copied, 'length': length})
+    # A corrupt or compromised host must not spread its images to the
+    # image cache of the other hosts.
+    if md5.hexdigest() != checksum:
+        os.unlink(dst_path)
+        raise IOError(_("checksum %(actual)s does not match the expected "
+                        "checksum %(expected)s") %
+                      {'actual': md5.hexdigest(), 'expected': checksum})
+
+
+class PeerTransfer(xfer_base.TransferBase):
+
+    def download(self, context, url_parts, dst_path, metadata, **kwargs):
+        """Download an image from another compute host.
+
+        metadata must hold the checksum of the image known by glance,
+        which the downloaded data is checked against.
+        """
+        image_id = url_parts.netloc
+        checksum = metadata.get('checksum')
+        if not checksum:
+            msg = _('Image %s has no checksum to check it against') % image_id
+            raise exception.ImageDownloadModuleError(reason=msg,
+                                                     module=str(self))
+        fname = imagecache.get_cache_fname({'image_id': image_id},
+                                           'image_id')
+        peers = get_peers(fname, checksum)
+        for peer_url in peers[:CONF.image_peer.max_peers]:
+            try:
+                _fetch_from_peer(peer_url, fname, dst_path, checksum)
+            except IOError as e:
+                LOG.warning(_("Failed to download image %(image_id)s from "
+                              "%(peer_url)s: %(error)s"),
+                            {'image_id': image_id, 'peer_url': peer_url,
+                             'error': e})
+                continue
+            LOG.info(_("Downloaded image %(image_id)s from %(peer_url)s"),
+                     {'image_id': image_id, 'peer_url': peer_url})
+            return
+        msg = _('No compute host could provide image %s') % image_id
+        raise exception.ImageDownloadModuleError(reason=msg,
+                                                 module=str(self))
+
+
+class PeerImageApplication(object):
+    """Serves the images of the image cache of this host."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @webob.dec.wsgify
+    def __call__(self, req):
+        if req.method not in ('GET', 'HEAD'):
+            return webob.exc.HTTPMethodNotAllowed()
+        fname = req.path_info.strip('/')
+        if not _CACHE_FNAME_RE.match(fname):
+            return webob.exc.HTTPNotFound()
+        if not self._is_authorized(req, fname):
+            return webob.exc.HTTPForbidden()
+        try:
+            f = open(os.path.join(self.cache_dir, fname), 'rb')
+        except IOError:
+            return webob.exc.HTTPNotFound()
+
+        resp = webob.Response(content_type='application/octet-stream')
+        resp.content_length = os.fstat(f.fileno()).st_size
+        resp.app_iter = self._read_file(f)
+        return resp
+
+    @staticmethod
+    def _is_authorized(req, fname):
+        if not CONF.image_peer.shared_secret:
+            return False
+        try:
+            expires = int(req.headers.get('X-Image-Peer-Expires'))
+        except (TypeError, ValueError):
+            return False
+        signature = req.headers.get('X-Image-Peer-Signature', '')
+        if expires < time.time():
+            return False
+        return _signature_matches(signature, _sign(fname, expires))
+
+    @staticmethod
+    def _read_file(f):
+        with f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), ''):
+                yield chunk
+
+
+def get_wsgi_server():
+    return wsgi.Server("Image peer",
+                       PeerImageApplication(_get_cache_dir()),
+                       port=CONF.image_peer.listen_port,
+                       host=CONF.image_peer.listen)
+
+
+def get_download_handler(**kwargs):
+    return PeerTransfer()
+
+
+def get_schemes():
+    return ['peer']
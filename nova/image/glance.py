@@ -18,12 +18,16 @@
 from __future__ import absolute_import
 
 import copy
+import httplib
 import itertools
 import json
+import os
 import random
+import socket
 import sys
 import time
 
+from eventlet import greenpool
 import glanceclient
 import glanceclient.exc
 from oslo.config import cfg
@@ -67,6 +71,17 @@ glance_opts = [
                 help='A list of url scheme that can be downloaded directly '
                      'via the direct_url.  Currently supported schemes: '
                      '[file].'),
+    cfg.IntOpt('glance_download_concurrency',
+               default=1,
+               help='Number of byte ranges of an image downloaded '
+                    'concurrently from glance.  Values above 1 require '
+                    'glance API servers supporting HTTP range requests, '
+                    'images are downloaded as a single stream otherwise'),
+    cfg.IntOpt('glance_download_range_size',
+               default=64 * 1024 * 1024,
+               help='Size in bytes of the byte ranges downloaded '
+                    'concurrently when glance_download_concurrency is '
+                    'above 1'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -197,6 +212,27 @@ class GlanceClientWrapper(object):
         """Call a glance client method.  If we get a connection error,
         retry the request according to CONF.glance_num_retries.
         """
+        def _call(client):
+            return getattr(client.images, method)(*args, **kwargs)
+        return self._call_with_retries(context, version, method, _call)
+
+    def raw_request(self, context, version, method, url, **kwargs):
+        """Send an HTTP request to glance, retrying like call().
+
+        Returns the response and an iterator over the body, or None if the
+        glanceclient in use cannot send raw requests.
+        """
+        def _call(client):
+            # NOTE: raw_request() is not part of the public API of
+            # glanceclient, and newer versions no longer have it.
+            http_raw_request = getattr(client.http_client, 'raw_request',
+                                       None)
+            if http_raw_request is None:
+                return None
+            return http_raw_request(method, url, **kwargs)
+        return self._call_with_retries(context, version, method, _call)
+
+    def _call_with_retries(self, context, version, method, func):
         retry_excs = (glanceclient.exc.ServiceUnavailable,
                 glanceclient.exc.InvalidEndpoint,
                 glanceclient.exc.CommunicationError)
@@ -206,7 +242,7 @@ class GlanceClientWrapper(object):
             client = self.client or self._create_onetime_client(context,
                                                                 version)
             try:
-                return getattr(client.images, method)(*args, **kwargs)
+                return func(client)
             except retry_excs as e:
                 host = self.host
                 port = self.port
@@ -310,6 +346,13 @@ class GlanceImageService(object):
         """Calls out to Glance for data and writes data."""
         if CONF.allowed_direct_url_schemes and dst_path is not None:
             locations = self._get_locations(context, image_id)
+            if 'peer' in self._download_handlers:
+                # NOTE: the other compute hosts are not locations known by
+                # glance, try them before the glance locations.  What they
+                # send is checked against the checksum known by glance.
+                checksum = self.show(context, image_id).get('checksum')
+                locations.insert(0, {'url': 'peer://%s' % image_id,
+                                     'metadata': {'checksum': checksum}})
             for entry in locations:
                 loc_url = entry['url']
                 loc_meta = entry['metadata']
@@ -325,6 +368,11 @@ class GlanceImageService(object):
                     except Exception as ex:
                         LOG.exception(ex)
 
+        if (data is None and dst_path is not None and
+                CONF.glance_download_concurrency > 1):
+            if self._download_ranges(context, image_id, dst_path):
+                return
+
         try:
             image_chunks = self._client.call(context, 1, 'data', image_id)
         except Exception:
@@ -345,6 +393,95 @@ class GlanceImageService(object):
                 if close_file:
                     data.close()
 
+    def _download_ranges(self, context, image_id, dst_path):
+        """Download an image as byte ranges fetched concurrently.
+
+        The ranges are written at their offset in dst_path, which is
+        created as a sparse file of the size of the image.  Returns False
+        if the image is too small to be split, or if glance does not
+        support range requests.
+        """
+        size = self.show(context, image_id).get('size')
+        range_size = CONF.glance_download_range_size
+        if not size or size <= range_size:
+            return False
+
+        with open(dst_path, 'wb') as f:
+            f.truncate(size)
+
+        ranges = [(start, min(start + range_size, size))
+                  for start in xrange(0, size, range_size)]
+        # The first range tells whether glance supports range requests.
+        if not self._download_range(context, image_id, dst_path, ranges[0]):
+            LOG.info(_("Range requests are not supported, downloading "
+                       "image %s as a single stream"), image_id)
+            return False
+
+        pool = greenpool.GreenPool(CONF.glance_download_concurrency)
+        threads = [pool.spawn(self._download_range, context, image_id,
+                              dst_path, byte_range)
+                   for byte_range in ranges[1:]]
+        # Wait for all the ranges before returning, so that none is still
+        # writing to dst_path when it is removed or written again.
+        downloaded = True
+        exc_info = None
+        for thread in threads:
+            try:
+                downloaded = thread.wait() and downloaded
+            except Exception:
+                exc_info = exc_info or sys.exc_info()
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return downloaded
+
+    def _download_range(self, context, image_id, dst_path, byte_range):
+        """Download the bytes [start, end) of an image to dst_path.
+
+        After a network error, the download is resumed where it stopped,
+        according to CONF.glance_num_retries.  Returns False if glance
+        returned the whole image instead of the range, or if range requests
+        cannot be sent with the glanceclient in use.
+        """
+        start, end = byte_range
+        url = '/v1/images/%s' % urlparse.quote(str(image_id))
+        num_attempts = 1 + CONF.glance_num_retries
+        for attempt in xrange(1, num_attempts + 1):
+            headers = {'Range': 'bytes=%d-%d' % (start, end - 1)}
+            result = self._client.raw_request(context, 1, 'GET', url,
+                                              headers=headers)
+            if result is None:
+                return False
+            resp, body = result
+            reason = None
+            try:
+                if resp.status != 206:
+                    return False
+
+                fd = os.open(dst_path, os.O_WRONLY)
+                try:
+                    os.lseek(fd, start, os.SEEK_SET)
+                    for chunk in body:
+                        os.write(fd, chunk)
+                        start += len(chunk)
+                except (IOError, socket.error, httplib.IncompleteRead) as e:
+                    reason = e
+                finally:
+                    os.close(fd)
+            finally:
+                # The body may not have been read to the end.
+                resp.close()
+            if start >= end:
+                return True
+
+            reason = reason or _("response ended at byte %d") % start
+            if attempt == num_attempts:
+                raise exception.ImageDownloadFailed(image_id=image_id,
+                                                    reason=reason)
+            LOG.warn(_("Error downloading image %(image_id)s, retrying from "
+                       "byte %(start)d: %(reason)s"),
+                     {'image_id': image_id, 'start': start,
+                      'reason': reason})
+
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
         sent_service_image_meta = _translate_to_glance(image_meta)
@@ -18,10 +18,13 @@
 """Implements vlans, bridges, and iptables rules using linux utilities."""
 
 import calendar
+import collections
 import inspect
 import os
 import re
+import time
 
+from eventlet import greenthread
 import netaddr
 from oslo.config import cfg
 import six
@@ -83,6 +86,20 @@ linux_net_opts = [
     cfg.StrOpt('dnsmasq_config_file',
                default='',
                help='Override the default dnsmasq settings with this file'),
+    cfg.BoolOpt('dhcp_incremental_update',
+                default=False,
+                help='Keep the dhcp-host and DNS entries of the networks in '
+                     'memory and only add or remove the entries of the '
+                     'fixed ip being allocated or deallocated, instead of '
+                     'reloading all the fixed ips of the network from the '
+                     'database. Not used with use_single_default_gateway.'),
+    cfg.FloatOpt('dnsmasq_hup_delay',
+                 default=0.0,
+                 help='Number of seconds to wait before telling dnsmasq to '
+                      'reload its hosts file after an incremental update, '
+                      'so that the updates coming close together are '
+                      'loaded by a single HUP. Set to 0 to reload right '
+                      'away.'),
     cfg.StrOpt('linuxnet_interface_driver',
                default='nova.network.linux_net.LinuxBridgeInterfaceDriver',
                help='Driver used to create ethernet devices.'),
@@ -118,6 +135,24 @@ linux_net_opts = [
                default='',
                help='Regular expression to match iptables rule that should '
                     'always be on the bottom.'),
+    cfg.BoolOpt('iptables_apply_dirty_tables_only',
+                default=False,
+                help='Only save and restore the iptables tables which were '
+                     'modified since they were last applied, instead of '
+                     'restoring all the ipv4 and ipv6 tables managed by '
+                     'nova.'),
+    cfg.FloatOpt('iptables_apply_delay',
+                 default=0.0,
+                 help='Number of seconds to wait for more changes before '
+                      'applying the iptables rules changed by a security '
+                      'group refresh, so that the refreshes coming close '
+                      'together are applied by a single iptables-restore. '
+                      'Set to 0 to apply the rules right away.'),
+    cfg.FloatOpt('iptables_apply_max_latency',
+                 default=5.0,
+                 help='Maximum number of seconds a scheduled apply of the '
+                      'iptables rules can be delayed by the following '
+                      'changes, when iptables_apply_delay is set.'),
     cfg.StrOpt('iptables_drop_action',
                default='DROP',
                help=('The table that iptables to jump to when a packet is '
@@ -148,6 +183,10 @@ def get_binary_name():
 
 binary_name = get_binary_name()
 
+# Maximum number of seconds between the retries of a failed scheduled
+# apply of the iptables rules.
+_MAX_APPLY_RETRY_DELAY = 300
+
 
 class IptablesRule(object):
     """An iptables rule.
@@ -354,6 +393,17 @@ class IptablesManager(object):
 
         self.iptables_apply_deferred = False
 
+        # Scheduled applies, see schedule_apply().  Each call increments
+        # queued_generation, and applied_generation is the last generation
+        # covered by a completed apply.
+        self.queued_generation = 0
+        self.applied_generation = 0
+        self.scheduled_applies = 0
+        self._applier = None
+        self._first_queued = None
+        self._apply_at = None
+        self._apply_failures = 0
+
         # Add a nova-filter-top chain. It's intended to be shared
         # among the various nova components. It sits at the very top
         # of FORWARD and OUTPUT.
@@ -411,6 +461,84 @@ class IptablesManager(object):
         self.iptables_apply_deferred = False
         self.apply()
 
+    def schedule_apply(self):
+        """Apply the current rules soon, in a background greenthread.
+
+        The calls made within iptables_apply_delay seconds of each other are
+        coalesced into a single apply, delayed by at most
+        iptables_apply_max_latency seconds from the first call.  Without
+        iptables_apply_delay, the rules are applied right away.
+        """
+        delay = CONF.iptables_apply_delay
+        if delay <= 0:
+            self.apply()
+            return
+
+        self.queued_generation += 1
+        self._queue_apply(delay)
+
+    def _queue_apply(self, delay):
+        now = time.time()
+        if self._first_queued is None:
+            self._first_queued = now
+        self._apply_at = min(now + delay,
+                             self._first_queued +
+                             CONF.iptables_apply_max_latency)
+        if self._applier is None:
+            self._applier = greenthread.spawn(self._delayed_apply)
+
+    def _delayed_apply(self):
+        while True:
+            wait = self._apply_at - time.time()
+            if wait <= 0:
+                break
+            greenthread.sleep(wait)
+
+        # The calls made from now on need another apply, as the rules may
+        # change after they are saved by this one.
+        self._applier = None
+        self._first_queued = None
+        generation = self.queued_generation
+        try:
+            self.apply()
+        except Exception:
+            self._apply_failures += 1
+            retry_delay = min(
+                    CONF.iptables_apply_delay * 2 ** self._apply_failures,
+                    _MAX_APPLY_RETRY_DELAY)
+            if self._apply_failures == 1:
+                LOG.exception(_("Error applying the iptables rules, "
+                                "retrying in %s seconds"), retry_delay)
+            else:
+                LOG.warn(_("Error applying the iptables rules again, "
+                           "retrying in %s seconds"), retry_delay)
+            # The tables are marked clean before they are restored, so
+            # restore them all on the next try.
+            for table in self.ipv4.values() + self.ipv6.values():
+                table.dirty = True
+            self._apply_at = time.time() + retry_delay
+            if self._applier is None:
+                self._applier = greenthread.spawn(self._delayed_apply)
+            return
+        if self._apply_failures:
+            LOG.info(_("Applied the iptables rules after %d failures"),
+                     self._apply_failures)
+            self._apply_failures = 0
+        LOG.debug(_("Applied %(count)d queued iptables changes"),
+                  {'count': generation - self.applied_generation})
+        self.applied_generation = generation
+        self.scheduled_applies += 1
+
+    def get_apply_stats(self):
+        """Return the counters of the applies scheduled by schedule_apply().
+
+        queued and applied are the generations queued and covered by a
+        completed apply, applies the number of applies they took.
+        """
+        return {'queued': self.queued_generation,
+                'applied': self.applied_generation,
+                'applies': self.scheduled_applies}
+
     def dirty(self):
         for table in self.ipv4.itervalues():
             if table.dirty:
@@ -443,15 +571,32 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
+            if CONF.iptables_apply_dirty_tables_only:
+                tables = dict((name, table)
+                              for name, table in tables.iteritems()
+                              if table.dirty)
+                if not tables:
+                    continue
             all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
                                                 run_as_root=True,
                                                 attempts=5)
             all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                        all_lines[start:end], table, table_name)
-                table.dirty = False
+            if CONF.iptables_apply_dirty_tables_only:
+                # iptables-restore leaves alone the tables missing from its
+                # input, so only the modified tables are given to it.
+                new_lines = []
+                for table_name, table in tables.iteritems():
+                    start, end = self._find_table(all_lines, table_name)
+                    new_lines += self._modify_rules(
+                            all_lines[start:end], table, table_name)
+                    table.dirty = False
+                all_lines = new_lines
+            else:
+                for table_name, table in tables.iteritems():
+                    start, end = self._find_table(all_lines, table_name)
+                    all_lines[start:end] = self._modify_rules(
+                            all_lines[start:end], table, table_name)
+                    table.dirty = False
             self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
                          process_input='\n'.join(all_lines),
                          attempts=5)
@@ -483,27 +628,19 @@ class IptablesManager(object):
             current_lines = fake_table
 
         # Remove any trace of our rules
-        new_filter = filter(lambda line: binary_name not in line,
-                            current_lines)
+        new_filter = [line for line in current_lines
+                      if binary_name not in line]
 
         top_rules = []
         bottom_rules = []
 
         if CONF.iptables_top_regex:
-            regex = re.compile(CONF.iptables_top_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
-            top_rules = temp_filter
+            top_rules, new_filter = self._extract_rules(
+                    CONF.iptables_top_regex, new_filter)
 
         if CONF.iptables_bottom_regex:
-            regex = re.compile(CONF.iptables_bottom_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                    new_filter)
-            bottom_rules = temp_filter
+            bottom_rules, new_filter = self._extract_rules(
+                    CONF.iptables_bottom_regex, new_filter)
 
         seen_chains = False
         rules_index = 0
@@ -518,7 +655,14 @@ class IptablesManager(object):
         if not seen_chains:
             rules_index = 2
 
-        our_rules = top_rules
+        # Index the current lines by their text without the [packet:byte]
+        # counts, to find the duplicates of our top rules in one lookup.
+        current_rules = {}
+        for index, line in enumerate(new_filter):
+            current_rules.setdefault(_strip_counts(line), []).append(index)
+
+        duplicate_indexes = set()
+        our_rules = list(top_rules)
         bot_rules = []
         for rule in rules:
             rule_str = str(rule)
@@ -531,28 +675,19 @@ class IptablesManager(object):
                 # [packet:byte] counts and replace it with [0:0], so let's
                 # go look for a duplicate, and over-ride our table rule if
                 # found.
-
-                # ignore [packet:byte] counts at beginning of line
-                if rule_str.startswith('['):
-                    rule_str = rule_str.split(']', 1)[1]
-                dup_filter = filter(lambda s: rule_str.strip() in s.strip(),
-                                    new_filter)
-
-                new_filter = filter(lambda s:
-                                    rule_str.strip() not in s.strip(),
-                                    new_filter)
-                # if no duplicates, use original rule
-                if dup_filter:
+                dup_indexes = current_rules.pop(_strip_counts(rule_str), None)
+                if dup_indexes:
                     # grab the last entry, if there is one
-                    dup = dup_filter[-1]
-                    rule_str = str(dup)
-                else:
-                    rule_str = str(rule)
-                rule_str.strip()
+                    rule_str = new_filter[dup_indexes[-1]]
+                    duplicate_indexes.update(dup_indexes)
 
-                our_rules += [rule_str]
+                our_rules.append(rule_str)
             else:
-                bot_rules += [rule_str]
+                bot_rules.append(rule_str)
+
+        if duplicate_indexes:
+            new_filter = [line for index, line in enumerate(new_filter)
+                          if index not in duplicate_indexes]
 
         our_rules += bot_rules
 
@@ -566,62 +701,72 @@ class IptablesManager(object):
 
         commit_index = new_filter.index('COMMIT')
         new_filter[commit_index:commit_index] = bottom_rules
-        seen_lines = set()
 
-        def _weed_out_duplicates(line):
+        # Count the chains and rules to remove, each of them removes one
+        # matching line.
+        chains_to_remove = set(remove_chains)
+        rules_to_remove = {}
+        for rule in remove_rules:
+            # ignore [packet:byte] counts at beginning of rules
+            rule_str = _strip_counts(str(rule))
+            rules_to_remove[rule_str] = rules_to_remove.get(rule_str, 0) + 1
+
+        # We filter duplicates, letting the *last* occurrence take
+        # precendence.  We also filter out anything in the "remove"
+        # lists.
+        seen_lines = set()
+        result = []
+        for line in reversed(new_filter):
             # ignore [packet:byte] counts at beginning of lines
-            if line.startswith('['):
-                line = line.split(']', 1)[1]
-            line = line.strip()
-            if line in seen_lines:
-                return False
-            else:
-                seen_lines.add(line)
-                return True
+            key = _strip_counts(line)
+            if key in seen_lines:
+                continue
+            seen_lines.add(key)
 
-        def _weed_out_removes(line):
             # We need to find exact matches here
             if line.startswith(':'):
                 # it's a chain, for example, ":nova-billing - [0:0]"
                 # strip off everything except the chain name
-                line = line.split(':')[1]
-                line = line.split('- [')[0]
-                line = line.strip()
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
-            elif line.startswith('['):
+                chain = line.split(':')[1]
+                chain = chain.split('- [')[0]
+                chain = chain.strip()
+                if chain in chains_to_remove:
+                    chains_to_remove.remove(chain)
+                    continue
+            elif line.startswith('[') and rules_to_remove.get(key):
                 # it's a rule
-                # ignore [packet:byte] counts at beginning of lines
-                line = line.split(']', 1)[1]
-                line = line.strip()
-                for rule in remove_rules:
-                    # ignore [packet:byte] counts at beginning of rules
-                    rule_str = str(rule)
-                    rule_str = rule_str.split(' ', 1)[1]
-                    rule_str = rule_str.strip()
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
+                rules_to_remove[key] -= 1
+                continue
 
             # Leave it alone
-            return True
-
-        # We filter duplicates, letting the *last* occurrence take
-        # precendence.  We also filter out anything in the "remove"
-        # lists.
-        new_filter.reverse()
-        new_filter = filter(_weed_out_duplicates, new_filter)
-        new_filter = filter(_weed_out_removes, new_filter)
-        new_filter.reverse()
+            result.append(line)
+        result.reverse()
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
-        return new_filter
+        return result
+
+    def _extract_rules(self, regex, lines):
+        """Split the lines matching regex from the other lines.
+
+        Returns the matching lines, and the other lines, leaving out those
+        identical to a matching line but for surrounding whitespace.
+        """
+        regex = re.compile(regex)
+        matching = [line for line in lines if regex.search(line)]
+        matching_strs = set(line.strip() for line in matching)
+        others = [line for line in lines
+                  if line.strip() not in matching_strs]
+        return matching, others
+
+
+def _strip_counts(line):
+    """Strip the [packet:byte] counts at the beginning of an iptables line."""
+    if line.startswith('['):
+        line = line.split(']', 1)[1]
+    return line.strip()
 
 
 # NOTE(jkoelker) This is just a nice little stub point since mocking
@@ -891,29 +1036,111 @@ def get_dhcp_leases(context, network_ref):
     return '\n'.join(hosts)
 
 
-def get_dhcp_hosts(context, network_ref):
-    """Get network's hosts config in dhcp-host format."""
-    hosts = []
+class DhcpHosts(object):
+    """The dhcp-host entries of a network, by MAC address.
+
+    Only the first fixed ip of each MAC address gets an entry, the other
+    ones are kept to replace it when it is removed.
+    """
+
+    def __init__(self, fixedips=()):
+        # The entry of each fixed ip, by MAC address and then by address
+        self.hosts = collections.OrderedDict()
+        self.macs = {}
+        for fixedip in fixedips:
+            self.add(fixedip)
+
+    def add(self, fixedip):
+        """Add the entry of a fixed ip, returns whether the text changed."""
+        mac = fixedip.virtual_interface.address
+        address = str(fixedip.address)
+        if address in self.macs:
+            return False
+        entries = self.hosts.setdefault(mac, collections.OrderedDict())
+        entries[address] = _host_dhcp(fixedip)
+        self.macs[address] = mac
+        return len(entries) == 1
+
+    def remove(self, address):
+        """Remove the entry of an address, returns whether the text changed.
+
+        The other fixed ips of its MAC address keep their entries.
+        """
+        address = str(address)
+        mac = self.macs.pop(address, None)
+        if mac is None:
+            return False
+        entries = self.hosts[mac]
+        first = next(iter(entries)) == address
+        del entries[address]
+        if not entries:
+            del self.hosts[mac]
+        return first
+
+    def to_text(self):
+        return '\n'.join(next(entries.itervalues())
+                         for entries in self.hosts.itervalues())
+
+
+class DnsHosts(object):
+    """The hosts file entries of a network, by address."""
+
+    def __init__(self, fixedips=()):
+        self.hosts = collections.OrderedDict()
+        for fixedip in fixedips:
+            self.add(fixedip)
+
+    def add(self, fixedip):
+        """Add the entry of a fixed ip, returns whether the text changed."""
+        address = str(fixedip.address)
+        entry = _host_dns(fixedip)
+        if self.hosts.get(address) == entry:
+            return False
+        self.hosts[address] = entry
+        return True
+
+    def remove(self, address):
+        """Remove the entry of an address, returns whether it had one."""
+        return self.hosts.pop(str(address), None) is not None
+
+    def to_text(self):
+        return '\n'.join(self.hosts.itervalues())
+
+
+# DhcpHosts of the networks updated by update_dhcp(), by device, when
+# CONF.dhcp_incremental_update is set.
+_dhcp_hosts = {}
+
+# DnsHosts of the networks updated by update_dns(), by device, when
+# CONF.dhcp_incremental_update is set.
+_dns_hosts = {}
+
+# Greenthreads sending a delayed HUP to dnsmasq, by device.
+_pending_hups = {}
+
+
+def _get_dhcp_hosts(context, network_ref):
     host = None
     if network_ref['multi_host']:
         host = CONF.host
-    macs = set()
-    for fixedip in fixed_ip_obj.FixedIPList.get_by_network(context,
-                                                           network_ref,
-                                                           host=host):
-        if fixedip.virtual_interface.address not in macs:
-            hosts.append(_host_dhcp(fixedip))
-            macs.add(fixedip.virtual_interface.address)
-    return '\n'.join(hosts)
+    return DhcpHosts(fixed_ip_obj.FixedIPList.get_by_network(context,
+                                                             network_ref,
+                                                             host=host))
+
+
+def get_dhcp_hosts(context, network_ref):
+    """Get network's hosts config in dhcp-host format."""
+    return _get_dhcp_hosts(context, network_ref).to_text()
+
+
+def _get_dns_hosts(context, network_ref):
+    return DnsHosts(fixed_ip_obj.FixedIPList.get_by_network(context,
+                                                            network_ref))
 
 
 def get_dns_hosts(context, network_ref):
     """Get network's DNS hosts in hosts format."""
-    hosts = []
-    for fixedip in fixed_ip_obj.FixedIPList.get_by_network(context,
-                                                           network_ref):
-        hosts.append(_host_dns(fixedip))
-    return '\n'.join(hosts)
+    return _get_dns_hosts(context, network_ref).to_text()
 
 
 def _add_dnsmasq_accept_rules(dev):
@@ -994,14 +1221,131 @@ def release_dhcp(dev, address, mac_address):
 
 def update_dhcp(context, dev, network_ref):
     conffile = _dhcp_file(dev, 'conf')
-    write_to_file(conffile, get_dhcp_hosts(context, network_ref))
+    if _use_incremental_dhcp():
+        dhcp_hosts = _get_dhcp_hosts(context, network_ref)
+        _dhcp_hosts[dev] = dhcp_hosts
+        write_to_file(conffile, dhcp_hosts.to_text())
+    else:
+        write_to_file(conffile, get_dhcp_hosts(context, network_ref))
+    restart_dhcp(context, dev, network_ref)
+
+
+def _use_incremental_dhcp():
+    # The opts file would still need all the fixed ips of the network
+    return (CONF.dhcp_incremental_update and
+            not CONF.use_single_default_gateway)
+
+
+def add_dhcp_host(context, dev, network_ref, fixedip):
+    """Add the dhcp-host and DNS entries of a newly allocated fixed ip.
+
+    fixedip needs its instance and virtual_interface loaded.  Without
+    CONF.dhcp_incremental_update, or before a first update_dhcp() of the
+    device, this is the same as update_dhcp().  The DNS entry is only added
+    once update_dns() was called for the device.
+    """
+    dhcp_hosts = _dhcp_hosts.get(dev)
+    if not _use_incremental_dhcp() or dhcp_hosts is None:
+        update_dhcp(context, dev, network_ref)
+        return
+    changed = False
+    if dhcp_hosts.add(fixedip):
+        _write_hosts_file(_dhcp_file(dev, 'conf'), dhcp_hosts.to_text())
+        changed = True
+    dns_hosts = _dns_hosts.get(dev)
+    if dns_hosts is not None and dns_hosts.add(fixedip):
+        _write_hosts_file(_dhcp_file(dev, 'hosts'), dns_hosts.to_text())
+        changed = True
+    if changed:
+        _queue_reload_dhcp(context, dev, network_ref)
+
+
+def remove_dhcp_host(context, dev, network_ref, address):
+    """Remove the dhcp-host and DNS entries of a deallocated fixed ip.
+
+    Without CONF.dhcp_incremental_update, or before a first update_dhcp() of
+    the device, this is the same as update_dhcp().
+    """
+    dhcp_hosts = _dhcp_hosts.get(dev)
+    if not _use_incremental_dhcp() or dhcp_hosts is None:
+        update_dhcp(context, dev, network_ref)
+        return
+    changed = False
+    if dhcp_hosts.remove(address):
+        _write_hosts_file(_dhcp_file(dev, 'conf'), dhcp_hosts.to_text())
+        changed = True
+    dns_hosts = _dns_hosts.get(dev)
+    if dns_hosts is not None and dns_hosts.remove(address):
+        _write_hosts_file(_dhcp_file(dev, 'hosts'), dns_hosts.to_text())
+        changed = True
+    if changed:
+        _queue_reload_dhcp(context, dev, network_ref)
+
+
+def _write_hosts_file(path, text):
+    # dnsmasq may read the file at any time, so replace it atomically
+    tmpfile = path + '.tmp'
+    write_to_file(tmpfile, text)
+    # Make sure dnsmasq can actually read it (it setuid()s to "nobody")
+    os.chmod(tmpfile, 0o644)
+    os.rename(tmpfile, path)
+
+
+def _queue_reload_dhcp(context, dev, network_ref):
+    delay = CONF.dnsmasq_hup_delay
+    if delay <= 0:
+        _reload_dhcp(context, dev, network_ref)
+    elif dev not in _pending_hups:
+        _pending_hups[dev] = greenthread.spawn_after(
+                delay, _delayed_reload_dhcp, context, dev, network_ref)
+
+
+def _delayed_reload_dhcp(context, dev, network_ref):
+    _pending_hups.pop(dev, None)
+    try:
+        _reload_dhcp(context, dev, network_ref)
+    except Exception:
+        LOG.exception(_('Error reloading dnsmasq for %s'), dev)
+
+
+def _reload_dhcp(context, dev, network_ref):
+    """Tell a running dnsmasq to reload its hosts file.
+
+    (Re)starts dnsmasq with restart_dhcp() if it is not running.
+    """
+    pid = _dnsmasq_pid_for(dev)
+    if pid:
+        conffile = _dhcp_file(dev, 'conf')
+        out, _err = _execute('cat', '/proc/%d/cmdline' % pid,
+                             check_exit_code=False)
+        if conffile.split('/')[-1] in out:
+            try:
+                _execute('kill', '-HUP', pid, run_as_root=True)
+                return
+            except Exception as exc:  # pylint: disable=W0703
+                LOG.error(_('Hupping dnsmasq threw %s'), exc)
     restart_dhcp(context, dev, network_ref)
 
 
 def update_dns(context, dev, network_ref):
     hostsfile = _dhcp_file(dev, 'hosts')
-    write_to_file(hostsfile, get_dns_hosts(context, network_ref))
-    restart_dhcp(context, dev, network_ref)
+    if not _use_incremental_dhcp():
+        write_to_file(hostsfile, get_dns_hosts(context, network_ref))
+        restart_dhcp(context, dev, network_ref)
+        return
+
+    # NOTE: update_dns() is also cast to the other hosts of a multi_host
+    # network, with the network ids only, so the entries are reloaded here.
+    # The host which allocated or deallocated the fixed ip already updated
+    # them in add_dhcp_host() or remove_dhcp_host(), and dnsmasq is only
+    # told to reload the file when they changed.
+    dns_hosts = _get_dns_hosts(context, network_ref)
+    old_dns_hosts = _dns_hosts.get(dev)
+    _dns_hosts[dev] = dns_hosts
+    if (old_dns_hosts is None or
+            old_dns_hosts.to_text() != dns_hosts.to_text()):
+        _write_hosts_file(hostsfile, dns_hosts.to_text())
+        _queue_reload_dhcp(context, dev, network_ref)
 
 
 def update_dhcp_hostfile_with_text(dev, hosts_text):
@@ -1010,6 +1354,11 @@ def update_dhcp_hostfile_with_text(dev, hosts_text):
 
 
 def kill_dhcp(dev):
+    _dhcp_hosts.pop(dev, None)
+    _dns_hosts.pop(dev, None)
+    pending_hup = _pending_hups.pop(dev, None)
+    if pending_hup:
+        pending_hup.cancel()
     pid = _dnsmasq_pid_for(dev)
     if pid:
         # Check that the process exists and looks like a dnsmasq process
@@ -845,6 +845,7 @@ class NetworkManager(manager.Manager):
         #             and use that network here with a method like
         #             network_get_by_compute_host
         address = None
+        fip = None
 
         # NOTE(vish) This db query could be removed if we pass az and name
         #            (or the whole instance object).
@@ -878,6 +879,9 @@ class NetworkManager(manager.Manager):
                 fip.allocated = True
                 fip.virtual_interface_id = vif.id
                 fip.save()
+                # Needed by the dhcp hosts update
+                fip.instance = instance
+                fip.virtual_interface = vif
                 self._do_trigger_security_group_members_refresh_for_instance(
                     instance_id)
 
@@ -889,7 +893,7 @@ class NetworkManager(manager.Manager):
                 self.instance_dns_manager.create_entry(
                     instance_id, str(fip.address), "A",
                     self.instance_dns_domain)
-            self._setup_network_on_host(context, network)
+            self._setup_network_on_host(context, network, fixedip=fip)
 
             quotas.commit(context)
             return address
@@ -961,7 +965,8 @@ class NetworkManager(manager.Manager):
                 # NOTE(cfb): Call teardown before release_dhcp to ensure
                 #            that the IP can't be re-leased after a release
                 #            packet is sent.
-                self._teardown_network_on_host(context, network)
+                self._teardown_network_on_host(context, network,
+                                               address=address)
                 # NOTE(vish): This forces a packet so that the release_fixed_ip
                 #             callback will get called by nova-dhcpbridge.
                 self.driver.release_dhcp(dev, address, vif.address)
@@ -977,7 +982,8 @@ class NetworkManager(manager.Manager):
                     fixed_ip_ref.disassociate()
             else:
                 # We can't try to free the IP address so just call teardown
-                self._teardown_network_on_host(context, network)
+                self._teardown_network_on_host(context, network,
+                                               address=address)
 
         # Commit the reservations
         quotas.commit(context)
@@ -1332,14 +1338,35 @@ class NetworkManager(manager.Manager):
         network = network_obj.Network.get_by_id(context, network_id)
         call_func(context, network)
 
-    def _setup_network_on_host(self, context, network):
-        """Sets up network on this host."""
+    def _setup_network_on_host(self, context, network, fixedip=None):
+        """Sets up network on this host.
+
+        fixedip is the fixed ip just allocated on the network, if any.
+        """
         raise NotImplementedError()
 
-    def _teardown_network_on_host(self, context, network):
-        """Sets up network on this host."""
+    def _teardown_network_on_host(self, context, network, address=None):
+        """Sets up network on this host.
+
+        address is the fixed ip just deallocated on the network, if any.
+        """
         raise NotImplementedError()
 
+    def _update_dhcp(self, context, dev, network, fixedip=None,
+                     address=None):
+        """Update the dhcp hosts of a network.
+
+        Only the entry of the fixed ip allocated or deallocated is updated if
+        the driver supports it.
+        """
+        if fixedip is not None and hasattr(self.driver, 'add_dhcp_host'):
+            self.driver.add_dhcp_host(context, dev, network, fixedip)
+        elif (address is not None and
+                hasattr(self.driver, 'remove_dhcp_host')):
+            self.driver.remove_dhcp_host(context, dev, network, address)
+        else:
+            self.driver.update_dhcp(context, dev, network)
+
     def validate_networks(self, context, networks):
         """check if the networks exists and host
         is set to each network.
@@ -1529,7 +1556,7 @@ class FlatManager(NetworkManager):
                                                      instance=instance)
         fixed_ip_obj.FixedIP.disassociate_by_address(context, address)
 
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, fixedip=None):
         """Setup Network on this host."""
         # NOTE(tr3buchet): this does not need to happen on every ip
         # allocation, this functionality makes more sense in create_network
@@ -1537,7 +1564,7 @@ class FlatManager(NetworkManager):
         network.injected = CONF.flat_injected
         network.save()
 
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         """Tear down network on this host."""
         pass
 
@@ -1653,7 +1680,7 @@ class FlatDHCPManager(RPCAllocateFixedIP, floating_ips.FloatingIP,
         super(FlatDHCPManager, self).init_host()
         self.init_host_floating_ips()
 
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, fixedip=None):
         """Sets up network on this host."""
         network['dhcp_server'] = self._get_dhcp_ip(context, network)
 
@@ -1664,20 +1691,20 @@ class FlatDHCPManager(RPCAllocateFixedIP, floating_ips.FloatingIP,
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._update_dhcp(elevated, dev, network, fixedip=fixedip)
             if CONF.use_ipv6:
                 self.driver.update_ra(context, dev, network)
                 gateway = utils.get_my_linklocal(dev)
                 network.gateway_v6 = gateway
                 network.save()
 
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         if not CONF.fake_network:
             network['dhcp_server'] = self._get_dhcp_ip(context, network)
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._update_dhcp(elevated, dev, network, address=address)
 
     def _get_network_dict(self, network):
         """Returns the dict representing necessary and meta network fields."""
@@ -1776,7 +1803,10 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                                                    "A",
                                                    self.instance_dns_domain)
 
-        self._setup_network_on_host(context, network)
+        # Needed by the dhcp hosts update
+        fip.instance = instance
+        fip.virtual_interface = vif
+        self._setup_network_on_host(context, network, fixedip=fip)
         return address
 
     def add_network_to_project(self, context, project_id, network_uuid=None):
@@ -1865,7 +1895,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             self, context, vpn=True, **kwargs)
 
     @utils.synchronized('setup_network', external=True)
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, fixedip=None):
         """Sets up network on this host."""
         if not network.vpn_public_address:
             address = CONF.vpn_ip
@@ -1889,7 +1919,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._update_dhcp(elevated, dev, network, fixedip=fixedip)
             if CONF.use_ipv6:
                 self.driver.update_ra(context, dev, network)
                 gateway = utils.get_my_linklocal(dev)
@@ -1897,13 +1927,13 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                 network.save()
 
     @utils.synchronized('setup_network', external=True)
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         if not CONF.fake_network:
             network['dhcp_server'] = self._get_dhcp_ip(context, network)
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._update_dhcp(elevated, dev, network, address=address)
 
             # NOTE(ethuleau): For multi hosted networks, if the network is no
             # more used on this host and if VPN forwarding rule aren't handed
@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
+
 from nova import block_device
 from nova.cells import rpcapi as cells_rpcapi
 from nova import db
@@ -176,7 +178,8 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: BlockDeviceMapping <= version 1.1
     # Version 1.2: Added use_slave to get_by_instance_uuid
-    VERSION = '1.2'
+    # Version 1.3: Added get_by_instance_uuids
+    VERSION = '1.3'
 
     fields = {
         'objects': fields.ListOfObjectsField('BlockDeviceMapping'),
@@ -185,6 +188,7 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         '1.0': '1.0',
         '1.1': '1.1',
         '1.2': '1.1',
+        '1.3': '1.1',
     }
 
     @base.remotable_classmethod
@@ -194,6 +198,14 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(
                 context, cls(), BlockDeviceMapping, db_bdms or [])
 
+    @base.remotable_classmethod
+    def get_by_instance_uuids(cls, context, instance_uuids, use_slave=False):
+        db_bdmdict = db.block_device_mapping_get_all_by_instance_uuids(
+                context, instance_uuids, use_slave=use_slave)
+        db_bdmlist = itertools.chain(*db_bdmdict.values())
+        return base.obj_make_list(
+                context, cls(), BlockDeviceMapping, db_bdmlist)
+
     def root_bdm(self):
         try:
             return (bdm_obj for bdm_obj in self if bdm_obj.is_root).next()
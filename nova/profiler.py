@@ -0,0 +1,176 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Sampled statistics about filters and weighers.
+
+For a configurable fraction of the requests, the filter and weight handlers
+record how long each filter and weigher ran, how many objects it was given
+and returned, and how many database queries it made.  The statistics are
+aggregated in memory, per process, and returned by get_stats().
+"""
+
+import random
+import threading
+import time
+
+from oslo.config import cfg
+from sqlalchemy.engine import Engine
+from sqlalchemy import event
+
+profiler_opts = [
+    cfg.FloatOpt('filter_profiling_sample_rate',
+                 default=0.0,
+                 help='Fraction of the requests, between 0.0 and 1.0, for '
+                      'which the time spent in each filter and weigher is '
+                      'recorded. Use "nova-manage scheduler stats" to show '
+                      'the statistics of the scheduler.'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(profiler_opts)
+
+# Upper bounds, in milliseconds, of the buckets of the time histograms. The
+# last bucket counts the runs longer than the last bound.
+HISTOGRAM_BOUNDS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+_stats = {}
+_local = threading.local()
+_query_counter_registered = False
+
+
+def _count_query(conn, cursor, statement, parameters, context,
+                 executemany):
+    _local.db_queries = _get_query_count() + 1
+
+
+def _get_query_count():
+    return getattr(_local, 'db_queries', 0)
+
+
+def _register_query_counter():
+    global _query_counter_registered
+    if not _query_counter_registered:
+        # Listening on the Engine class catches the queries of all engines.
+        # threading.local is greenthread local once eventlet monkey patched
+        # the process, so queries made by other requests are not counted.
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+        _query_counter_registered = True
+
+
+class Stats(object):
+    """Aggregated statistics of a filter or weigher."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.objs_in = 0
+        self.objs_out = 0
+        self.db_queries = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, elapsed, objs_in, objs_out, db_queries):
+        self.count += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.objs_in += objs_in
+        self.objs_out += objs_out
+        self.db_queries += db_queries
+
+        elapsed_ms = elapsed * 1000
+        for i, bound in enumerate(HISTOGRAM_BOUNDS):
+            if elapsed_ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def to_dict(self):
+        return {'count': self.count,
+                'total_time': self.total_time,
+                'max_time': self.max_time,
+                'objs_in': self.objs_in,
+                'objs_out': self.objs_out,
+                'db_queries': self.db_queries,
+                'histogram': list(self.histogram)}
+
+
+def percentile(histogram, percent):
+    """Estimate a percentile, in milliseconds, from a histogram.
+
+    Returns the upper bound of the bucket holding the percentile, or None if
+    it is in the last, unbounded, bucket.
+    """
+    threshold = sum(histogram) * percent / 100.0
+    seen = 0
+    for bound, count in zip(HISTOGRAM_BOUNDS, histogram):
+        seen += count
+        if seen >= threshold:
+            return bound
+    return None
+
+
+class Sample(object):
+    """Records the runs of the filters or weighers of one request.
+
+    Call start() before running a filter or weigher and stop() after.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._name = None
+        self._objs_in = 0
+        self._db_queries = 0
+        self._start = 0.0
+
+    def start(self, name, objs_in):
+        self._name = name
+        self._objs_in = objs_in
+        self._db_queries = _get_query_count()
+        self._start = time.time()
+
+    def stop(self, objs_out):
+        elapsed = time.time() - self._start
+        db_queries = _get_query_count() - self._db_queries
+        stats = _stats.setdefault(self.kind, {}).setdefault(self._name,
+                                                            Stats())
+        stats.add(elapsed, self._objs_in, objs_out, db_queries)
+
+
+def sample(kind):
+    """Return a Sample if this request should be recorded, else None.
+
+    kind is the type of the objects run, e.g. 'filter' or 'weigher'.
+    """
+    rate = CONF.filter_profiling_sample_rate
+    if rate <= 0 or random.random() >= rate:
+        return None
+    _register_query_counter()
+    return Sample(kind)
+
+
+def get_stats(reset=False):
+    """Return the statistics recorded so far, by kind and by name.
+
+    If reset is True, the statistics are cleared after being returned.
+    """
+    result = {}
+    for kind, stats_by_name in _stats.items():
+        result[kind] = dict((name, stats.to_dict())
+                            for name, stats in stats_by_name.items())
+    if reset:
+        _stats.clear()
+    return result
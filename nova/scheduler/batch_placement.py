@@ -0,0 +1,143 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Support for placing many instances of a request in a single pass.
+
+Weights are normalized against the lowest and highest weight of all hosts,
+so consuming resources on one host can in theory change the weight of every
+other host.  In practice it only does when the host held one of those
+bounds, so WeighedHostHeap only re-weighs the host that changed and rebuilds
+everything when a bound moves.
+"""
+
+import heapq
+
+import six
+
+from nova.scheduler import weights
+from nova import weights as base_weights
+
+
+def supports_weighers(weigher_classes):
+    """Return True if the weighers can be used by a WeighedHostHeap.
+
+    Weighers which override weigh_objects() may compute the weight of a host
+    from the other hosts, so they can't be re-weighed one host at a time.
+    """
+    base = six.get_unbound_function(base_weights.BaseWeigher.weigh_objects)
+    return all(six.get_unbound_function(cls.weigh_objects) is base
+               for cls in weigher_classes)
+
+
+class WeighedHostHeap(object):
+    """Hosts ordered by weight, updated one host at a time.
+
+    The weights and the ordering, including the ordering of hosts with the
+    same weight, are the same as the ones returned by
+    HostWeightHandler.get_weighed_objects() for the same hosts.
+    """
+
+    def __init__(self, weigher_classes, hosts, weight_properties):
+        self.weighers = [cls() for cls in weigher_classes]
+        # weigh_objects() extends these bounds with the weights it finds
+        self._minvals = [weigher.minval for weigher in self.weighers]
+        self._maxvals = [weigher.maxval for weigher in self.weighers]
+        self.weight_properties = weight_properties
+        self._hosts = list(hosts)
+        self._index = dict((id(host), i) for i, host in enumerate(self._hosts))
+        self._raw_weights = [
+                dict((i, weigher._weigh_object(host, weight_properties))
+                     for i, host in enumerate(self._hosts))
+                for weigher in self.weighers]
+        self._rebuild()
+
+    def __len__(self):
+        return len(self._weights)
+
+    def _get_bounds(self):
+        bounds = []
+        for minval, maxval, raw_weights in zip(self._minvals, self._maxvals,
+                                               self._raw_weights):
+            lowest = min(raw_weights.itervalues())
+            highest = max(raw_weights.itervalues())
+            if minval is None or lowest < minval:
+                minval = lowest
+            if maxval is None or highest > maxval:
+                maxval = highest
+            bounds.append((float(minval), float(maxval)))
+        return bounds
+
+    def _get_weight(self, i):
+        weight = 0.0
+        for weigher, raw_weights, (minval, maxval) in zip(
+                self.weighers, self._raw_weights, self._bounds):
+            if minval == maxval:
+                normalized = 0
+            else:
+                normalized = (raw_weights[i] - minval) / (maxval - minval)
+            weight += weigher.weight_multiplier() * normalized
+        return weight
+
+    def _rebuild(self):
+        self._bounds = self._get_bounds() if self._index else []
+        self._weights = dict((i, self._get_weight(i))
+                             for i in self._index.itervalues())
+        self._heap = [(-weight, i) for i, weight in self._weights.iteritems()]
+        heapq.heapify(self._heap)
+
+    def _clean_heap(self):
+        """Drop the stale entries from the top of the heap."""
+        while self._heap:
+            neg_weight, i = self._heap[0]
+            if self._weights.get(i) == -neg_weight:
+                return
+            heapq.heappop(self._heap)
+
+    def get_best(self, count=1):
+        """Return the count heaviest hosts as WeighedHosts."""
+        if count == 1:
+            self._clean_heap()
+            if not self._heap:
+                return []
+            best = [self._heap[0]]
+        else:
+            best = heapq.nsmallest(count,
+                    ((-weight, i) for i, weight in self._weights.iteritems()))
+        return [weights.WeighedHost(self._hosts[i], -neg_weight)
+                for neg_weight, i in best]
+
+    def update(self, host):
+        """Re-weigh a host after its state changed."""
+        i = self._index[id(host)]
+        for weigher, raw_weights in zip(self.weighers, self._raw_weights):
+            raw_weights[i] = weigher._weigh_object(host,
+                                                   self.weight_properties)
+        if self._get_bounds() != self._bounds:
+            self._rebuild()
+            return
+        weight = self._get_weight(i)
+        if weight != self._weights[i]:
+            self._weights[i] = weight
+            heapq.heappush(self._heap, (-weight, i))
+
+    def remove(self, host):
+        """Remove a host, e.g. because it no longer passes the filters."""
+        i = self._index.pop(id(host))
+        del self._weights[i]
+        for raw_weights in self._raw_weights:
+            del raw_weights[i]
+        if self._index and self._get_bounds() != self._bounds:
+            self._rebuild()
@@ -13,8 +13,26 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo.config import cfg
+
+from nova.openstack.common import timeutils
 from nova.scheduler import filter_scheduler
 
+caching_scheduler_opts = [
+    cfg.IntOpt('scheduler_cache_reload_interval',
+               default=0,
+               help='Minimum interval in seconds between two reloads of all '
+                    'the host states by the CachingScheduler periodic task. '
+                    'Set it when compute_resource_updates is enabled on the '
+                    'compute nodes, so the cache is kept up to date by the '
+                    'updates they send and only reconciled with the '
+                    'database from time to time. 0 reloads the host states '
+                    'on every run of the periodic task.'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(caching_scheduler_opts)
+
 
 class CachingScheduler(filter_scheduler.FilterScheduler):
     """Scheduler to test aggressive caching of the host list.
@@ -47,20 +65,35 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
 
     In a similar way, if you have a high number of server deletes, the
     extra capacity from those deletes will not show up until the cache is
-    refreshed.
+    refreshed.  Enabling compute_resource_updates on the compute nodes
+    avoids that: the changes of their resources are applied to the cache
+    as they happen, and scheduler_cache_reload_interval can be raised so
+    the full reload is only a safety net.
     """
 
     def __init__(self, *args, **kwargs):
         super(CachingScheduler, self).__init__(*args, **kwargs)
         self.all_host_states = None
+        self.last_reload = None
+
+    def _needs_reload(self):
+        if self.all_host_states is None or self.last_reload is None:
+            return True
+        if CONF.scheduler_cache_reload_interval <= 0:
+            return True
+        return timeutils.is_older_than(self.last_reload,
+                                       CONF.scheduler_cache_reload_interval)
 
     def run_periodic_tasks(self, context):
         """Called from a periodic tasks in the manager."""
+        if not self._needs_reload():
+            return
         elevated = context.elevated()
         # NOTE(johngarbutt) Fetching the list of hosts before we get
         # a user request, so no user requests have to wait while we
         # fetch the list of hosts.
         self.all_host_states = self._get_up_hosts(elevated)
+        self.last_reload = timeutils.utcnow()
 
     def _get_all_host_states(self, context):
         """Called from the filter scheduler, in a template pattern."""
@@ -69,9 +102,21 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
             # comes in before the first run of the periodic task.
             # Rather than raise an error, we fetch the list of hosts.
             self.all_host_states = self._get_up_hosts(context)
+            self.last_reload = timeutils.utcnow()
 
         return self.all_host_states
 
+    def update_compute_node_resources(self, context, host, nodename, values):
+        """Apply the resources changed on a compute node to the cache."""
+        if self.all_host_states is None:
+            # Nothing cached yet
+            return
+        if not self.host_manager.update_compute_node_resources(host,
+                nodename, values):
+            # A new compute node, add it on the next run of the periodic
+            # task
+            self.last_reload = None
+
     def _get_up_hosts(self, context):
         all_hosts_iterator = self.host_manager.get_all_host_states(context)
         return list(all_hosts_iterator)
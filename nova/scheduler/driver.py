@@ -108,6 +108,12 @@ class Scheduler(object):
         """Manager calls this so drivers can perform periodic tasks."""
         pass
 
+    def update_compute_node_resources(self, context, host, nodename, values):
+        """Manager calls this when the resources of a compute node changed,
+        so drivers caching the host states can update them.
+        """
+        pass
+
     def hosts_up(self, context, topic):
         """Return the list of hosts that have a running service for topic."""
 
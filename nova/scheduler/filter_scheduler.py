@@ -30,7 +30,9 @@ from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
 from nova.pci import pci_request
 from nova import rpc
+from nova.scheduler import batch_placement
 from nova.scheduler import driver
+from nova.scheduler import host_claims
 from nova.scheduler import scheduler_options
 from nova.scheduler import utils as scheduler_utils
 
@@ -48,11 +50,23 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_batch_placement',
+                default=False,
+                help='When a request is for more than one instance, filter '
+                     'and weigh the hosts only once, and then only re-check '
+                     'and re-weigh the host chosen for each instance. This '
+                     'assumes the result of each filter for a host only '
+                     'depends on that host. It is not used for requests '
+                     'with affinity or anti-affinity group policies.'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
 
+# Number of hosts claimed by other scheduler workers to skip before giving up
+# on choosing an unclaimed host
+MAX_CLAIM_CONFLICTS = 3
+
 
 class FilterScheduler(driver.Scheduler):
     """Scheduler that can be used for filtering and weighing."""
@@ -321,6 +335,14 @@ class FilterScheduler(driver.Scheduler):
             num_instances = len(instance_uuids)
         else:
             num_instances = request_spec.get('num_instances', 1)
+
+        if (CONF.scheduler_batch_placement and num_instances > 1 and
+                not update_group_hosts and
+                batch_placement.supports_weighers(
+                        self.host_manager.weight_classes)):
+            return self._schedule_batch(hosts, filter_properties,
+                                        instance_properties, num_instances)
+
         for num in xrange(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -336,14 +358,7 @@ class FilterScheduler(driver.Scheduler):
 
             LOG.debug(_("Weighed %(hosts)s"), {'hosts': weighed_hosts})
 
-            scheduler_host_subset_size = CONF.scheduler_host_subset_size
-            if scheduler_host_subset_size > len(weighed_hosts):
-                scheduler_host_subset_size = len(weighed_hosts)
-            if scheduler_host_subset_size < 1:
-                scheduler_host_subset_size = 1
-
-            chosen_host = random.choice(
-                weighed_hosts[0:scheduler_host_subset_size])
+            chosen_host = self._choose_host(weighed_hosts)
             selected_hosts.append(chosen_host)
 
             # Now consume the resources so the filter/weights
@@ -353,6 +368,80 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].add(chosen_host.obj.host)
         return selected_hosts
 
+    def _schedule_batch(self, hosts, filter_properties, instance_properties,
+                        num_instances):
+        """Choose hosts for num_instances instances, filtering and weighing
+        all hosts only once.
+
+        After resources are consumed on a host, only that host is filtered
+        and weighed again.  With a scheduler_host_subset_size of 1, the
+        hosts chosen are the same as the ones chosen by _schedule().
+        """
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties, index=0)
+        if not hosts:
+            return []
+
+        LOG.debug(_("Filtered %(hosts)s"), {'hosts': hosts})
+
+        weighed_hosts = batch_placement.WeighedHostHeap(
+                self.host_manager.weight_classes, hosts, filter_properties)
+
+        # Enough hosts to choose another one when some were claimed by
+        # other scheduler workers
+        best_hosts_count = max(CONF.scheduler_host_subset_size, 1)
+        if host_claims.is_enabled():
+            best_hosts_count += MAX_CLAIM_CONFLICTS
+        selected_hosts = []
+        chosen_host = None
+        for num in xrange(num_instances):
+            if chosen_host is not None:
+                # Only the host we consumed resources from can have changed
+                if self.host_manager.get_filtered_hosts([chosen_host.obj],
+                        filter_properties, index=num):
+                    weighed_hosts.update(chosen_host.obj)
+                else:
+                    weighed_hosts.remove(chosen_host.obj)
+                if not weighed_hosts:
+                    # Can't get any more locally.
+                    break
+
+            chosen_host = self._choose_host(
+                weighed_hosts.get_best(best_hosts_count))
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources so the filter/weights
+            # will change for the next instance.
+            chosen_host.obj.consume_from_instance(instance_properties)
+        return selected_hosts
+
+    def _choose_host(self, weighed_hosts):
+        """Randomly choose one of the scheduler_host_subset_size best
+        weighed hosts.
+
+        With several scheduler workers, a host claimed by another worker
+        since its state was loaded is skipped, as that worker may have used
+        up its resources.  After MAX_CLAIM_CONFLICTS conflicts, the first
+        host chosen is returned anyway and the claim on the compute node
+        decides.
+        """
+        scheduler_host_subset_size = max(CONF.scheduler_host_subset_size, 1)
+        candidates = list(weighed_hosts)
+        first_choice = None
+        for attempt in xrange(MAX_CLAIM_CONFLICTS + 1):
+            chosen_host = random.choice(
+                candidates[0:scheduler_host_subset_size])
+            if first_choice is None:
+                first_choice = chosen_host
+            if host_claims.claim(chosen_host.obj):
+                return chosen_host
+            LOG.debug(_("Host %(host)s was claimed by another scheduler "
+                        "worker"), {'host': chosen_host.obj})
+            candidates.remove(chosen_host)
+            if not candidates:
+                break
+        return first_choice
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
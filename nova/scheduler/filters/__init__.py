@@ -18,6 +18,12 @@ Scheduler host filters
 """
 
 from nova import filters
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova import profiler
+from nova.scheduler import host_columns
+
+LOG = logging.getLogger(__name__)
 
 
 class BaseHostFilter(filters.BaseFilter):
@@ -32,11 +38,63 @@ class BaseHostFilter(filters.BaseFilter):
         """
         raise NotImplementedError()
 
+    def filter_columns(self, columns, mask, filter_properties):
+        """Return a boolean array of the hosts passing the filter.
+
+        Override this in a subclass which can evaluate all hosts at once
+        from a HostColumns.  Only the hosts selected by mask are still
+        being considered.  Return None to fall back to host_passes().
+        """
+        return None
+
 
 class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
 
+    def get_filtered_objects(self, filter_classes, objs,
+            filter_properties, index=0):
+        if not host_columns.is_enabled():
+            return super(HostFilterHandler, self).get_filtered_objects(
+                    filter_classes, objs, filter_properties, index)
+
+        columns = host_columns.HostColumns(objs)
+        mask = columns.all()
+        LOG.debug(_("Starting with %d host(s)"), len(columns))
+        sample = profiler.sample('filter')
+        obj_len = len(columns)
+        for filter_cls in filter_classes:
+            cls_name = filter_cls.__name__
+            filter = filter_cls()
+
+            if filter.run_filter_for_index(index):
+                if sample:
+                    sample.start(cls_name, obj_len)
+                passes = filter.filter_columns(columns, mask,
+                                               filter_properties)
+                if passes is not None:
+                    mask = mask & passes
+                else:
+                    objs = filter.filter_all(columns.select(mask),
+                                             filter_properties)
+                    if objs is None:
+                        if sample:
+                            sample.stop(0)
+                        LOG.debug(_("Filter %(cls_name)s says to stop "
+                                    "filtering"), {'cls_name': cls_name})
+                        return
+                    mask = columns.mask_from(objs)
+                obj_len = int(mask.sum())
+                if sample:
+                    sample.stop(obj_len)
+                if not obj_len:
+                    LOG.info(_("Filter %s returned 0 hosts"), cls_name)
+                    break
+                LOG.debug(_("Filter %(cls_name)s returned "
+                            "%(obj_len)d host(s)"),
+                          {'cls_name': cls_name, 'obj_len': obj_len})
+        return columns.select(mask)
+
 
 def all_filters():
     """Return a list of filter classes found in this directory.
@@ -0,0 +1,41 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Bits that are shared by the scheduler filters."""
+
+from nova import db
+
+
+def aggregate_metadata_get_by_host(host_state, filter_properties, key=None):
+    """Returns the metadata of all aggregates the host belongs to.
+
+    The result has the same format as db.aggregate_metadata_get_by_host():
+    a dict where each value is a set of the values found for that key.
+
+    The HostManager loads the metadata of all aggregates once per refresh
+    and attaches it to each HostState, so filters do not need to query the
+    database for every host.  If a HostState was not populated that way we
+    fall back to the database.
+    """
+    metadata = host_state.aggregates_metadata
+    if metadata is None:
+        context = filter_properties['context'].elevated()
+        return db.aggregate_metadata_get_by_host(context, host_state.host,
+                                                 key=key)
+    if key is None:
+        return metadata
+    if key in metadata:
+        return {key: metadata[key]}
+    return {}
@@ -0,0 +1,89 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Optimistic host claims shared by the scheduler workers.
+
+When nova-scheduler runs several worker processes, each of them schedules
+against its own copy of the host states, and does not see the resources
+consumed by the other workers.  To avoid several workers piling instances
+on the same host, a generation number is kept for each compute node in
+memory shared by the workers.  HostState.generation records the generation
+seen when the host state was loaded, and a worker choosing a host bumps the
+generation only if it did not change in the meantime.  When it did, another
+worker claimed the host first and the loser chooses another host.
+
+The table needs to be created by init() before the workers are forked.
+Without it, claims always succeed.
+"""
+
+import multiprocessing
+import zlib
+
+# Number of generation counters.  Compute nodes whose names hash to the same
+# slot share a generation, which can only cause spurious conflicts.
+SLOTS = 65536
+
+_generations = None
+_lock = None
+
+
+def init(slots=SLOTS):
+    """Create the generation table shared by the processes forked later."""
+    global _generations, _lock
+    _generations = multiprocessing.RawArray('l', slots)
+    _lock = multiprocessing.Lock()
+
+
+def reset():
+    """Drop the generation table, disabling the claims."""
+    global _generations, _lock
+    _generations = None
+    _lock = None
+
+
+def is_enabled():
+    return _generations is not None
+
+
+def _get_slot(host, nodename):
+    return zlib.crc32('%s:%s' % (host, nodename)) % len(_generations)
+
+
+def get_generation(host, nodename):
+    """Return the current generation of a compute node, or None."""
+    if _generations is None:
+        return None
+    return _generations[_get_slot(host, nodename)]
+
+
+def claim(host_state):
+    """Claim a host, before consuming resources on it.
+
+    Returns False if another worker claimed the host since
+    host_state.generation was read.  host_state.generation is updated to the
+    current generation in both cases.
+    """
+    if _generations is None:
+        return True
+    slot = _get_slot(host_state.host, host_state.nodename)
+    with _lock:
+        generation = _generations[slot]
+        claimed = generation == host_state.generation
+        if claimed:
+            generation += 1
+            _generations[slot] = generation
+    host_state.generation = generation
+    return claimed
@@ -0,0 +1,136 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Columnar view of HostStates.
+
+The simple resource filters and weighers only look at a few numeric
+attributes of each HostState.  Keeping those attributes in numpy arrays lets
+them be evaluated for all hosts at once instead of one HostState at a time.
+Filters and weighers which do not know how to do that are still run per
+host on the hosts left by the previous filters.
+
+numpy is an optional dependency: if it is not installed the scheduler
+silently keeps using the per host code path.
+"""
+
+from oslo.config import cfg
+
+try:
+    import numpy
+except ImportError:
+    # This module needs to be importable despite numpy not being a
+    # requirement
+    numpy = None
+
+
+host_columns_opts = [
+    cfg.BoolOpt('scheduler_use_vectorized_filters',
+                default=False,
+                help='Evaluate the filters and weighers which support it '
+                     'on all hosts at once using numpy arrays. Ignored if '
+                     'numpy is not installed.'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(host_columns_opts)
+
+
+def is_enabled():
+    """Return True if filters and weighers should use HostColumns."""
+    return numpy is not None and CONF.scheduler_use_vectorized_filters
+
+
+def normalize(values, minval=None, maxval=None):
+    """Normalize an array of weights between 0 and 1.0.
+
+    This is the vectorized equivalent of BaseWeigher.weigh_objects()
+    followed by nova.weights.normalize(): minval and maxval are extended by
+    the values found in the array.
+    """
+    lowest = values.min()
+    highest = values.max()
+    if minval is None or lowest < minval:
+        minval = lowest
+    if maxval is None or highest > maxval:
+        maxval = highest
+
+    minval = float(minval)
+    maxval = float(maxval)
+    if minval == maxval:
+        return numpy.zeros(len(values))
+
+    return (values - minval) / (maxval - minval)
+
+
+class HostColumns(object):
+    """The resources of a list of HostStates, one numpy array per attribute.
+
+    Columns are built the first time they are accessed, so only the
+    attributes needed by the enabled filters and weighers are copied.
+    Columns are snapshots: a new HostColumns needs to be built after host
+    states are changed by consume_from_instance().
+    """
+
+    attributes = ('free_ram_mb', 'total_usable_ram_mb',
+                  'free_disk_mb', 'total_usable_disk_gb',
+                  'vcpus_total', 'vcpus_used',
+                  'num_io_ops', 'num_instances')
+
+    def __init__(self, host_states):
+        self.host_states = list(host_states)
+        self._index = dict((id(host_state), i)
+                           for i, host_state in enumerate(self.host_states))
+
+    def __len__(self):
+        return len(self.host_states)
+
+    def __getattr__(self, name):
+        if name not in self.attributes:
+            raise AttributeError(name)
+        column = numpy.array([getattr(host_state, name)
+                              for host_state in self.host_states],
+                             dtype=numpy.float64)
+        # Cache it, __getattr__ is only called for missing attributes
+        setattr(self, name, column)
+        return column
+
+    def metric(self, name):
+        """Return the values of a metric, NaN for the hosts without it."""
+        values = []
+        for host_state in self.host_states:
+            item = host_state.metrics.get(name)
+            values.append(item.value if item is not None else numpy.nan)
+        return numpy.array(values, dtype=numpy.float64)
+
+    def all(self):
+        """Return a mask selecting all hosts."""
+        return numpy.ones(len(self.host_states), dtype=bool)
+
+    def select(self, mask):
+        """Return the list of HostStates selected by a mask."""
+        return [self.host_states[i] for i in numpy.flatnonzero(mask)]
+
+    def mask_from(self, host_states):
+        """Return a mask selecting the given HostStates."""
+        mask = numpy.zeros(len(self.host_states), dtype=bool)
+        for host_state in host_states:
+            mask[self._index[id(host_state)]] = True
+        return mask
+
+    def set_limits(self, key, values, mask):
+        """Save an oversubscription limit for the hosts selected by mask."""
+        for i in numpy.flatnonzero(mask):
+            self.host_states[i].limits[key] = float(values[i])
@@ -21,6 +21,7 @@ import collections
 import UserDict
 
 from oslo.config import cfg
+import six
 
 from nova.compute import task_states
 from nova.compute import vm_states
@@ -33,6 +34,7 @@ from nova.openstack.common import timeutils
 from nova.pci import pci_request
 from nova.pci import pci_stats
 from nova.scheduler import filters
+from nova.scheduler import host_claims
 from nova.scheduler import weights
 
 host_manager_opts = [
@@ -56,6 +58,18 @@ host_manager_opts = [
     cfg.ListOpt('scheduler_weight_classes',
                 default=['nova.scheduler.weights.all_weighers'],
                 help='Which weight class names to use for weighing hosts'),
+    cfg.BoolOpt('scheduler_incremental_host_refresh',
+                default=False,
+                help='Only reload the compute nodes which were created or '
+                     'updated since the last refresh of the host states. '
+                     'This relies on the clocks of the compute hosts being '
+                     'in sync with the scheduler.'),
+    cfg.IntOpt('scheduler_full_host_refresh_interval',
+               default=600,
+               help='Interval in seconds between full reloads of the '
+                    'compute nodes when '
+                    'scheduler_incremental_host_refresh is enabled. '
+                    'Set to 0 to never force a full reload.'),
     ]
 
 CONF = cfg.CONF
@@ -101,12 +115,46 @@ MetricItem = collections.namedtuple(
              'MetricItem', ['value', 'timestamp', 'source'])
 
 
+# Prefixes of the per-instance counters reported in the compute node stats,
+# with the HostState attribute counting them.
+_STATS_COUNTERS = (('num_proj_', '_num_instances_by_project'),
+                   ('num_vm_', '_vm_states'),
+                   ('num_task_', '_task_states'),
+                   ('num_os_type_', '_num_instances_by_os_type'))
+
+# Strings used as keys of the stats counters, shared by all the host states.
+_interned_keys = {}
+
+
+def _intern(key):
+    # The built-in intern() does not accept unicode strings, which is what
+    # jsonutils.loads() returns.
+    return _interned_keys.setdefault(key, key)
+
+
 class HostState(object):
     """Mutable and immutable information tracked for a host.
     This is an attempt to remove the ad-hoc data structures
     previously used and lock down access.
+
+    The stats, metrics and supported_instances of the compute node are kept
+    in their JSON form by update_from_compute_node() and only decoded when
+    they, or the counters taken from the stats, are first accessed.
     """
 
+    __slots__ = ('host', 'nodename', 'capabilities', 'service',
+                 'total_usable_ram_mb', 'total_usable_disk_gb',
+                 'disk_mb_used', 'free_ram_mb', 'free_disk_mb',
+                 'vcpus_total', 'vcpus_used',
+                 '_stats', '_stats_json', '_vm_states', '_task_states',
+                 '_num_instances', '_num_instances_by_project',
+                 '_num_instances_by_os_type', '_num_io_ops',
+                 'host_ip', 'hypervisor_type', 'hypervisor_version',
+                 'hypervisor_hostname', 'cpu_info',
+                 '_supported_instances', '_supported_instances_json',
+                 'limits', '_metrics', '_metrics_json', 'pci_stats',
+                 'aggregates_metadata', 'generation', 'updated')
+
     def __init__(self, host, node, capabilities=None, service=None):
         self.host = host
         self.nodename = node
@@ -122,13 +170,16 @@ class HostState(object):
         self.vcpus_total = 0
         self.vcpus_used = 0
 
-        # Additional host information from the compute node stats:
-        self.vm_states = {}
-        self.task_states = {}
-        self.num_instances = 0
-        self.num_instances_by_project = {}
-        self.num_instances_by_os_type = {}
-        self.num_io_ops = 0
+        # Additional host information from the compute node stats, see the
+        # properties below:
+        self._stats = {}
+        self._stats_json = None
+        self._vm_states = {}
+        self._task_states = {}
+        self._num_instances = 0
+        self._num_instances_by_project = {}
+        self._num_instances_by_os_type = {}
+        self._num_io_ops = 0
 
         # Other information
         self.host_ip = None
@@ -136,16 +187,103 @@ class HostState(object):
         self.hypervisor_version = None
         self.hypervisor_hostname = None
         self.cpu_info = None
-        self.supported_instances = None
+        self._supported_instances = None
+        self._supported_instances_json = None
 
         # Resource oversubscription values for the compute host:
         self.limits = {}
 
         # Generic metrics from compute nodes
-        self.metrics = {}
+        self._metrics = {}
+        self._metrics_json = None
+
+        self.pci_stats = None
+
+        # Metadata of the aggregates this host belongs to, in the format
+        # of db.aggregate_metadata_get_by_host().  Populated by the
+        # HostManager; None means it was not loaded.
+        self.aggregates_metadata = None
+
+        # Generation of the host in nova.scheduler.host_claims when this
+        # state was loaded
+        self.generation = None
 
         self.updated = None
 
+    def _load_stats(self):
+        stats_json = self._stats_json
+        if stats_json is None:
+            return
+        self._stats_json = None
+        # Don't store stats directly in host_state to make sure these don't
+        # overwrite any values, or get overwritten themselves. Store in self so
+        # filters can schedule with them.
+        self._stats = jsonutils.loads(stats_json)
+
+        # Track number of instances on host
+        self._num_instances = int(self._stats.get('num_instances', 0))
+        self._num_io_ops = int(self._stats.get('io_workload', 0))
+
+        # Track number of instances by project_id, in certain vm_states and
+        # task_states, and by host_type, in a single pass over the stats.
+        for key, value in self._stats.iteritems():
+            if not key.startswith('num_'):
+                continue
+            for prefix, attr in _STATS_COUNTERS:
+                if key.startswith(prefix):
+                    counters = getattr(self, attr)
+                    counters[_intern(key[len(prefix):])] = int(value)
+                    break
+
+    def _stats_property(attr):
+        def _get(self):
+            self._load_stats()
+            return getattr(self, attr)
+
+        def _set(self, value):
+            # Decode the pending stats first, so they do not overwrite the
+            # value later on.
+            self._load_stats()
+            setattr(self, attr, value)
+
+        return property(_get, _set)
+
+    stats = _stats_property('_stats')
+    vm_states = _stats_property('_vm_states')
+    task_states = _stats_property('_task_states')
+    num_instances = _stats_property('_num_instances')
+    num_instances_by_project = _stats_property('_num_instances_by_project')
+    num_instances_by_os_type = _stats_property('_num_instances_by_os_type')
+    num_io_ops = _stats_property('_num_io_ops')
+
+    del _stats_property
+
+    @property
+    def supported_instances(self):
+        if self._supported_instances_json is not None:
+            self._supported_instances = jsonutils.loads(
+                    self._supported_instances_json)
+            self._supported_instances_json = None
+        return self._supported_instances
+
+    @supported_instances.setter
+    def supported_instances(self, value):
+        self._supported_instances = value
+        self._supported_instances_json = None
+
+    @property
+    def metrics(self):
+        if self._metrics_json is not None:
+            metrics = jsonutils.loads(self._metrics_json)
+            self._metrics_json = None
+            self._update_metrics(metrics)
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, value):
+        self._metrics = value
+        self._metrics_json = None
+
     def update_capabilities(self, capabilities=None, service=None):
         # Read-only capability dicts
 
@@ -162,7 +300,11 @@ class HostState(object):
         #           NULL in the metrics column
         metrics = compute.get('metrics', []) or []
         if metrics:
-            metrics = jsonutils.loads(metrics)
+            # Decoded and merged into self.metrics on first access.  Only the
+            # latest metrics of the compute node are kept until then.
+            self._metrics_json = metrics
+
+    def _update_metrics(self, metrics):
         for metric in metrics:
             # 'name', 'value', 'timestamp' and 'source' are all required
             # to be valid keys, just let KeyError happen if any one of
@@ -172,7 +314,7 @@ class HostState(object):
                               timestamp=metric['timestamp'],
                               source=metric['source'])
             if name:
-                self.metrics[name] = item
+                self._metrics[name] = item
             else:
                 LOG.warn(_("Metric name unknown of %r") % item)
 
@@ -217,49 +359,13 @@ class HostState(object):
         self.hypervisor_hostname = compute.get('hypervisor_hostname')
         self.cpu_info = compute.get('cpu_info')
         if compute.get('supported_instances'):
-            self.supported_instances = jsonutils.loads(
-                    compute.get('supported_instances'))
-
-        # Don't store stats directly in host_state to make sure these don't
-        # overwrite any values, or get overwritten themselves. Store in self so
-        # filters can schedule with them.
-        stats = compute.get('stats', None) or '{}'
-        self.stats = jsonutils.loads(stats)
+            self._supported_instances_json = compute['supported_instances']
 
         self.hypervisor_version = compute['hypervisor_version']
 
-        # Track number of instances on host
-        self.num_instances = int(self.stats.get('num_instances', 0))
-
-        # Track number of instances by project_id
-        project_id_keys = [k for k in self.stats.keys() if
-                k.startswith("num_proj_")]
-        for key in project_id_keys:
-            project_id = key[9:]
-            self.num_instances_by_project[project_id] = int(self.stats[key])
-
-        # Track number of instances in certain vm_states
-        vm_state_keys = [k for k in self.stats.keys() if
-                k.startswith("num_vm_")]
-        for key in vm_state_keys:
-            vm_state = key[7:]
-            self.vm_states[vm_state] = int(self.stats[key])
-
-        # Track number of instances in certain task_states
-        task_state_keys = [k for k in self.stats.keys() if
-                k.startswith("num_task_")]
-        for key in task_state_keys:
-            task_state = key[9:]
-            self.task_states[task_state] = int(self.stats[key])
-
-        # Track number of instances by host_type
-        os_keys = [k for k in self.stats.keys() if
-                k.startswith("num_os_type_")]
-        for key in os_keys:
-            os = key[12:]
-            self.num_instances_by_os_type[os] = int(self.stats[key])
-
-        self.num_io_ops = int(self.stats.get('io_workload', 0))
+        # The stats and the counters taken from them are decoded on first
+        # access, see _load_stats().
+        self._stats_json = compute.get('stats', None) or '{}'
 
         # update metrics
         self._update_metrics_from_compute_node(compute)
@@ -329,6 +435,10 @@ class HostManager(object):
         # { (host, hypervisor_hostname) : { <service> : { cap k : v }}}
         self.service_states = {}
         self.host_state_map = {}
+        # { (host, hypervisor_hostname) : compute node record }
+        self.compute_node_map = {}
+        self.last_host_refresh = None
+        self.last_full_host_refresh = None
         self.filter_handler = filters.HostFilterHandler()
         self.filter_classes = self.filter_handler.get_matching_classes(
                 CONF.scheduler_available_filters)
@@ -438,6 +548,53 @@ class HostManager(object):
         return self.weight_handler.get_weighed_objects(self.weight_classes,
                 hosts, weight_properties)
 
+    def _get_aggregates_metadata_by_host(self, context):
+        """Returns the metadata of all aggregates indexed by host.
+
+        Loads every aggregate with a single query, so that the aggregate
+        filters do not need one query per host.
+
+        return value: {host: {key: set(values)}}
+        """
+        metadata_by_host = {}
+        for aggregate in db.aggregate_get_all(context):
+            metadetails = aggregate['metadetails']
+            for host in aggregate['hosts']:
+                host_metadata = metadata_by_host.setdefault(host, {})
+                for key, value in metadetails.iteritems():
+                    host_metadata.setdefault(key, set()).add(value)
+        return metadata_by_host
+
+    def _needs_full_host_refresh(self):
+        if not CONF.scheduler_incremental_host_refresh:
+            return True
+        if self.last_full_host_refresh is None:
+            return True
+        interval = CONF.scheduler_full_host_refresh_interval
+        return (interval > 0 and
+                timeutils.is_older_than(self.last_full_host_refresh,
+                                        interval))
+
+    def _get_compute_nodes(self, context):
+        """Returns a tuple (changed, unchanged) of compute nodes.
+
+        'changed' contains the full compute node records that the host
+        states need to be updated from.  'unchanged' contains a summary of
+        the compute nodes that did not change since the last refresh, which
+        is only ever non-empty when scheduler_incremental_host_refresh is
+        enabled.
+        """
+        now = timeutils.utcnow()
+        if self._needs_full_host_refresh():
+            compute_nodes = db.compute_node_get_all(context)
+            unchanged_nodes = []
+            self.last_full_host_refresh = now
+        else:
+            compute_nodes, unchanged_nodes = db.compute_node_get_changes(
+                    context, self.last_host_refresh)
+        self.last_host_refresh = now
+        return compute_nodes, unchanged_nodes
+
     def get_all_host_states(self, context):
         """Returns a list of HostStates that represents all the hosts
         the HostManager knows about. Also, each of the consumable resources
@@ -445,7 +602,8 @@ class HostManager(object):
         """
 
         # Get resource usage across the available compute nodes:
-        compute_nodes = db.compute_node_get_all(context)
+        compute_nodes, unchanged_nodes = self._get_compute_nodes(context)
+        aggregates_metadata = self._get_aggregates_metadata_by_host(context)
         seen_nodes = set()
         for compute in compute_nodes:
             service = compute['service']
@@ -466,6 +624,31 @@ class HostManager(object):
                         service=dict(service.iteritems()))
                 self.host_state_map[state_key] = host_state
             host_state.update_from_compute_node(compute)
+            host_state.aggregates_metadata = aggregates_metadata.get(host, {})
+            host_state.generation = host_claims.get_generation(host, node)
+            self.compute_node_map[state_key] = compute
+            seen_nodes.add(state_key)
+
+        # Nodes that did not change only need their service data refreshed,
+        # there is no need to decode their stats and metrics again.
+        for compute in unchanged_nodes:
+            service = compute['service']
+            if not service:
+                continue
+            host = service['host']
+            node = compute.get('hypervisor_hostname')
+            state_key = (host, node)
+            host_state = self.host_state_map.get(state_key)
+            if not host_state:
+                # We never got the full record for this node, so pick it
+                # up on the next refresh.
+                self.last_full_host_refresh = None
+                continue
+            capabilities = self.service_states.get(state_key, None)
+            host_state.update_capabilities(capabilities,
+                                           dict(service.iteritems()))
+            host_state.aggregates_metadata = aggregates_metadata.get(host, {})
+            host_state.generation = host_claims.get_generation(host, node)
             seen_nodes.add(state_key)
 
         # remove compute nodes from host_state_map if they are not active
@@ -475,5 +658,36 @@ class HostManager(object):
             LOG.info(_("Removing dead compute node %(host)s:%(node)s "
                        "from scheduler") % {'host': host, 'node': node})
             del self.host_state_map[state_key]
+            self.compute_node_map.pop(state_key, None)
 
         return self.host_state_map.itervalues()
+
+    def update_compute_node_resources(self, host, node, values):
+        """Apply the resources which changed on a compute node to its
+        HostState.
+
+        values contains the fields of the compute node record which changed,
+        and its updated_at.  Updates older than the HostState are ignored.
+        Returns False if the compute node is not known yet, in which case it
+        needs to be picked up by a refresh of the host states.
+        """
+        state_key = (host, node)
+        host_state = self.host_state_map.get(state_key)
+        compute = self.compute_node_map.get(state_key)
+        if host_state is None or compute is None:
+            return False
+
+        compute = dict(compute)
+        compute.update(values)
+        if isinstance(compute.get('updated_at'), six.string_types):
+            compute['updated_at'] = timeutils.parse_strtime(
+                    compute['updated_at'])
+        if (host_state.updated and compute['updated_at']
+                and host_state.updated > compute['updated_at']):
+            LOG.debug(_("Ignoring outdated resource update of compute node "
+                        "%(host)s:%(node)s"), {'host': host, 'node': node})
+            return True
+
+        self.compute_node_map[state_key] = compute
+        host_state.update_from_compute_node(compute)
+        return True
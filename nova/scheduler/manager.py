@@ -36,6 +36,7 @@ from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import periodic_task
+from nova import profiler
 from nova import quota
 from nova.scheduler import utils as scheduler_utils
 
@@ -53,6 +54,12 @@ scheduler_driver_opts = [
                     'Please note this is likely to interact with the value '
                     'of service_down_time, but exactly how they interact '
                     'will depend on your choice of scheduler driver.'),
+    cfg.IntOpt('scheduler_workers',
+               default=1,
+               help='Number of scheduler worker processes. With more than '
+                    'one, the workers claim the hosts they choose in '
+                    'memory shared between them, so that a worker does not '
+                    'choose a host another worker just used up.'),
 ]
 CONF = cfg.CONF
 CONF.register_opts(scheduler_driver_opts)
@@ -298,10 +305,21 @@ class SchedulerManager(manager.Manager):
             filter_properties)
         return jsonutils.to_primitive(dests)
 
+    def get_profiling_stats(self, context, reset=False):
+        """Returns the statistics recorded about the filters and weighers,
+        see nova.profiler.get_stats().
+        """
+        return profiler.get_stats(reset=reset)
+
+    def update_compute_node_resources(self, context, host, nodename, values):
+        """Apply the resources which changed on a compute node."""
+        self.driver.update_compute_node_resources(context, host, nodename,
+                                                  values)
+
 
 class _SchedulerManagerV3Proxy(object):
 
-    target = messaging.Target(version='3.0')
+    target = messaging.Target(version='3.2')
 
     def __init__(self, manager):
         self.manager = manager
@@ -326,3 +344,10 @@ class _SchedulerManagerV3Proxy(object):
                 instance_type=instance_type, image=image,
                 request_spec=request_spec, filter_properties=filter_properties,
                 reservations=reservations)
+
+    def get_profiling_stats(self, ctxt, reset):
+        return self.manager.get_profiling_stats(ctxt, reset=reset)
+
+    def update_compute_node_resources(self, ctxt, host, nodename, values):
+        return self.manager.update_compute_node_resources(ctxt, host=host,
+                nodename=nodename, values=values)
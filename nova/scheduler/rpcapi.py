@@ -80,6 +80,8 @@ class SchedulerAPI(object):
         ... - Deprecated select_hosts()
 
         3.0 - Removed backwards compat
+        3.1 - Add get_profiling_stats()
+        3.2 - Add update_compute_node_resources()
     '''
 
     VERSION_ALIASES = {
@@ -127,3 +129,16 @@ class SchedulerAPI(object):
                    image=image_p, request_spec=request_spec,
                    filter_properties=filter_properties,
                    reservations=reservations_p)
+
+    def get_profiling_stats(self, ctxt, reset=False):
+        cctxt = self.client.prepare(version='3.1')
+        return cctxt.call(ctxt, 'get_profiling_stats', reset=reset)
+
+    def update_compute_node_resources(self, ctxt, host, nodename, values):
+        if not self.client.can_send_version('3.2'):
+            # The schedulers can't apply the update, they will get it from
+            # the database
+            return
+        cctxt = self.client.prepare(fanout=True, version='3.2')
+        cctxt.cast(ctxt, 'update_compute_node_resources',
+                   host=host, nodename=nodename, values=values)
@@ -19,6 +19,8 @@ Scheduler host weights
 
 from oslo.config import cfg
 
+from nova import profiler
+from nova.scheduler import host_columns
 from nova import weights
 
 CONF = cfg.CONF
@@ -37,7 +39,14 @@ class WeighedHost(weights.WeighedObject):
 
 class BaseHostWeigher(weights.BaseWeigher):
     """Base class for host weights."""
-    pass
+
+    def weigh_columns(self, columns, weight_properties):
+        """Return an array with the weight of each host.
+
+        Override this in a subclass which can weigh all hosts at once from
+        a HostColumns.  Return None to fall back to weigh_objects().
+        """
+        return None
 
 
 class HostWeightHandler(weights.BaseWeightHandler):
@@ -46,6 +55,42 @@ class HostWeightHandler(weights.BaseWeightHandler):
     def __init__(self):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
 
+    def get_weighed_objects(self, weigher_classes, obj_list,
+            weighing_properties):
+        if not obj_list or not host_columns.is_enabled():
+            return super(HostWeightHandler, self).get_weighed_objects(
+                    weigher_classes, obj_list, weighing_properties)
+
+        numpy = host_columns.numpy
+        columns = host_columns.HostColumns(obj_list)
+        weighed_objs = [self.object_class(obj, 0.0)
+                        for obj in columns.host_states]
+        total_weights = numpy.zeros(len(columns))
+        sample = profiler.sample('weigher')
+        for weigher_cls in weigher_classes:
+            weigher = weigher_cls()
+            if sample:
+                sample.start(weigher_cls.__name__, len(weighed_objs))
+            host_weights = weigher.weigh_columns(columns,
+                                                 weighing_properties)
+            if host_weights is not None:
+                host_weights = host_columns.normalize(host_weights,
+                        minval=weigher.minval, maxval=weigher.maxval)
+            else:
+                host_weights = weigher.weigh_objects(weighed_objs,
+                                                     weighing_properties)
+                host_weights = numpy.array(list(weights.normalize(
+                        host_weights, minval=weigher.minval,
+                        maxval=weigher.maxval)), dtype=numpy.float64)
+            total_weights += weigher.weight_multiplier() * host_weights
+            if sample:
+                sample.stop(len(weighed_objs))
+
+        for obj, weight in zip(weighed_objs, total_weights):
+            obj.weight = float(weight)
+
+        return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
 
 def all_weighers():
     """Return a list of weight plugin classes found in this directory."""
@@ -29,6 +29,7 @@ in the configuration file as the followings:
 from oslo.config import cfg
 
 from nova import exception
+from nova.scheduler import host_columns
 from nova.scheduler import utils
 from nova.scheduler import weights
 
@@ -102,3 +103,13 @@ class MetricsWeigher(weights.BaseHostWeigher):
                         return CONF.metrics.weight_of_unavailable
 
         return value
+
+    def weigh_columns(self, columns, weight_properties):
+        values = host_columns.numpy.zeros(len(columns))
+        for (name, ratio) in self.setting:
+            metric = columns.metric(name)
+            if host_columns.numpy.isnan(metric).any():
+                # Let weigh_objects() deal with the unavailable metrics
+                return None
+            values += metric * ratio
+        return values
@@ -38,6 +38,7 @@ from nova.api.ec2 import apirequest
 from nova.api.ec2 import ec2utils
 from nova import block_device
 from nova import context
+from nova import db
 from nova import exception
 from nova.openstack.common import timeutils
 from nova.openstack.common import versionutils
@@ -145,6 +146,51 @@ class Ec2utilsTestCase(test.TestCase):
         self.assertEqual(ec2utils.id_to_ec2_snap_id(28), 'snap-0000001c')
         self.assertEqual(ec2utils.id_to_ec2_vol_id(27), 'vol-0000001b')
 
+    def test_lru_cache(self):
+        cache = ec2utils.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual(2, len(cache))
+
+    def test_bulk_instance_mappings(self):
+        ctxt = context.get_admin_context()
+        ec2utils.reset_cache()
+        self.addCleanup(ec2utils.reset_cache)
+        uuids = ['e5fe5518-0288-4fa3-b0c4-c79764101b85',
+                 'a1f6d8ea-4c8b-4f3f-a6b6-1d3c3e6f0b46']
+        ec2_ids = ec2utils.id_to_ec2_inst_ids(uuids)
+        self.assertEqual(sorted(uuids), sorted(ec2_ids))
+        self.assertEqual(2, len(set(ec2_ids.values())))
+
+        ec2utils.reset_cache()
+        self.assertEqual(dict((v, k) for k, v in ec2_ids.iteritems()),
+                         ec2utils.ec2_inst_ids_to_uuids(
+                             ctxt, ec2_ids.values() + ['i-7fffffff']))
+
+        # Both directions of the mappings are cached now
+        self.mox.StubOutWithMock(db, 'get_instance_uuid_by_ec2_id')
+        self.mox.StubOutWithMock(db, 'get_ec2_instance_id_by_uuid')
+        self.mox.ReplayAll()
+        for uuid in uuids:
+            self.assertEqual(uuid, ec2utils.ec2_inst_id_to_uuid(
+                ctxt, ec2_ids[uuid]))
+            self.assertEqual(ec2_ids[uuid],
+                             ec2utils.id_to_ec2_inst_id(uuid))
+
+    def test_bulk_cache_size(self):
+        self.flags(ec2_id_mapping_cache_size=4)
+        ec2utils.reset_cache()
+        self.addCleanup(ec2utils.reset_cache)
+        uuids = ['e5fe5518-0288-4fa3-b0c4-c79764101b8%d' % i
+                 for i in range(3)]
+        ec2utils.id_to_ec2_vol_ids(uuids)
+        self.assertEqual(4, len(ec2utils._get_cache()))
+
     def test_dict_from_dotted_str(self):
         in_str = [('BlockDeviceMapping.1.DeviceName', '/dev/sda1'),
                   ('BlockDeviceMapping.1.Ebs.SnapshotId', 'snap-0000001c'),
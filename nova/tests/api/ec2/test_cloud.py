@@ -869,6 +869,67 @@ class CloudTestCase(test.TestCase):
         db.service_destroy(self.context, comp1['id'])
         db.service_destroy(self.context, comp2['id'])
 
+    def test_describe_instances_bulk(self):
+        # Makes sure the instances are formatted without queries for each.
+        self._stub_instance_get_with_fixed_ips('get_all')
+
+        image_uuid = 'cedef40a-ed67-4d10-800e-17455edce175'
+        kernel_uuid = '76fa36fc-c930-4bf3-8c8a-ea2a2420deb6'
+        sys_meta = flavors.save_flavor_info(
+            {}, flavors.get_flavor(1))
+        instances = []
+        for i in range(3):
+            instances.append(db.instance_create(self.context,
+                                                {'reservation_id': 'a',
+                                                 'image_ref': image_uuid,
+                                                 'kernel_id': kernel_uuid,
+                                                 'instance_type_id': 1,
+                                                 'host': 'host1',
+                                                 'vm_state': 'active',
+                                                 'system_metadata': sys_meta}))
+        ec2utils.reset_cache()
+
+        self.mox.StubOutWithMock(db,
+                                 'block_device_mapping_get_all_by_instance')
+        self.mox.StubOutWithMock(db, 'instance_system_metadata_get')
+        self.mox.StubOutWithMock(db, 'get_ec2_instance_id_by_uuid')
+        self.mox.StubOutWithMock(db, 's3_image_get_by_uuid')
+        self.mox.ReplayAll()
+
+        result = self.cloud.describe_instances(self.context)
+        instances_set = result['reservationSet'][0]['instancesSet']
+        self.assertEqual(sorted(ec2utils.id_to_ec2_inst_id(instance['uuid'])
+                                for instance in instances),
+                         sorted(i['instanceId'] for i in instances_set))
+        self.assertEqual(1, len(set(i['imageId'] for i in instances_set)))
+        self.assertEqual(1, len(set(i['kernelId'] for i in instances_set)))
+        self.assertTrue(instances_set[0]['kernelId'].startswith('aki-'))
+        self.assertNotIn('ramdiskId', instances_set[0])
+
+    def test_get_instances_bdms_gets_used_volumes_only(self):
+        def fake_bdm(volume_id):
+            return fake_block_device.FakeDbBlockDeviceDict(
+                    {'volume_id': volume_id, 'source_type': 'volume',
+                     'destination_type': 'volume', 'device_name': '/dev/vdb',
+                     'no_device': None})
+
+        bdms = {'uuid1': [fake_bdm('vol1'), fake_bdm('vol2')],
+                'uuid2': [fake_bdm('vol3')]}
+        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance_uuids',
+                       lambda context, instance_uuids: bdms)
+        self.mox.StubOutWithMock(self.cloud.volume_api, 'get_all')
+        self.mox.StubOutWithMock(self.cloud.volume_api, 'get')
+        for volume_id in ('vol1', 'vol2', 'vol3'):
+            self.cloud.volume_api.get(self.context, volume_id).InAnyOrder(
+                    ).AndReturn({'id': volume_id})
+        self.mox.ReplayAll()
+
+        bdms, volumes, ec2_volume_ids = self.cloud._get_instances_bdms(
+                self.context, ['uuid1', 'uuid2'])
+        self.assertEqual({'vol1': {'id': 'vol1'}, 'vol2': {'id': 'vol2'},
+                          'vol3': {'id': 'vol3'}}, volumes)
+        self.assertEqual(set(['vol1', 'vol2', 'vol3']), set(ec2_volume_ids))
+
     def test_describe_instances_all_invalid(self):
         # Makes sure describe_instances works and filters results.
         self.flags(use_ipv6=True)
@@ -18,6 +18,7 @@
 from webob import exc
 
 from nova.api.openstack.compute.contrib import aggregates
+from nova.api.openstack import extensions
 from nova import context
 from nova import exception
 from nova import test
@@ -481,3 +482,67 @@ class AggregateTestCase(test.NoDBTestCase):
 
         self.assertRaises(exc.HTTPNotFound, self.controller.delete,
                 self.req, "bogus_aggregate")
+
+    def _cache_images_action(self, body):
+        ext_mgr = self.mox.CreateMock(extensions.ExtensionManager)
+        ext_mgr.is_loaded(
+            'os-aggregate-cache-images').MultipleTimes().AndReturn(True)
+        self.mox.ReplayAll()
+        self.controller.ext_mgr = ext_mgr
+        return self.controller.action(self.req, "1", body=body)
+
+    def test_cache_images(self):
+        body = {"cache_images": {"image_ids": ["image1", "image2"]}}
+
+        def stub_cache_images(context, aggregate, image_ids):
+            self.assertEqual(context, self.context, "context")
+            self.assertEqual("1", aggregate, "aggregate")
+            self.assertEqual(["image1", "image2"], image_ids)
+            stub_cache_images.called = True
+        self.stubs.Set(self.controller.api, "cache_images",
+                       stub_cache_images)
+
+        result = self._cache_images_action(body)
+        self.assertEqual(202, result.status_int)
+        self.assertTrue(stub_cache_images.called)
+
+    def test_cache_images_extension_not_loaded(self):
+        body = {"cache_images": {"image_ids": ["image1"]}}
+        self.assertRaises(exc.HTTPBadRequest, self.controller.action,
+                          self.req, "1", body=body)
+
+    def test_cache_images_no_admin(self):
+        self.assertRaises(exception.PolicyNotAuthorized,
+                          self.controller._cache_images,
+                          self.user_req, "1",
+                          body={"image_ids": ["image1"]})
+
+    def test_cache_images_with_invalid_image_ids(self):
+        self.assertRaises(exc.HTTPBadRequest, self._cache_images_action,
+                          {"cache_images": {"image_ids": "image1"}})
+        for image_ids in ([], [1]):
+            self.assertRaises(exc.HTTPBadRequest, self.controller.action,
+                              self.req, "1",
+                              body={"cache_images": {"image_ids": image_ids}})
+
+    def test_cache_images_with_missing_image_ids(self):
+        self.assertRaises(exc.HTTPBadRequest, self._cache_images_action,
+                          {"cache_images": {"images": ["image1"]}})
+
+    def test_cache_images_with_bad_aggregate(self):
+        def stub_cache_images(context, aggregate, image_ids):
+            raise exception.AggregateNotFound(aggregate_id=aggregate)
+        self.stubs.Set(self.controller.api, "cache_images",
+                       stub_cache_images)
+
+        self.assertRaises(exc.HTTPNotFound, self._cache_images_action,
+                          {"cache_images": {"image_ids": ["image1"]}})
+
+    def test_cache_images_with_bad_image(self):
+        def stub_cache_images(context, aggregate, image_ids):
+            raise exception.ImageNotFound(image_id=image_ids[0])
+        self.stubs.Set(self.controller.api, "cache_images",
+                       stub_cache_images)
+
+        self.assertRaises(exc.HTTPBadRequest, self._cache_images_action,
+                          {"cache_images": {"image_ids": ["image1"]}})
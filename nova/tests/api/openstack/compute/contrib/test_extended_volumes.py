@@ -53,6 +53,16 @@ def fake_bdms_get_all_by_instance(*args, **kwargs):
              'destination_type': 'volume', 'id': 2})]
 
 
+def fake_bdms_get_all_by_instance_uuids(context, instance_uuids,
+                                        use_slave=False):
+    bdms = {}
+    for instance_uuid in instance_uuids:
+        bdms[instance_uuid] = fake_bdms_get_all_by_instance()
+        for bdm in bdms[instance_uuid]:
+            bdm['instance_uuid'] = instance_uuid
+    return bdms
+
+
 class ExtendedVolumesTest(test.TestCase):
     content_type = 'application/json'
     prefix = 'os-extended-volumes:'
@@ -62,8 +72,8 @@ class ExtendedVolumesTest(test.TestCase):
         fakes.stub_out_nw_api(self.stubs)
         self.stubs.Set(compute.api.API, 'get', fake_compute_get)
         self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
-        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance',
-                       fake_bdms_get_all_by_instance)
+        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance_uuids',
+                       fake_bdms_get_all_by_instance_uuids)
         self.flags(
             osapi_compute_extension=[
                 'nova.api.openstack.compute.contrib.select_extensions'],
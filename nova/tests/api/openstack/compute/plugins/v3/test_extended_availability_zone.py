@@ -135,12 +135,22 @@ class ExtendedAvailabilityZoneTest(test.TestCase):
         self.assertAvailabilityZone(self._get_server(res.body), 'get-host')
 
     def test_detail(self):
+        def fake_aggregate_host_get_by_metadata_key(context, key):
+            self.assertEqual('availability_zone', key)
+            calls.append(key)
+            return {'all-host': set(['all-host'])}
+
+        calls = []
+        # The zones of the hosts of all the servers are looked up at once.
+        self.stubs.Set(db, 'aggregate_host_get_by_metadata_key',
+                       fake_aggregate_host_get_by_metadata_key)
         url = '/v3/servers/detail'
         res = self._make_request(url)
 
         self.assertEqual(res.status_int, 200)
         for i, server in enumerate(self._get_servers(res.body)):
             self.assertAvailabilityZone(server, 'all-host')
+        self.assertEqual(1, len(calls))
 
     def test_no_instance_passthrough_404(self):
 
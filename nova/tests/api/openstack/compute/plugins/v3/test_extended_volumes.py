@@ -60,6 +60,16 @@ def fake_bdms_get_all_by_instance(*args, **kwargs):
              'destination_type': 'volume', 'id': 2})]
 
 
+def fake_bdms_get_all_by_instance_uuids(context, instance_uuids,
+                                        use_slave=False):
+    bdms = {}
+    for instance_uuid in instance_uuids:
+        bdms[instance_uuid] = fake_bdms_get_all_by_instance()
+        for bdm in bdms[instance_uuid]:
+            bdm['instance_uuid'] = instance_uuid
+    return bdms
+
+
 def fake_attach_volume(self, context, instance, volume_id,
                        device, disk_bus, device_type):
     pass
@@ -138,6 +148,8 @@ class ExtendedVolumesTest(test.TestCase):
         self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
         self.stubs.Set(db, 'block_device_mapping_get_all_by_instance',
                        fake_bdms_get_all_by_instance)
+        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance_uuids',
+                       fake_bdms_get_all_by_instance_uuids)
         self.stubs.Set(volume.cinder.API, 'get', fake_volume_get)
         self.stubs.Set(compute.api.API, 'detach_volume', fake_detach_volume)
         self.stubs.Set(compute.api.API, 'attach_volume', fake_attach_volume)
@@ -130,6 +130,23 @@ class RequestTest(test.NoDBTestCase):
                  'id1': compute_nodes[1],
                  'id2': compute_nodes[2]})
 
+    def test_get_prefetched(self):
+        request = wsgi.Request.blank('/foo')
+        request.cache_db_instances([{'uuid': 'uuid0'}, {'uuid': 'uuid1'}])
+        calls = []
+
+        def loader(instances):
+            calls.append(sorted(instance['uuid'] for instance in instances))
+            return dict((instance['uuid'], 'data') for instance in instances)
+
+        expected = {'uuid0': 'data', 'uuid1': 'data'}
+        self.assertEqual(expected, request.get_prefetched('foo', loader))
+        # The data is loaded once per request.
+        self.assertEqual(expected, request.get_prefetched('foo', loader))
+        self.assertEqual([['uuid0', 'uuid1']], calls)
+        self.assertEqual({}, wsgi.Request.blank('/foo').get_prefetched(
+                'foo', loader))
+
     def test_from_request(self):
         self.stubs.Set(gettextutils, 'get_available_languages',
                        fakes.fake_get_available_languages)
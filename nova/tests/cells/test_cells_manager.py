@@ -251,6 +251,45 @@ class CellsManagerClassTestCase(test.NoDBTestCase):
         self.assertEqual(call_info['sync_instances'],
                 [instances[-1], instances[0]])
 
+    def test_heal_instances_batches(self):
+        self.flags(instance_updated_at_threshold=1000,
+                   instance_update_num_instances=4,
+                   instance_sync_batch_size=3,
+                   group='cells')
+
+        fake_context = context.RequestContext('fake', 'fake')
+        stalled_time = timeutils.utcnow()
+        updated_since = stalled_time - datetime.timedelta(seconds=1000)
+        instances = ['instance1', 'instance2', 'instance3', 'instance4',
+                     'instance5']
+        call_info = {'get_batches': 0, 'synced': []}
+
+        def get_instance_batches_to_sync(context, batch_size, **kwargs):
+            self.assertEqual(context, fake_context)
+            self.assertEqual(3, batch_size)
+            self.assertEqual(updated_since, kwargs['updated_since'])
+            call_info['get_batches'] += 1
+            return iter([instances[:3], instances[3:]])
+
+        def sync_instances_at_top(context, batches):
+            self.assertEqual(context, fake_context)
+            call_info['synced'] = list(batches)
+
+        self.stubs.Set(cells_utils, 'get_instance_batches_to_sync',
+                get_instance_batches_to_sync)
+        self.stubs.Set(self.msg_runner, 'sync_instances_at_top',
+                sync_instances_at_top)
+        self.stubs.Set(timeutils, 'utcnow', lambda: stalled_time)
+
+        self.cells_manager._heal_instances(fake_context)
+        self.assertEqual(1, call_info['get_batches'])
+        self.assertEqual([instances[:3], instances[3:]], call_info['synced'])
+
+        # We start over once all the instances were synced.
+        self.cells_manager._heal_instances(fake_context)
+        self.assertEqual(2, call_info['get_batches'])
+        self.assertEqual([instances[:3], instances[3:]], call_info['synced'])
+
     def test_sync_instances(self):
         self.mox.StubOutWithMock(self.msg_runner,
                                  'sync_instances')
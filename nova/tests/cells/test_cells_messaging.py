@@ -778,10 +778,8 @@ class CellsTargetedMethodsTestCase(test.TestCase):
         self._setup_attrs('child-cell2', 'child-cell2!api-cell')
         capabs = {'cap1': set(['val1', 'val2']),
                   'cap2': set(['val3'])}
-        # The list(set([])) seems silly, but we can't assume the order
-        # of the list... This behavior should match the code we're
-        # testing... which is check that a set was converted to a list.
-        expected_capabs = {'cap1': list(set(['val1', 'val2'])),
+        # The sets are converted to sorted lists.
+        expected_capabs = {'cap1': ['val1', 'val2'],
                            'cap2': ['val3']}
         self.mox.StubOutWithMock(self.src_state_manager,
                                  'get_our_capabilities')
@@ -824,7 +822,8 @@ class CellsTargetedMethodsTestCase(test.TestCase):
 
         self.mox.StubOutWithMock(self.tgt_msg_runner,
                                  'tell_parents_our_capabilities')
-        self.tgt_msg_runner.tell_parents_our_capabilities(self.ctxt)
+        self.tgt_msg_runner.tell_parents_our_capabilities(self.ctxt,
+                                                          full=True)
 
         self.mox.ReplayAll()
 
@@ -838,12 +837,105 @@ class CellsTargetedMethodsTestCase(test.TestCase):
 
         self.mox.StubOutWithMock(self.tgt_msg_runner,
                                  'tell_parents_our_capacities')
-        self.tgt_msg_runner.tell_parents_our_capacities(self.ctxt)
+        self.tgt_msg_runner.tell_parents_our_capacities(self.ctxt, full=True)
 
         self.mox.ReplayAll()
 
         self.src_msg_runner.ask_children_for_capacities(self.ctxt)
 
+    def test_update_capabilities_delta(self):
+        self.flags(delta_updates=True, group='cells')
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        capabs = [{'cap1': set(['val1', 'val2']), 'cap2': set(['val3'])},
+                  {'cap1': set(['val1']), 'cap3': set(['val4'])}]
+        self.mox.StubOutWithMock(self.src_state_manager,
+                                 'get_our_capabilities')
+        self.mox.StubOutWithMock(self.tgt_msg_runner,
+                                 'tell_parents_our_capabilities')
+        for values in capabs:
+            self.src_state_manager.get_our_capabilities().AndReturn(
+                    dict(values))
+            self.tgt_msg_runner.tell_parents_our_capabilities(self.ctxt)
+
+        self.mox.ReplayAll()
+
+        cell = self.tgt_state_manager.get_child_cell('child-cell2')
+        self.src_msg_runner.tell_parents_our_capabilities(self.ctxt)
+        self.assertEqual(capabs[0], cell.capabilities)
+        self.assertEqual(0, cell.capabilities_seq)
+        self.src_msg_runner.tell_parents_our_capabilities(self.ctxt)
+        self.assertEqual(capabs[1], cell.capabilities)
+        self.assertEqual(1, cell.capabilities_seq)
+        # A full update, then a delta
+        self.assertEqual(
+                1, self.src_msg_runner.delta_updates_sent['capabilities'][2])
+
+    def test_update_capacities_delta_full_interval(self):
+        self.flags(delta_updates=True, full_update_interval=1,
+                   group='cells')
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        self.mox.StubOutWithMock(self.tgt_msg_runner,
+                                 'tell_parents_our_capacities')
+        self.tgt_msg_runner.tell_parents_our_capacities(
+                self.ctxt).MultipleTimes()
+
+        self.mox.ReplayAll()
+
+        num_deltas = []
+        for i in range(4):
+            self.src_msg_runner.tell_parents_our_capacities(self.ctxt)
+            num_deltas.append(
+                    self.src_msg_runner.delta_updates_sent['capacities'][2])
+        self.assertEqual([0, 1, 0, 1], num_deltas)
+        cell = self.tgt_state_manager.get_child_cell('child-cell2')
+        self.assertEqual(3, cell.capacities_seq)
+
+    def test_update_capacities_delta_missed(self):
+        self.flags(delta_updates=True, group='cells')
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        # The parent cell did not get the updates up to 4.
+        self.src_msg_runner.delta_updates_sent['capacities'] = (
+                4, {'ram_free': 1}, 0)
+        self.mox.StubOutWithMock(self.src_state_manager,
+                                 'get_our_capacities')
+        self.mox.StubOutWithMock(self.tgt_msg_runner,
+                                 'ask_children_for_capacities')
+        self.mox.StubOutWithMock(self.tgt_msg_runner,
+                                 'tell_parents_our_capacities')
+        self.src_state_manager.get_our_capacities().AndReturn(
+                {'ram_free': 2})
+        self.tgt_msg_runner.ask_children_for_capacities(
+                self.ctxt, cell_name='child-cell2')
+
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.tell_parents_our_capacities(self.ctxt)
+        cell = self.tgt_state_manager.get_child_cell('child-cell2')
+        self.assertIsNone(cell.capacities_seq)
+
+    def test_announce_capacities_delta(self):
+        self.flags(delta_updates=True, group='cells')
+        self._setup_attrs('api-cell', 'api-cell!child-cell1')
+        cell_state = self.src_state_manager.child_cells['child-cell1']
+        self.src_state_manager.child_cells = {'child-cell1': cell_state}
+        self.mox.StubOutWithMock(self.tgt_state_manager,
+                                 'get_our_capacities')
+        self.mox.StubOutWithMock(self.src_msg_runner,
+                                 'tell_parents_our_capacities')
+        self.tgt_state_manager.get_our_capacities().AndReturn(
+                {'ram_free': 2})
+        self.src_msg_runner.tell_parents_our_capacities(self.ctxt)
+
+        self.mox.ReplayAll()
+
+        # The child cell sent a delta we never got.
+        self.tgt_msg_runner.delta_updates_sent['capacities'] = (
+                4, {'ram_free': 1}, 1)
+        self.src_msg_runner.ask_children_for_capacities(
+                self.ctxt, cell_name='child-cell1')
+        self.assertEqual({'ram_free': 2}, cell_state.capacities)
+        self.assertEqual(5, cell_state.capacities_seq)
+
     def test_service_get_by_compute_host(self):
         fake_host_name = 'fake-host-name'
 
@@ -1568,6 +1660,99 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
 
         self.src_msg_runner.instance_destroy_at_top(self.ctxt, fake_instance)
 
+    def test_instance_update_at_top_batched(self):
+        self.flags(instance_update_batch_window=0.5, group='cells')
+        expected_cell_name = 'api-cell!child-cell2!grandchild-cell1'
+        expected_updates = {
+            'uuid1': {'uuid': 'uuid1', 'host': 'h1', 'vm_state': 'active',
+                      'cell_name': expected_cell_name},
+            'uuid2': {'uuid': 'uuid2', 'host': 'h2',
+                      'cell_name': expected_cell_name,
+                      'info_cache': {'network_info': '[]'}}}
+
+        self.mox.StubOutWithMock(messaging.greenthread, 'spawn_after')
+        self.mox.StubOutWithMock(self.mid_db_inst, 'instance_update_batch')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_update_batch')
+        timer = self.mox.CreateMockAnything()
+        messaging.greenthread.spawn_after(
+                0.5, self.src_msg_runner.flush_instance_updates).AndReturn(
+                        timer)
+        timer.cancel()
+        self.tgt_db_inst.instance_update_batch(
+                mox.IgnoreArg(), expected_updates).AndReturn({})
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'uuid1', 'host': 'h1', 'vm_state': 'building'})
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'uuid2', 'host': 'h2',
+                 'info_cache': {'id': 1, 'network_info': []}})
+        # The last value of each field wins.
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'uuid1', 'vm_state': 'active'})
+        self.assertEqual(2, len(self.src_msg_runner.pending_instance_updates))
+
+        self.src_msg_runner.flush_instance_updates()
+        self.assertEqual({}, self.src_msg_runner.pending_instance_updates)
+
+    def test_instance_update_at_top_batch_failures(self):
+        # The second instance fills the batch, which is sent right away.
+        self.flags(instance_update_batch_window=0.5,
+                   instance_update_batch_size=2, group='cells')
+        expected_cell_name = 'api-cell!child-cell2!grandchild-cell1'
+        expected_instance1 = {'uuid': 'uuid1', 'host': 'h1',
+                              'cell_name': expected_cell_name}
+        expected_instance2 = {'uuid': 'uuid2', 'host': 'h2',
+                              'cell_name': expected_cell_name}
+        failures = {
+            'uuid1': exception.UnexpectedVMStateError(actual='a',
+                                                      expected='b'),
+            'uuid2': exception.InstanceNotFound(instance_id='uuid2')}
+
+        self.mox.StubOutWithMock(messaging.greenthread, 'spawn_after')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_update_batch')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_update')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_create')
+        timer = self.mox.CreateMockAnything()
+        messaging.greenthread.spawn_after(
+                0.5, self.src_msg_runner.flush_instance_updates).AndReturn(
+                        timer)
+        timer.cancel()
+        self.tgt_db_inst.instance_update_batch(
+                mox.IgnoreArg(),
+                {'uuid1': expected_instance1,
+                 'uuid2': expected_instance2}).AndReturn(failures)
+        # Only the missing instance is retried.
+        self.tgt_db_inst.instance_update(
+                mox.IgnoreArg(), 'uuid2', expected_instance2,
+                update_cells=False).AndRaise(
+                        exception.InstanceNotFound(instance_id='uuid2'))
+        self.tgt_db_inst.instance_create(mox.IgnoreArg(),
+                                         expected_instance2)
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'uuid1', 'host': 'h1'})
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'uuid2', 'host': 'h2'})
+        self.assertEqual({}, self.src_msg_runner.pending_instance_updates)
+
+    def test_instance_destroy_at_top_drops_pending_update(self):
+        self.flags(instance_update_batch_window=0.5, group='cells')
+        self.mox.StubOutWithMock(messaging.greenthread, 'spawn_after')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_destroy')
+        messaging.greenthread.spawn_after(
+                0.5, self.src_msg_runner.flush_instance_updates)
+        self.tgt_db_inst.instance_destroy(self.ctxt, 'fake_uuid',
+                                          update_cells=False)
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'fake_uuid', 'host': 'h1'})
+        self.src_msg_runner.instance_destroy_at_top(self.ctxt,
+                {'uuid': 'fake_uuid'})
+        self.assertEqual({}, self.src_msg_runner.pending_instance_updates)
+
     def test_instance_hard_delete_everywhere(self):
         # Reset this, as this is a broadcast down.
         self._setup_attrs(up=False)
@@ -1690,6 +1875,73 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
         self.src_msg_runner.sync_instances(self.ctxt,
                 project_id, updated_since_raw, deleted)
 
+    def test_sync_instances_batches(self):
+        # Reset this, as this is a broadcast down.
+        self._setup_attrs(up=False)
+        self.flags(instance_sync_batch_size=2, group='cells')
+        project_id = 'fake_project_id'
+        updated_since_raw = 'fake_updated_since_raw'
+        updated_since_parsed = 'fake_updated_since_parsed'
+        deleted = 'fake_deleted'
+
+        instance1 = dict(uuid='fake_uuid1', deleted=False)
+        instance2 = dict(uuid='fake_uuid2', deleted=True)
+        instance3 = dict(uuid='fake_uuid3', deleted=False)
+
+        self.mox.StubOutWithMock(self.tgt_msg_runner,
+                                 'instance_update_at_top_batch')
+        self.mox.StubOutWithMock(self.tgt_msg_runner,
+                                 'instance_destroy_at_top')
+
+        self.mox.StubOutWithMock(timeutils, 'parse_isotime')
+        self.mox.StubOutWithMock(cells_utils, 'get_instance_batches_to_sync')
+
+        # Middle cell.
+        timeutils.parse_isotime(updated_since_raw).AndReturn(
+                updated_since_parsed)
+        cells_utils.get_instance_batches_to_sync(self.ctxt, 2,
+                updated_since=updated_since_parsed,
+                project_id=project_id,
+                deleted=deleted).AndReturn(iter([]))
+
+        # Bottom/Target cell
+        timeutils.parse_isotime(updated_since_raw).AndReturn(
+                updated_since_parsed)
+        cells_utils.get_instance_batches_to_sync(self.ctxt, 2,
+                updated_since=updated_since_parsed,
+                project_id=project_id,
+                deleted=deleted).AndReturn(
+                        iter([[instance1, instance2], [instance3]]))
+        # The batches are sent concurrently.
+        self.tgt_msg_runner.instance_destroy_at_top(
+                self.ctxt, instance2).InAnyOrder()
+        self.tgt_msg_runner.instance_update_at_top_batch(
+                self.ctxt, [instance1]).InAnyOrder()
+        self.tgt_msg_runner.instance_update_at_top_batch(
+                self.ctxt, [instance3]).InAnyOrder()
+
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.sync_instances(self.ctxt,
+                project_id, updated_since_raw, deleted)
+
+    def test_sync_instances_at_top_failure(self):
+        batches = [[dict(uuid='fake_uuid1', deleted=False)],
+                   [dict(uuid='fake_uuid2', deleted=False),
+                    dict(uuid='fake_uuid3', deleted=False)]]
+        self.mox.StubOutWithMock(self.src_msg_runner,
+                                 'instance_update_at_top_batch')
+        self.src_msg_runner.instance_update_at_top_batch(
+                self.ctxt, batches[0]).AndRaise(test.TestingException)
+        self.src_msg_runner.instance_update_at_top_batch(
+                self.ctxt, batches[1])
+        self.mox.ReplayAll()
+
+        # A failed batch does not stop the others.
+        num_instances = self.src_msg_runner.sync_instances_at_top(
+                self.ctxt, batches)
+        self.assertEqual(2, num_instances)
+
     def test_service_get_all_with_disabled(self):
         # Reset this, as this is a broadcast down.
         self._setup_attrs(up=False)
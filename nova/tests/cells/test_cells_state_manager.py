@@ -16,6 +16,7 @@
 Tests For CellStateManager
 """
 
+import mock
 from oslo.config import cfg
 
 from nova.cells import state
@@ -43,7 +44,7 @@ FAKE_ITYPES = [
 ]
 
 
-def _fake_compute_node_get_all(context):
+def _fake_compute_node_get_all(context, computes=FAKE_COMPUTES):
     def _node(host, total_mem, total_disk, free_mem, free_disk):
         service = {'host': host, 'disabled': False}
         return {'service': service,
@@ -52,7 +53,7 @@ def _fake_compute_node_get_all(context):
                 'free_ram_mb': free_mem,
                 'free_disk_gb': free_disk}
 
-    return [_node(*fake) for fake in FAKE_COMPUTES]
+    return [_node(*fake) for fake in computes]
 
 
 def _fake_instance_type_all(context):
@@ -135,6 +136,42 @@ class TestCellsStateManager(test.TestCase):
         units = 2  # 2 on host 3
         self.assertEqual(units, cap['disk_free']['units_by_mb'][str(sz)])
 
+    def test_capacity_incremental_update(self):
+        state_manager = self._get_state_manager(50.0)
+        computes = FAKE_COMPUTES[:2] + [('host3', 1024, 100, 512, 50),
+                                        ('host5', 2048, 200, 2048, 200)]
+        self.stubs.Set(db, 'compute_node_get_all',
+                       lambda ctxt: _fake_compute_node_get_all(ctxt,
+                                                               computes))
+
+        real_set_host = state.FreeUnits.set_host
+        with mock.patch.object(state.FreeUnits, 'set_hosts') as set_hosts:
+            with mock.patch.object(state.FreeUnits, 'set_host',
+                                   autospec=True,
+                                   side_effect=real_set_host) as set_host:
+                state_manager._update_our_capacity()
+        self.assertFalse(set_hosts.called)
+        # Only the changed and added hosts are computed, for ram and disk
+        self.assertEqual(['host3', 'host3', 'host5', 'host5'],
+                         sorted(call[0][1]
+                                for call in set_host.call_args_list))
+
+        # The result is the same as computing all the hosts
+        expected = self._capacity(50.0)
+        self.assertEqual(expected, state_manager.get_my_state().capacities)
+
+    def test_capacity_flavors_changed(self):
+        state_manager = self._get_state_manager()
+        self.stubs.Set(db, 'flavor_get_all',
+                       lambda ctxt: [{'root_gb': 10, 'ephemeral_gb': 0,
+                                      'memory_mb': 100}])
+        state_manager._update_our_capacity()
+        cap = state_manager.get_my_state().capacities
+        # 10 on host3, 3 on host4
+        self.assertEqual({'100': 13}, cap['ram_free']['units_by_mb'])
+        self.assertEqual({str(10 * 1024): 13},
+                         cap['disk_free']['units_by_mb'])
+
     def _get_state_manager(self, reserve_percent=0.0):
         self.flags(reserve_percent=reserve_percent, group='cells')
         return state.CellStateManager()
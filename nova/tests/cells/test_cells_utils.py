@@ -15,11 +15,14 @@
 """
 Tests For Cells Utility methods
 """
+import datetime
 import inspect
 import random
 
 from nova.cells import utils as cells_utils
+from nova import context
 from nova import db
+from nova import exception
 from nova import test
 
 
@@ -81,6 +84,71 @@ class CellsUtilsTestCase(test.NoDBTestCase):
                  'project_id': 'fake-project'})
         self.assertEqual(call_info['shuffle'], 2)
 
+    def test_get_instance_batches_to_sync(self):
+        fake_context = context.RequestContext('fake', 'fake')
+        instances = [{'uuid': 'uuid%s' % i, 'id': i,
+                      'created_at': datetime.datetime(2014, 1, 1, i)}
+                     for i in range(5)]
+        calls = []
+
+        def instance_get_all_by_filters(context, filters, sort_key,
+                sort_order, limit, marker):
+            self.assertEqual('yes', context.read_deleted)
+            self.assertEqual(sort_key, 'created_at')
+            self.assertEqual(sort_order, 'asc')
+            calls.append((filters, limit, marker))
+            start = 0
+            if marker is not None:
+                start = int(marker[-1]) + 1
+            return instances[start:start + limit]
+
+        self.stubs.Set(db, 'instance_get_all_by_filters',
+                instance_get_all_by_filters)
+
+        batches = cells_utils.get_instance_batches_to_sync(fake_context, 2,
+                project_id='fake-project', deleted=False)
+        self.assertTrue(inspect.isgenerator(batches))
+        # Pages are only fetched when needed.
+        self.assertEqual(instances[:2], batches.next())
+        self.assertEqual(1, len(calls))
+        self.assertEqual([instances[2:4], instances[4:]], list(batches))
+        filters = {'project_id': 'fake-project', 'deleted': False}
+        self.assertEqual([(filters, 2, None), (filters, 2, 'uuid1'),
+                          (filters, 2, 'uuid3')], calls)
+
+        # No empty list when the last page is full.
+        del calls[:]
+        batches = cells_utils.get_instance_batches_to_sync(fake_context, 5)
+        self.assertEqual([instances], list(batches))
+        self.assertEqual([({}, 5, None), ({}, 5, 'uuid4')], calls)
+
+    def test_get_instance_batches_to_sync_marker_not_found(self):
+        fake_context = context.RequestContext('fake', 'fake')
+        instances = [{'uuid': 'uuid%s' % i, 'id': i,
+                      'created_at': datetime.datetime(2014, 1, 1, i)}
+                     for i in range(5)]
+        markers = []
+
+        def instance_get_all_by_filters(context, filters, sort_key,
+                sort_order, limit, marker):
+            markers.append(marker)
+            if marker == 'uuid1' and markers.count(marker) == 1:
+                # Archived after the first page was returned
+                raise exception.MarkerNotFound(marker)
+            start = 0
+            if marker is not None:
+                start = int(marker[-1]) + 1
+            return instances[start:start + limit]
+
+        self.stubs.Set(db, 'instance_get_all_by_filters',
+                instance_get_all_by_filters)
+
+        batches = cells_utils.get_instance_batches_to_sync(fake_context, 2)
+        # The scan restarts without returning the first page again.
+        self.assertEqual([instances[:2], instances[2:4], instances[4:]],
+                         list(batches))
+        self.assertEqual([None, 'uuid1', None, 'uuid1', 'uuid3'], markers)
+
     def test_split_cell_and_item(self):
         path = 'australia', 'queensland', 'gold_coast'
         cell = cells_utils.PATH_CELL_SEP.join(path)
@@ -101,3 +169,26 @@ class CellsUtilsTestCase(test.NoDBTestCase):
         result_cell, result_item = cells_utils.split_cell_and_item(together)
         self.assertEqual(cell, result_cell)
         self.assertEqual(item, result_item)
+
+    def test_dict_delta(self):
+        old = {'ram_free': {'total_mb': 10,
+                            'units_by_mb': {'512': 2, '1024': 1}},
+               'disk_free': {'total_mb': 100}}
+        new = {'ram_free': {'total_mb': 9,
+                            'units_by_mb': {'512': 2, '2048': 0}},
+               'hypervisor': ['kvm']}
+        changed, removed = cells_utils.dict_delta(old, new)
+        self.assertEqual(sorted([[['ram_free', 'total_mb'], 9],
+                                 [['ram_free', 'units_by_mb', '2048'], 0],
+                                 [['hypervisor'], ['kvm']]]),
+                         sorted(changed))
+        self.assertEqual(sorted([['ram_free', 'units_by_mb', '1024'],
+                                 ['disk_free']]),
+                         sorted(removed))
+
+        cells_utils.apply_dict_delta(old, changed, removed)
+        self.assertEqual(new, old)
+
+    def test_dict_delta_unchanged(self):
+        values = {'a': {'b': 1}, 'c': [1, 2]}
+        self.assertEqual(([], []), cells_utils.dict_delta(values, values))
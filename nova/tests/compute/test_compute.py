@@ -6412,9 +6412,11 @@ class ComputeTestCase(BaseTestCase):
         self._create_fake_instance({'host': self.compute.host})
         self._create_fake_instance({'host': self.compute.host})
         self._create_fake_instance({'host': self.compute.host})
+        self.mox.StubOutWithMock(self.compute.driver, 'get_power_states')
         self.mox.StubOutWithMock(self.compute.driver, 'get_info')
         self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
 
+        self.compute.driver.get_power_states().AndRaise(NotImplementedError)
         # Check to make sure task continues on error.
         self.compute.driver.get_info(mox.IgnoreArg()).AndRaise(
             exception.InstanceNotFound(instance_id='fake-uuid'))
@@ -6435,6 +6437,50 @@ class ComputeTestCase(BaseTestCase):
         self.mox.ReplayAll()
         self.compute._sync_power_states(ctxt)
 
+    def _test_sync_power_states_bulk(self):
+        ctxt = self.context.elevated()
+        params = {'host': self.compute.host,
+                  'vm_state': vm_states.ACTIVE,
+                  'power_state': power_state.RUNNING}
+        in_sync = self._create_fake_instance(params)
+        shutdown = self._create_fake_instance(params)
+        self._create_fake_instance(params)
+        self.mox.StubOutWithMock(self.compute.driver, 'get_power_states')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+
+        self.compute.driver.get_power_states().AndReturn(
+                {in_sync['uuid']: power_state.RUNNING,
+                 shutdown['uuid']: power_state.SHUTDOWN})
+        # Only the instances out of sync are synced, without querying the
+        # driver again, and the missing one is not found.
+        self.compute._sync_instance_power_state(ctxt, mox.IgnoreArg(),
+                power_state.SHUTDOWN, use_slave=True).InAnyOrder()
+        self.compute._sync_instance_power_state(ctxt, mox.IgnoreArg(),
+                power_state.NOSTATE, use_slave=True).InAnyOrder()
+        self.mox.ReplayAll()
+        self.compute._sync_power_states(ctxt)
+
+    def test_sync_power_states_bulk(self):
+        self._test_sync_power_states_bulk()
+
+    def test_sync_power_states_bulk_pool(self):
+        self.flags(sync_power_state_pool_size=2)
+        self._test_sync_power_states_bulk()
+
+    def test_power_state_in_sync(self):
+        instance = {'vm_state': vm_states.STOPPED,
+                    'power_state': power_state.SHUTDOWN}
+        self.assertTrue(self.compute._power_state_in_sync(
+                instance, power_state.SHUTDOWN))
+        self.assertFalse(self.compute._power_state_in_sync(
+                instance, power_state.RUNNING))
+
+        instance = {'vm_state': vm_states.ACTIVE,
+                    'power_state': power_state.SHUTDOWN}
+        self.assertFalse(self.compute._power_state_in_sync(
+                instance, power_state.SHUTDOWN))
+
     def _test_lifecycle_event(self, lifecycle_event, power_state):
         instance = self._create_fake_instance()
         uuid = instance['uuid']
@@ -9618,6 +9664,41 @@ class ComputeAPIAggrTestCase(BaseTestCase):
                           self.api.remove_host_from_aggregate,
                           self.context, aggr['id'], 'invalid_host')
 
+    def test_cache_images(self):
+        values = _create_service_entries(self.context)
+        fake_zone = values.keys()[0]
+        aggr = self.api.create_aggregate(self.context,
+                                         'fake_aggregate', fake_zone)
+        for host in values[fake_zone]:
+            self.api.add_host_to_aggregate(self.context, aggr['id'], host)
+        image_id = '155d900f-4e14-4e4c-a73d-069cbf4541e6'
+
+        self.mox.StubOutWithMock(self.api.compute_rpcapi, 'cache_images')
+        for host in values[fake_zone]:
+            self.api.compute_rpcapi.cache_images(self.context, host=host,
+                                                 image_ids=[image_id])
+        self.mox.ReplayAll()
+
+        fake_notifier.NOTIFICATIONS = []
+        self.api.cache_images(self.context, aggr['id'], [image_id])
+        self.assertEqual(['aggregate.cacheimages.start',
+                          'aggregate.cacheimages.end'],
+                         [msg.event_type
+                          for msg in fake_notifier.NOTIFICATIONS])
+
+    def test_cache_images_raise_not_found(self):
+        def fake_show(obj, context, image_id):
+            raise exception.ImageNotFound(image_id=image_id)
+
+        self.stubs.Set(fake_image._FakeImageService, 'show', fake_show)
+        aggr = self.api.create_aggregate(self.context, 'fake_aggregate',
+                                         'fake_zone')
+        self.mox.StubOutWithMock(self.api.compute_rpcapi, 'cache_images')
+        self.mox.ReplayAll()
+        self.assertRaises(exception.ImageNotFound,
+                          self.api.cache_images,
+                          self.context, aggr['id'], ['invalid_image'])
+
     def test_aggregate_list(self):
         aggregate = self.api.create_aggregate(self.context,
                                               'fake_aggregate',
@@ -1049,6 +1049,35 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                                             events[1])
         do_test()
 
+    def test_cache_images(self):
+        self.flags(image_cache_concurrency=2)
+
+        def fake_cache_image(context, image_id):
+            if image_id == 'image2':
+                raise exception.ImageNotFound(image_id=image_id)
+
+        @mock.patch.object(self.compute, 'notifier')
+        @mock.patch.object(self.compute.driver, 'cache_image',
+                           side_effect=fake_cache_image)
+        def do_test(cache_image, notifier):
+            self.compute.cache_images(self.context, ['image1', 'image2'])
+            self.assertEqual([mock.call(self.context, 'image1'),
+                              mock.call(self.context, 'image2')],
+                             cache_image.call_args_list)
+            event_types = [call[0][1] for call in notifier.info.call_args_list]
+            self.assertEqual(['compute.cache_images.start',
+                              'compute.cache_images.progress',
+                              'compute.cache_images.progress',
+                              'compute.cache_images.end'], event_types)
+            progress = notifier.info.call_args_list[2][0][2]
+            self.assertEqual('image2', progress['image_id'])
+            self.assertEqual(2, progress['index'])
+            self.assertEqual(2, progress['total'])
+            self.assertIsNotNone(progress['error'])
+            end = notifier.info.call_args_list[3][0][2]
+            self.assertEqual(['image2'], end['failed'])
+        do_test()
+
     def test_retry_reboot_pending_soft(self):
         instance = instance_obj.Instance(self.context)
         instance.uuid = 'foo'
@@ -46,17 +46,14 @@ class ComputeXenTestCase(stubs.XenAPITestBaseNoDB):
         instance = instance_list[0]
 
         self.mox.StubOutWithMock(instance_obj.InstanceList, 'get_by_host')
-        self.mox.StubOutWithMock(self.compute.driver, 'get_num_instances')
-        self.mox.StubOutWithMock(vm_utils, 'lookup')
+        self.mox.StubOutWithMock(vm_utils, 'list_nova_vms')
         self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
 
         instance_obj.InstanceList.get_by_host(ctxt,
                 self.compute.host, use_slave=True).AndReturn(instance_list)
-        self.compute.driver.get_num_instances().AndReturn(1)
-        vm_utils.lookup(self.compute.driver._session, instance['name'],
-                False).AndReturn(None)
+        vm_utils.list_nova_vms(self.compute.driver._session).AndReturn([])
         self.compute._sync_instance_power_state(ctxt, instance,
-                power_state.NOSTATE)
+                power_state.NOSTATE, use_slave=True)
 
         self.mox.ReplayAll()
 
@@ -535,6 +535,35 @@ class TrackerTestCase(BaseTrackerTestCase):
         self.assertEqual(driver.pci_stats,
             jsonutils.loads(self.tracker.compute_node['pci_stats']))
 
+    def test_publish_resources_disabled(self):
+        with mock.patch.object(self.tracker.scheduler_rpcapi,
+                               'update_compute_node_resources') as update:
+            self.tracker._update(self.context, {'free_ram_mb': 1})
+            self.assertFalse(update.called)
+
+    def test_publish_resources(self):
+        self.flags(compute_resource_updates=True)
+        with mock.patch.object(self.tracker.scheduler_rpcapi,
+                               'update_compute_node_resources') as update:
+            # Everything is sent the first time
+            self.tracker._update(self.context, {})
+            self.assertEqual(1, update.call_count)
+            values = update.call_args[0][3]
+            self.assertEqual(FAKE_VIRT_MEMORY_MB, values['free_ram_mb'])
+            self.assertEqual(FAKE_VIRT_VCPUS, values['vcpus'])
+            self.assertIn('updated_at', values)
+
+            # Nothing is sent if nothing changed
+            update.reset_mock()
+            self.tracker._update(self.context, {})
+            self.assertFalse(update.called)
+
+            # Only what changed is sent afterwards
+            self.tracker._update(self.context, {'free_ram_mb': 1})
+            update.assert_called_once_with(self.context, self.tracker.host,
+                    self.tracker.nodename,
+                    {'free_ram_mb': 1, 'updated_at': mock.ANY})
+
 
 class TrackerPciStatsTestCase(BaseTrackerTestCase):
 
@@ -816,3 +816,7 @@ class ComputeRpcAPITestCase(test.TestCase):
                                instances=[self.fake_instance],
                                events=['event'],
                                version='3.23')
+
+    def test_cache_images(self):
+        self._test_compute_api('cache_images', 'cast', host='host',
+                               image_ids=['fake-image'], version='3.24')
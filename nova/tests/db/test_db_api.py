@@ -1827,6 +1827,44 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         system_meta = db.instance_system_metadata_get(ctxt, instance['uuid'])
         self.assertEqual('baz', system_meta['original_image_ref'])
 
+    def test_instance_update_batch(self):
+        inst1 = self.create_instance_with_args(vm_state='foo')
+        inst2 = self.create_instance_with_args(vm_state='foo')
+        inst3 = self.create_instance_with_args(vm_state='foo')
+        missing_uuid = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+        updates = {
+            inst1['uuid']: {'host': 'h2',
+                            'system_metadata': {'smkey1': 'new'},
+                            'info_cache': {'network_info': '[1]'}},
+            inst2['uuid']: {'host': 'h3',
+                            'expected_vm_state': ('bar',)},
+            inst3['uuid']: {'vm_state': 'bar',
+                            'expected_vm_state': ('foo',)},
+            missing_uuid: {'host': 'h4'},
+        }
+
+        failures = db.instance_update_batch(self.ctxt, updates)
+
+        self.assertEqual(set([inst2['uuid'], missing_uuid]),
+                         set(failures))
+        self.assertIsInstance(failures[inst2['uuid']],
+                              exception.UnexpectedVMStateError)
+        self.assertIsInstance(failures[missing_uuid],
+                              exception.InstanceNotFound)
+        # The values passed in are left alone.
+        self.assertIn('expected_vm_state', updates[inst3['uuid']])
+
+        inst1 = db.instance_get_by_uuid(self.ctxt, inst1['uuid'])
+        self.assertEqual('h2', inst1['host'])
+        self.assertEqual('[1]', inst1['info_cache']['network_info'])
+        system_meta = db.instance_system_metadata_get(self.ctxt,
+                                                      inst1['uuid'])
+        self.assertEqual('new', system_meta['smkey1'])
+        self.assertEqual('h1', db.instance_get_by_uuid(
+                self.ctxt, inst2['uuid'])['host'])
+        self.assertEqual('bar', db.instance_get_by_uuid(
+                self.ctxt, inst3['uuid'])['vm_state'])
+
     def test_delete_instance_metadata_on_instance_destroy(self):
         ctxt = context.get_admin_context()
         # Create an instance with some metadata
@@ -4616,6 +4654,26 @@ class BlockDeviceMappingTestCase(test.TestCase):
         bmd = db.block_device_mapping_get_all_by_instance(self.ctxt, uuid2)
         self.assertEqual(len(bmd), 2)
 
+    def test_block_device_mapping_get_all_by_instance_uuids(self):
+        uuid1 = self.instance['uuid']
+        uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        uuid3 = db.instance_create(self.ctxt, {})['uuid']
+
+        for uuid, device_name in ((uuid1, 'first'), (uuid2, 'second'),
+                                  (uuid2, 'third')):
+            self._create_bdm({'instance_uuid': uuid,
+                              'device_name': device_name})
+
+        bdms = db.block_device_mapping_get_all_by_instance_uuids(
+                self.ctxt, [uuid1, uuid2, uuid3])
+        self.assertEqual(['first'],
+                         [bdm['device_name'] for bdm in bdms[uuid1]])
+        self.assertEqual(['second', 'third'],
+                         sorted(bdm['device_name'] for bdm in bdms[uuid2]))
+        self.assertEqual([], bdms[uuid3])
+        self.assertEqual({},
+            db.block_device_mapping_get_all_by_instance_uuids(self.ctxt, []))
+
     def test_block_device_mapping_destroy(self):
         bdm = self._create_bdm({})
         db.block_device_mapping_destroy(self.ctxt, bdm['id'])
@@ -5481,6 +5539,13 @@ class S3ImageTestCase(test.TestCase):
                          sorted([db.s3_image_get(self.ctxt, ref.id).uuid
                          for ref in self.images]))
 
+    def test_s3_image_get_all_by_uuids(self):
+        refs = db.s3_image_get_all_by_uuids(self.ctxt,
+                                            self.values[:2] + ['fake'])
+        self.assertEqual(sorted(self.values[:2]),
+                         sorted(ref.uuid for ref in refs))
+        self.assertEqual([], db.s3_image_get_all_by_uuids(self.ctxt, []))
+
     def test_s3_image_get_not_found(self):
         self.assertRaises(exception.ImageNotFound, db.s3_image_get, self.ctxt,
                           100500)
@@ -5548,6 +5613,30 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
             new_stats = jsonutils.loads(node['stats'])
             self.assertEqual(self.stats, new_stats)
 
+    def test_compute_node_get_changes(self):
+        changes_since = timeutils.utcnow() + datetime.timedelta(seconds=1)
+        changed, unchanged = db.compute_node_get_changes(self.ctxt,
+                                                         changes_since)
+        self.assertEqual([], changed)
+        self.assertEqual(1, len(unchanged))
+        self.assertEqual(self.item['id'], unchanged[0]['id'])
+        self.assertEqual('abracadabra104',
+                         unchanged[0]['hypervisor_hostname'])
+        self.assertEqual(self.service['id'], unchanged[0]['service']['id'])
+        self.assertNotIn('stats', unchanged[0])
+
+        timeutils.set_time_override(changes_since)
+        self.addCleanup(timeutils.clear_time_override)
+        db.compute_node_update(self.ctxt, self.item['id'],
+                               {'free_ram_mb': 512})
+        changed, unchanged = db.compute_node_get_changes(self.ctxt,
+                                                         changes_since)
+        self.assertEqual([], unchanged)
+        self.assertEqual(1, len(changed))
+        self.assertEqual(512, changed[0]['free_ram_mb'])
+        self.assertEqual(self.service['id'], changed[0]['service']['id'])
+        self.assertEqual(self.stats, jsonutils.loads(changed[0]['stats']))
+
     def test_compute_node_get_all_deleted_compute_node(self):
         # Create a service and compute node and ensure we can find its stats;
         # delete the service and compute node when done and loop again
@@ -6241,6 +6330,14 @@ class Ec2TestCase(test.TestCase):
         vol_id = db.get_ec2_volume_id_by_uuid(self.ctxt, 'fake-uuid')
         self.assertEqual(vol['id'], vol_id)
 
+    def test_get_ec2_volume_ids_by_uuids(self):
+        vol1 = db.ec2_volume_create(self.ctxt, 'fake-uuid1')
+        vol2 = db.ec2_volume_create(self.ctxt, 'fake-uuid2')
+        vol_ids = db.get_ec2_volume_ids_by_uuids(
+                self.ctxt, ['fake-uuid1', 'fake-uuid2', 'uuid-not-present'])
+        self.assertEqual({'fake-uuid1': vol1['id'],
+                          'fake-uuid2': vol2['id']}, vol_ids)
+
     def test_get_volume_uuid_by_ec2_id(self):
         vol = db.ec2_volume_create(self.ctxt, 'fake-uuid')
         vol_uuid = db.get_volume_uuid_by_ec2_id(self.ctxt, vol['id'])
@@ -6291,11 +6388,29 @@ class Ec2TestCase(test.TestCase):
         inst_id = db.get_ec2_instance_id_by_uuid(self.ctxt, 'fake-uuid')
         self.assertEqual(inst['id'], inst_id)
 
+    def test_get_ec2_instance_ids_by_uuids(self):
+        inst1 = db.ec2_instance_create(self.ctxt, 'fake-uuid1')
+        inst2 = db.ec2_instance_create(self.ctxt, 'fake-uuid2')
+        inst_ids = db.get_ec2_instance_ids_by_uuids(
+                self.ctxt, ['fake-uuid1', 'fake-uuid2', 'uuid-not-present'])
+        self.assertEqual({'fake-uuid1': inst1['id'],
+                          'fake-uuid2': inst2['id']}, inst_ids)
+        self.assertEqual({}, db.get_ec2_instance_ids_by_uuids(self.ctxt, []))
+
     def test_get_instance_uuid_by_ec2_id(self):
         inst = db.ec2_instance_create(self.ctxt, 'fake-uuid')
         inst_uuid = db.get_instance_uuid_by_ec2_id(self.ctxt, inst['id'])
         self.assertEqual(inst_uuid, 'fake-uuid')
 
+    def test_get_instance_uuids_by_ec2_ids(self):
+        inst1 = db.ec2_instance_create(self.ctxt, 'fake-uuid1')
+        inst2 = db.ec2_instance_create(self.ctxt, 'fake-uuid2')
+        inst_uuids = db.get_instance_uuids_by_ec2_ids(
+                self.ctxt, [inst1['id'], inst2['id'], 100500])
+        self.assertEqual({inst1['id']: 'fake-uuid1',
+                          inst2['id']: 'fake-uuid2'}, inst_uuids)
+        self.assertEqual({}, db.get_instance_uuids_by_ec2_ids(self.ctxt, []))
+
     def test_get_ec2_instance_id_by_uuid_not_found(self):
         self.assertRaises(exception.InstanceNotFound,
                           db.get_ec2_instance_id_by_uuid,
@@ -16,8 +16,10 @@
 
 import datetime
 import filecmp
+import httplib
 import os
 import random
+import socket
 import tempfile
 import time
 
@@ -51,6 +53,47 @@ class NullWriter(object):
         pass
 
 
+class FakeRangeResponse(object):
+    def __init__(self, status):
+        self.status = status
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class RangedGlanceStubClient(glance_stubs.StubGlanceClient):
+    """A client serving byte ranges of an image with its HTTP client."""
+
+    def __init__(self, image_data, status=206, failures=0,
+                 failure=socket.error('Connection reset by peer')):
+        super(RangedGlanceStubClient, self).__init__()
+        self.image_data = image_data
+        self.status = status
+        self.failures = failures
+        self.failure = failure
+        self.ranges = []
+        self.responses = []
+        self.http_client = self
+
+    def raw_request(self, method, url, headers=None):
+        start, end = [int(x) for x in headers['Range'][6:].split('-')]
+        self.ranges.append((start, end))
+        resp = FakeRangeResponse(self.status)
+        self.responses.append(resp)
+        return resp, self._body(self.image_data[start:end + 1])
+
+    def _body(self, data):
+        yield data[:1]
+        if self.failures:
+            self.failures -= 1
+            raise self.failure
+        yield data[1:]
+
+    def data(self, image_id):
+        return [self.image_data]
+
+
 class TestGlanceSerializer(test.NoDBTestCase):
     def test_serialize(self):
         metadata = {'name': 'image1',
@@ -507,6 +550,57 @@ class TestGlanceImageService(test.NoDBTestCase):
         self.flags(glance_num_retries=1)
         service.download(self.context, image_id, data=writer)
 
+    def _download_ranges(self, client):
+        self.flags(glance_download_concurrency=2,
+                   glance_download_range_size=4)
+        service = self._create_image_service(client)
+        self.stubs.Set(service, 'show',
+                       lambda context, image_id: {'size': 10})
+        outfd, dst_path = self._get_tempfile()
+        os.close(outfd)
+        service.download(self.context, 1, dst_path=dst_path)
+        with open(dst_path) as f:
+            return f.read()
+
+    def test_download_ranges(self):
+        client = RangedGlanceStubClient('0123456789')
+        self.assertEqual('0123456789', self._download_ranges(client))
+        self.assertEqual([(0, 3), (4, 7), (8, 9)], sorted(client.ranges))
+
+    def test_download_ranges_not_supported(self):
+        client = RangedGlanceStubClient('0123456789', status=200)
+        self.assertEqual('0123456789', self._download_ranges(client))
+        self.assertEqual([(0, 3)], client.ranges)
+        self.assertTrue(client.responses[0].closed)
+
+    def test_download_ranges_no_raw_request(self):
+        client = RangedGlanceStubClient('0123456789')
+        client.http_client = object()
+        self.assertEqual('0123456789', self._download_ranges(client))
+        self.assertEqual([], client.ranges)
+
+    def test_download_ranges_resumed(self):
+        self.flags(glance_num_retries=1)
+        client = RangedGlanceStubClient('0123456789', failures=1)
+        self.assertEqual('0123456789', self._download_ranges(client))
+        self.assertEqual([(0, 3), (1, 3), (4, 7), (8, 9)],
+                         sorted(client.ranges))
+        self.assertTrue(all(resp.closed for resp in client.responses))
+
+    def test_download_ranges_incomplete_read(self):
+        self.flags(glance_num_retries=1)
+        client = RangedGlanceStubClient('0123456789', failures=1,
+                                        failure=httplib.IncompleteRead('1'))
+        self.assertEqual('0123456789', self._download_ranges(client))
+        self.assertEqual([(0, 3), (1, 3), (4, 7), (8, 9)],
+                         sorted(client.ranges))
+
+    def test_download_ranges_failed(self):
+        self.flags(glance_num_retries=1)
+        client = RangedGlanceStubClient('0123456789', failures=2)
+        self.assertRaises(exception.ImageDownloadFailed,
+                          self._download_ranges, client)
+
     def test_download_file_url(self):
         self.flags(allowed_direct_url_schemes=['file'])
 
@@ -0,0 +1,213 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import os
+import StringIO
+import time
+
+import fixtures
+import mock
+from six.moves import urllib
+import six.moves.urllib.parse as urlparse
+import webob
+
+from nova import exception
+from nova.image.download import peer
+from nova import test
+
+FNAME = hashlib.sha1('fake-image').hexdigest()
+CHECKSUM = hashlib.md5(FNAME).hexdigest()
+
+
+class PeerTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(PeerTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(disable_process_locking=True)
+        self.flags(registry_path=os.path.join(self.tmpdir, 'registry'),
+                   url='http://host1:9494', shared_secret='secret',
+                   group='image_peer')
+
+    def _make_cache(self, name, fnames):
+        cache_dir = os.path.join(self.tmpdir, name)
+        os.mkdir(cache_dir)
+        for fname in fnames:
+            with open(os.path.join(cache_dir, fname), 'w') as f:
+                f.write(fname)
+        return cache_dir
+
+    def test_register_cache(self):
+        cache1 = self._make_cache('cache1', [FNAME, 'ephemeral_1_default'])
+        cache2 = self._make_cache('cache2', [FNAME])
+        peer.register_cache(cache1)
+        self.flags(url='http://host2:9494', group='image_peer')
+        peer.register_cache(cache2)
+        self.assertEqual(['http://host1:9494'],
+                         peer.get_peers(FNAME, CHECKSUM))
+        self.assertEqual([], peer.get_peers('ephemeral_1_default',
+                                            hashlib.md5('').hexdigest()))
+
+        # host2 no longer holds the image
+        os.unlink(os.path.join(cache2, FNAME))
+        peer.register_cache(cache2)
+        self.flags(url='http://host1:9494', group='image_peer')
+        self.assertEqual([], peer.get_peers(FNAME, CHECKSUM))
+
+    def test_get_peers_ignores_converted_images(self):
+        cache1 = self._make_cache('cache1', [FNAME])
+        peer.register_cache(cache1)
+        self.flags(url='http://host2:9494', group='image_peer')
+        self.assertEqual(['http://host1:9494'],
+                         peer.get_peers(FNAME, CHECKSUM))
+
+        # The image of host1 no longer matches the glance checksum, as when
+        # it was converted to raw.
+        with open(os.path.join(cache1, FNAME), 'w') as f:
+            f.write('converted')
+        os.utime(os.path.join(cache1, FNAME), (1, 1))
+        self.flags(url='http://host1:9494', group='image_peer')
+        peer.register_cache(cache1)
+        self.flags(url='http://host2:9494', group='image_peer')
+        self.assertEqual([], peer.get_peers(FNAME, CHECKSUM))
+
+    def test_get_peers_ignores_stale_hosts(self):
+        cache = self._make_cache('cache', [FNAME])
+        peer.register_cache(cache)
+        self.flags(url='http://host2:9494', group='image_peer')
+        self.stubs.Set(time, 'time', lambda: 1e10)
+        self.assertEqual([], peer.get_peers(FNAME, CHECKSUM))
+
+    def test_get_peers_disabled(self):
+        self.flags(registry_path=None, group='image_peer')
+        peer.register_cache(self._make_cache('cache', [FNAME]))
+        self.assertEqual([], peer.get_peers(FNAME, CHECKSUM))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir,
+                                                     'registry')))
+
+    def test_get_peers_without_secret(self):
+        peer.register_cache(self._make_cache('cache', [FNAME]))
+        self.flags(url='http://host2:9494', shared_secret=None,
+                   group='image_peer')
+        self.assertEqual([], peer.get_peers(FNAME, CHECKSUM))
+
+    def test_download(self):
+        dst_path = os.path.join(self.tmpdir, 'image.part')
+        self.stubs.Set(peer, 'get_peers',
+                       lambda fname, checksum: ['http://host2',
+                                                'http://host3'])
+        fetched = []
+
+        def fake_fetch_from_peer(peer_url, fname, dst_path, checksum):
+            self.assertEqual('fake-checksum', checksum)
+            fetched.append(peer_url)
+            if peer_url == 'http://host2':
+                raise IOError('Connection refused')
+
+        self.stubs.Set(peer, '_fetch_from_peer', fake_fetch_from_peer)
+        peer.PeerTransfer().download(None,
+                                     urlparse.urlparse('peer://fake-image'),
+                                     dst_path, {'checksum': 'fake-checksum'})
+        self.assertEqual(['http://host2', 'http://host3'], fetched)
+
+    def test_download_without_checksum(self):
+        self.stubs.Set(peer, 'get_peers',
+                       lambda fname, checksum: ['http://host2'])
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          peer.PeerTransfer().download, None,
+                          urlparse.urlparse('peer://fake-image'),
+                          os.path.join(self.tmpdir, 'image.part'),
+                          {'checksum': None})
+
+    def _fake_response(self, data):
+        resp = StringIO.StringIO(data)
+        resp.info = lambda: mock.Mock(getheader=lambda name: str(len(data)))
+        return resp
+
+    @mock.patch.object(urllib.request, 'urlopen')
+    def test_fetch_from_peer(self, mock_urlopen):
+        mock_urlopen.return_value = self._fake_response('data')
+        dst_path = os.path.join(self.tmpdir, 'image.part')
+        peer._fetch_from_peer('http://host2', FNAME, dst_path,
+                              hashlib.md5('data').hexdigest())
+        with open(dst_path) as f:
+            self.assertEqual('data', f.read())
+
+        req = mock_urlopen.call_args[0][0]
+        self.assertEqual('http://host2/%s' % FNAME, req.get_full_url())
+        expires = int(req.get_header('X-image-peer-expires'))
+        self.assertEqual(peer._sign(FNAME, expires),
+                         req.get_header('X-image-peer-signature'))
+
+    @mock.patch.object(urllib.request, 'urlopen')
+    def test_fetch_from_peer_bad_checksum(self, mock_urlopen):
+        mock_urlopen.return_value = self._fake_response('corrupt')
+        dst_path = os.path.join(self.tmpdir, 'image.part')
+        self.assertRaises(IOError, peer._fetch_from_peer, 'http://host2',
+                          FNAME, dst_path, hashlib.md5('data').hexdigest())
+        self.assertFalse(os.path.exists(dst_path))
+
+    def test_download_no_peer(self):
+        self.stubs.Set(peer, 'get_peers', lambda fname, checksum: [])
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          peer.PeerTransfer().download, None,
+                          urlparse.urlparse('peer://fake-image'),
+                          os.path.join(self.tmpdir, 'image.part'), {})
+
+    def _signed_request(self, fname, expires=None, **kwargs):
+        if expires is None:
+            expires = int(time.time()) + 60
+        return webob.Request.blank(
+                '/%s' % fname,
+                headers={'X-Image-Peer-Expires': str(expires),
+                         'X-Image-Peer-Signature': peer._sign(fname,
+                                                              expires)},
+                **kwargs)
+
+    def test_application(self):
+        app = peer.PeerImageApplication(self._make_cache('cache', [FNAME]))
+        resp = self._signed_request(FNAME).get_response(app)
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(FNAME, resp.body)
+
+        for fname in ('0' * 40, 'ephemeral_1_default', '../x'):
+            resp = self._signed_request(fname).get_response(app)
+            self.assertEqual(404, resp.status_int)
+
+        resp = self._signed_request(FNAME,
+                                    method='DELETE').get_response(app)
+        self.assertEqual(405, resp.status_int)
+
+    def test_application_unauthorized(self):
+        app = peer.PeerImageApplication(self._make_cache('cache', [FNAME]))
+        resp = webob.Request.blank('/%s' % FNAME).get_response(app)
+        self.assertEqual(403, resp.status_int)
+
+        # Expired signature
+        req = self._signed_request(FNAME, expires=int(time.time()) - 1)
+        self.assertEqual(403, req.get_response(app).status_int)
+
+        # Signature of another image
+        req = self._signed_request(FNAME)
+        req.headers['X-Image-Peer-Signature'] = peer._sign(
+                '0' * 40, int(req.headers['X-Image-Peer-Expires']))
+        self.assertEqual(403, req.get_response(app).status_int)
+
+        # Signed with another secret
+        req = self._signed_request(FNAME)
+        self.flags(shared_secret='other-secret', group='image_peer')
+        self.assertEqual(403, req.get_response(app).status_int)
+        self.flags(shared_secret=None, group='image_peer')
+        self.assertEqual(403, req.get_response(app).status_int)
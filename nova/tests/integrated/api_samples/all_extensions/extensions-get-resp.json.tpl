@@ -136,6 +136,14 @@
             "namespace": "http://docs.openstack.org/compute/ext/aggregates/api/v1.1",
             "updated": "%(timestamp)s"
         },
+        {
+            "alias": "os-aggregate-cache-images",
+            "description": "%(text)s",
+            "links": [],
+            "name": "AggregateCacheImages",
+            "namespace": "http://docs.openstack.org/compute/ext/aggregate_cache_images/api/v2",
+            "updated": "%(timestamp)s"
+        },
         {
             "alias": "os-agents",
             "description": "%(text)s",
@@ -432,6 +432,154 @@ class LinuxNetworkTestCase(test.NoDBTestCase):
             self.assertTrue(lease[3] == data['instance_hostname'])
             self.assertTrue(lease[4] == '*')
 
+    def _fake_fixedip(self, address, mac):
+        return mock.Mock(address=address,
+                         virtual_interface=mock.Mock(address=mac),
+                         instance=mock.Mock(hostname='fake_instance09'))
+
+    @mock.patch.object(fileutils, 'ensure_tree')
+    @mock.patch.object(os, 'rename')
+    @mock.patch.object(os, 'chmod')
+    @mock.patch.object(linux_net, '_reload_dhcp')
+    @mock.patch.object(linux_net, 'restart_dhcp')
+    @mock.patch.object(linux_net, 'write_to_file')
+    def test_update_dhcp_incremental(self, mock_write, mock_restart,
+                                     mock_reload, mock_chmod, mock_rename,
+                                     mock_ensure_tree):
+        self.flags(dhcp_incremental_update=True)
+        self.addCleanup(linux_net._dhcp_hosts.clear)
+        conffile = linux_net._dhcp_file('eth0', 'conf')
+
+        self.driver.update_dhcp(self.context, 'eth0', networks[0])
+        mock_write.assert_called_once_with(
+                conffile, self.driver.get_dhcp_hosts(self.context,
+                                                     networks[0]))
+        mock_restart.assert_called_once_with(self.context, 'eth0',
+                                             networks[0])
+
+        mock_write.reset_mock()
+        fixedip = self._fake_fixedip('192.168.0.200', 'DE:AD:BE:EF:00:09')
+        self.driver.add_dhcp_host(self.context, 'eth0', networks[0],
+                                  fixedip)
+        hosts = mock_write.call_args[0][1].split('\n')
+        self.assertEqual(4, len(hosts))
+        self.assertEqual('DE:AD:BE:EF:00:09,fake_instance09.novalocal,'
+                         '192.168.0.200', hosts[-1])
+        mock_write.assert_called_once_with(conffile + '.tmp', mock.ANY)
+        mock_rename.assert_called_once_with(conffile + '.tmp', conffile)
+        mock_reload.assert_called_once_with(self.context, 'eth0',
+                                            networks[0])
+
+        mock_write.reset_mock()
+        self.driver.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                     '192.168.0.100')
+        hosts = mock_write.call_args[0][1].split('\n')
+        self.assertEqual(3, len(hosts))
+        self.assertFalse([h for h in hosts if '192.168.0.100' in h])
+
+        # Unknown addresses and known MAC addresses do not change the file
+        mock_write.reset_mock()
+        self.driver.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                     '192.168.0.100')
+        self.driver.add_dhcp_host(self.context, 'eth0', networks[0],
+                self._fake_fixedip('192.168.0.201', 'DE:AD:BE:EF:00:09'))
+        self.assertFalse(mock_write.called)
+        self.assertEqual(1, mock_restart.call_count)
+        self.assertEqual(2, mock_reload.call_count)
+
+        # The other fixed ip of the MAC address takes over its entry
+        self.driver.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                     '192.168.0.200')
+        hosts = mock_write.call_args[0][1].split('\n')
+        self.assertEqual(3, len(hosts))
+        self.assertEqual('DE:AD:BE:EF:00:09,fake_instance09.novalocal,'
+                         '192.168.0.201', hosts[-1])
+
+    @mock.patch.object(linux_net, 'update_dhcp')
+    def test_add_dhcp_host_not_incremental(self, mock_update):
+        fixedip = self._fake_fixedip('192.168.0.200', 'DE:AD:BE:EF:00:09')
+        self.driver.add_dhcp_host(self.context, 'eth0', networks[0],
+                                  fixedip)
+        self.driver.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                     '192.168.0.200')
+        self.assertEqual(2, mock_update.call_count)
+
+    @mock.patch.object(fileutils, 'ensure_tree')
+    @mock.patch.object(os, 'rename')
+    @mock.patch.object(os, 'chmod')
+    @mock.patch.object(linux_net, '_reload_dhcp')
+    @mock.patch.object(linux_net, 'restart_dhcp')
+    @mock.patch.object(linux_net, 'write_to_file')
+    def test_update_dns_incremental(self, mock_write, mock_restart,
+                                    mock_reload, mock_chmod, mock_rename,
+                                    mock_ensure_tree):
+        self.flags(dhcp_incremental_update=True)
+        self.addCleanup(linux_net._dhcp_hosts.clear)
+        self.addCleanup(linux_net._dns_hosts.clear)
+        hostsfile = linux_net._dhcp_file('eth0', 'hosts')
+        linux_net._dhcp_hosts['eth0'] = linux_net.DhcpHosts()
+
+        self.driver.update_dns(self.context, 'eth0', networks[0])
+        mock_write.assert_called_once_with(
+                hostsfile + '.tmp', self.driver.get_dns_hosts(self.context,
+                                                              networks[0]))
+        mock_rename.assert_called_once_with(hostsfile + '.tmp', hostsfile)
+        self.assertEqual(1, mock_reload.call_count)
+        self.assertFalse(mock_restart.called)
+
+        # Unchanged entries are neither written nor reloaded
+        mock_write.reset_mock()
+        self.driver.update_dns(self.context, 'eth0', networks[0])
+        self.assertFalse(mock_write.called)
+        self.assertEqual(1, mock_reload.call_count)
+
+        fixedip = self._fake_fixedip('192.168.0.200', 'DE:AD:BE:EF:00:09')
+        self.driver.add_dhcp_host(self.context, 'eth0', networks[0],
+                                  fixedip)
+        hosts = mock_write.call_args_list[1][0][1].split('\n')
+        self.assertEqual(4, len(hosts))
+        self.assertEqual('192.168.0.200\tfake_instance09.novalocal',
+                         hosts[-1])
+        # A single reload for both files
+        self.assertEqual(2, mock_reload.call_count)
+
+        mock_write.reset_mock()
+        self.driver.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                     '192.168.0.100')
+        hosts = mock_write.call_args[0][1].split('\n')
+        self.assertEqual(3, len(hosts))
+        self.assertFalse([h for h in hosts if '192.168.0.100' in h])
+        self.assertEqual(3, mock_reload.call_count)
+
+    @mock.patch.object(fileutils, 'ensure_tree')
+    @mock.patch.object(os, 'rename')
+    @mock.patch.object(os, 'chmod')
+    @mock.patch.object(linux_net, '_reload_dhcp')
+    @mock.patch.object(linux_net, 'write_to_file')
+    @mock.patch('eventlet.greenthread.spawn_after')
+    def test_dhcp_hup_delay(self, mock_spawn_after, mock_write, mock_reload,
+                            mock_chmod, mock_rename, mock_ensure_tree):
+        self.flags(dhcp_incremental_update=True, dnsmasq_hup_delay=2)
+        self.addCleanup(linux_net._dhcp_hosts.clear)
+        self.addCleanup(linux_net._pending_hups.clear)
+        linux_net._dhcp_hosts['eth0'] = linux_net.DhcpHosts()
+
+        for i in range(3):
+            fixedip = self._fake_fixedip('192.168.0.20%d' % i,
+                                         'DE:AD:BE:EF:00:2%d' % i)
+            self.driver.add_dhcp_host(self.context, 'eth0', networks[0],
+                                      fixedip)
+        self.assertEqual(3, mock_write.call_count)
+        mock_spawn_after.assert_called_once_with(
+                2, linux_net._delayed_reload_dhcp, self.context, 'eth0',
+                networks[0])
+        self.assertFalse(mock_reload.called)
+
+        linux_net._delayed_reload_dhcp(self.context, 'eth0', networks[0])
+        mock_reload.assert_called_once_with(self.context, 'eth0',
+                                            networks[0])
+        self.assertNotIn('eth0', linux_net._pending_hups)
+
     def test_dhcp_opts_not_default_gateway_network(self):
         expected = "NW-0,3"
         fixedip = fixed_ip_obj.FixedIPList.get_by_network(self.context,
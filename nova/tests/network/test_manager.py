@@ -1431,7 +1431,7 @@ class VlanNetworkTestCase(test.TestCase):
     def test_deallocate_fixed_deleted(self):
         # Verify doesn't deallocate deleted fixed_ip from deleted network.
 
-        def teardown_network_on_host(_context, network):
+        def teardown_network_on_host(_context, network, address=None):
             if network['id'] == 0:
                 raise test.TestingException()
 
@@ -217,6 +217,22 @@ class _TestBlockDeviceMappingListObject(object):
                     self.context, 'fake_instance_uuid'))
         self.assertEqual(0, len(bdm_list))
 
+    @mock.patch.object(db, 'block_device_mapping_get_all_by_instance_uuids')
+    def test_get_by_instance_uuids(self, get_all_by_insts):
+        fakes = [self.fake_bdm(123), self.fake_bdm(456)]
+        get_all_by_insts.return_value = {'fake-instance': fakes,
+                                         'other-instance': []}
+        bdm_list = (
+                block_device_obj.BlockDeviceMappingList.get_by_instance_uuids(
+                    self.context, ['fake-instance', 'other-instance']))
+        get_all_by_insts.assert_called_once_with(
+                self.context, ['fake-instance', 'other-instance'],
+                use_slave=False)
+        self.assertEqual([123, 456], sorted(bdm.id for bdm in bdm_list))
+        for bdm in bdm_list:
+            self.assertIsInstance(bdm, block_device_obj.BlockDeviceMapping)
+            self.assertEqual('fake-instance', bdm.instance_uuid)
+
     def test_root_volume_metadata(self):
         fake_volume = {
                 'volume_image_metadata': {'vol_test_key': 'vol_test_value'}}
@@ -169,6 +169,14 @@ COMPUTE_NODES_METRICS = [
                                      ])),
 ]
 
+AGGREGATES = [
+        dict(id=1, name='agg1', hosts=['host1', 'host2'],
+             metadetails={'availability_zone': 'zone1',
+                          'cpu_allocation_ratio': '2.0'}),
+        dict(id=2, name='agg2', hosts=['host2'],
+             metadetails={'cpu_allocation_ratio': '4.0'}),
+]
+
 INSTANCES = [
         dict(root_gb=512, ephemeral_gb=0, memory_mb=512, vcpus=1,
              host='host1', node='node1'),
@@ -258,5 +266,7 @@ class FakeComputeAPI(object):
 
 def mox_host_manager_db_calls(mock, context):
     mock.StubOutWithMock(db, 'compute_node_get_all')
+    mock.StubOutWithMock(db, 'aggregate_get_all')
 
     db.compute_node_get_all(mox.IgnoreArg()).AndReturn(COMPUTE_NODES)
+    db.aggregate_get_all(mox.IgnoreArg()).AndReturn(AGGREGATES)
@@ -0,0 +1,97 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For batch placement.
+"""
+
+from nova.scheduler import batch_placement
+from nova.scheduler import weights
+from nova import test
+from nova.tests.scheduler import fakes
+
+
+class FakeAllHostsWeigher(weights.BaseHostWeigher):
+    def _weigh_object(self, host_state, weight_properties):
+        return 0
+
+    def weigh_objects(self, weighed_obj_list, weight_properties):
+        return [len(weighed_obj_list)] * len(weighed_obj_list)
+
+
+class VcpusWeigher(weights.BaseHostWeigher):
+    def _weigh_object(self, host_state, weight_properties):
+        return host_state.vcpus_total - host_state.vcpus_used
+
+
+class WeighedHostHeapTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(WeighedHostHeapTestCase, self).setUp()
+        self.weight_handler = weights.HostWeightHandler()
+        self.weight_classes = self.weight_handler.get_matching_classes(
+                ['nova.scheduler.weights.ram.RAMWeigher',
+                 'nova.tests.scheduler.test_batch_placement.VcpusWeigher'])
+        self.hosts = [
+            fakes.FakeHostState('host1', 'node1',
+                                {'free_ram_mb': 1024, 'vcpus_total': 4,
+                                 'vcpus_used': 0}),
+            fakes.FakeHostState('host2', 'node2',
+                                {'free_ram_mb': 4096, 'vcpus_total': 4,
+                                 'vcpus_used': 2}),
+            fakes.FakeHostState('host3', 'node3',
+                                {'free_ram_mb': 4096, 'vcpus_total': 8,
+                                 'vcpus_used': 6}),
+            fakes.FakeHostState('host4', 'node4',
+                                {'free_ram_mb': 2048, 'vcpus_total': 2,
+                                 'vcpus_used': 0}),
+        ]
+        self.heap = batch_placement.WeighedHostHeap(self.weight_classes,
+                                                    self.hosts, {})
+
+    def _assert_same_as_handler(self, hosts):
+        expected = self.weight_handler.get_weighed_objects(
+                self.weight_classes, hosts, {})
+        best = self.heap.get_best(len(hosts))
+        self.assertEqual([(h.obj.host, h.weight) for h in expected],
+                         [(h.obj.host, h.weight) for h in best])
+        self.assertEqual(expected[0].obj, self.heap.get_best()[0].obj)
+
+    def test_initial_weights(self):
+        self.assertEqual(4, len(self.heap))
+        self._assert_same_as_handler(self.hosts)
+
+    def test_update_without_moving_bounds(self):
+        self.hosts[3].free_ram_mb = 1536
+        self.heap.update(self.hosts[3])
+        self._assert_same_as_handler(self.hosts)
+
+    def test_update_moving_bounds(self):
+        for i in range(3):
+            host = self.heap.get_best()[0].obj
+            host.free_ram_mb -= 2048
+            host.vcpus_used += 1
+            self.heap.update(host)
+            self._assert_same_as_handler(self.hosts)
+
+    def test_remove(self):
+        self.heap.remove(self.hosts[1])
+        self.assertEqual(3, len(self.heap))
+        self._assert_same_as_handler([self.hosts[0], self.hosts[2],
+                                      self.hosts[3]])
+
+    def test_supports_weighers(self):
+        self.assertTrue(batch_placement.supports_weighers(
+                self.weight_classes))
+        self.assertFalse(batch_placement.supports_weighers(
+                [FakeAllHostsWeigher]))
@@ -41,6 +41,56 @@ class CachingSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertEqual([], self.driver.all_host_states)
         context.elevated.assert_called_with()
 
+    @mock.patch.object(caching_scheduler.CachingScheduler,
+                       "_get_up_hosts")
+    def test_run_periodic_tasks_reload_interval(self, mock_up_hosts):
+        self.flags(scheduler_cache_reload_interval=600)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        mock_up_hosts.return_value = []
+        context = mock.Mock()
+
+        self.driver.run_periodic_tasks(context)
+        timeutils.advance_time_seconds(60)
+        self.driver.run_periodic_tasks(context)
+        self.assertEqual(1, mock_up_hosts.call_count)
+
+        timeutils.advance_time_seconds(600)
+        self.driver.run_periodic_tasks(context)
+        self.assertEqual(2, mock_up_hosts.call_count)
+
+    def test_update_compute_node_resources(self):
+        self.driver.all_host_states = []
+        self.driver.last_reload = timeutils.utcnow()
+        with mock.patch.object(self.driver.host_manager,
+                               "update_compute_node_resources") as update:
+            update.return_value = True
+            self.driver.update_compute_node_resources(self.context, "host",
+                    "node", {"free_ram_mb": 1024})
+
+            update.assert_called_once_with("host", "node",
+                                           {"free_ram_mb": 1024})
+            self.assertIsNotNone(self.driver.last_reload)
+
+    def test_update_compute_node_resources_new_node(self):
+        self.driver.all_host_states = []
+        self.driver.last_reload = timeutils.utcnow()
+        with mock.patch.object(self.driver.host_manager,
+                               "update_compute_node_resources") as update:
+            update.return_value = False
+            self.driver.update_compute_node_resources(self.context, "host",
+                    "node", {"free_ram_mb": 1024})
+
+            self.assertIsNone(self.driver.last_reload)
+
+    def test_update_compute_node_resources_nothing_cached(self):
+        with mock.patch.object(self.driver.host_manager,
+                               "update_compute_node_resources") as update:
+            self.driver.update_compute_node_resources(self.context, "host",
+                    "node", {"free_ram_mb": 1024})
+
+            self.assertFalse(update.called)
+
     @mock.patch.object(caching_scheduler.CachingScheduler,
                        "_get_up_hosts")
     def test_get_all_host_states_returns_cached_value(self, mock_up_hosts):
@@ -32,6 +32,7 @@ from nova.objects import instance_group as instance_group_obj
 from nova.pci import pci_request
 from nova.scheduler import driver
 from nova.scheduler import filter_scheduler
+from nova.scheduler import host_claims
 from nova.scheduler import host_manager
 from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
@@ -94,6 +95,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
         db.compute_node_get_all(mox.IgnoreArg()).AndReturn([])
+        self.mox.StubOutWithMock(db, 'aggregate_get_all')
+        db.aggregate_get_all(mox.IgnoreArg()).AndReturn([])
 
         self.mox.ReplayAll()
         sched.schedule_run_instance(
@@ -237,6 +240,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
         db.compute_node_get_all(mox.IgnoreArg()).AndReturn([])
+        self.mox.StubOutWithMock(db, 'aggregate_get_all')
+        db.aggregate_get_all(mox.IgnoreArg()).AndReturn([])
         self.mox.ReplayAll()
 
         sched._schedule(self.context, request_spec,
@@ -256,6 +261,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
         db.compute_node_get_all(mox.IgnoreArg()).AndReturn([])
+        self.mox.StubOutWithMock(db, 'aggregate_get_all')
+        db.aggregate_get_all(mox.IgnoreArg()).AndReturn([])
         self.mox.ReplayAll()
 
         sched._schedule(self.context, request_spec,
@@ -275,6 +282,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
         db.compute_node_get_all(mox.IgnoreArg()).AndReturn([])
+        self.mox.StubOutWithMock(db, 'aggregate_get_all')
+        db.aggregate_get_all(mox.IgnoreArg()).AndReturn([])
         self.mox.ReplayAll()
 
         sched._schedule(self.context, request_spec,
@@ -295,6 +304,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
         db.compute_node_get_all(mox.IgnoreArg()).AndReturn([])
+        self.mox.StubOutWithMock(db, 'aggregate_get_all')
+        db.aggregate_get_all(mox.IgnoreArg()).AndReturn([])
         self.mox.ReplayAll()
 
         sched._schedule(self.context, request_spec,
@@ -317,6 +328,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
         db.compute_node_get_all(mox.IgnoreArg()).AndReturn([])
+        self.mox.StubOutWithMock(db, 'aggregate_get_all')
+        db.aggregate_get_all(mox.IgnoreArg()).AndReturn([])
         self.mox.ReplayAll()
 
         sched._schedule(self.context, request_spec,
@@ -511,6 +524,84 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.assertEqual(50, hosts[0].weight)
 
+    def _schedule_fake_hosts(self, sched, num_instances):
+        def _fake_get_all_host_states(context):
+            host_states = []
+            for compute in fakes.COMPUTE_NODES[:4]:
+                host_state = host_manager.HostState(
+                        compute['service']['host'],
+                        compute['hypervisor_hostname'])
+                host_state.update_from_compute_node(compute)
+                host_states.append(host_state)
+            return host_states
+
+        self.stubs.Set(sched, '_get_all_host_states',
+                       _fake_get_all_host_states)
+        instance_properties = {'project_id': 1,
+                               'root_gb': 1,
+                               'memory_mb': 512,
+                               'ephemeral_gb': 0,
+                               'vcpus': 1,
+                               'os_type': 'Linux'}
+        request_spec = dict(instance_properties=instance_properties,
+                            instance_type={'memory_mb': 512, 'vcpus': 1},
+                            num_instances=num_instances)
+        hosts = sched._schedule(self.context, request_spec,
+                                filter_properties={})
+        return [(h.obj.host, h.obj.nodename, h.weight) for h in hosts]
+
+    def test_schedule_batch_placement_matches_schedule(self):
+        self.flags(scheduler_host_subset_size=1,
+                   scheduler_default_filters=['RamFilter', 'CoreFilter',
+                                              'NumInstancesFilter'],
+                   ram_allocation_ratio=1.0, max_instances_per_host=4)
+        sched = fakes.FakeFilterScheduler()
+        expected = self._schedule_fake_hosts(sched, 20)
+
+        self.flags(scheduler_batch_placement=True)
+        with mock.patch.object(sched, '_schedule_batch',
+                               wraps=sched._schedule_batch) as batch:
+            self.assertEqual(expected, self._schedule_fake_hosts(sched, 20))
+            self.assertTrue(batch.called)
+        # Each host takes instances until it runs out of RAM or reaches
+        # max_instances_per_host.
+        self.assertEqual(11, len(expected))
+
+    def _weighed_hosts(self, count):
+        return [weights.WeighedHost(
+                    fakes.FakeHostState('host%d' % i, 'node%d' % i, {}),
+                    count - i)
+                for i in range(count)]
+
+    def test_choose_host_skips_claimed_hosts(self):
+        host_claims.init(slots=1024)
+        self.addCleanup(host_claims.reset)
+        sched = fakes.FakeFilterScheduler()
+        weighed_hosts = self._weighed_hosts(3)
+        for weighed_host in weighed_hosts:
+            weighed_host.obj.generation = 0
+
+        # Another worker claimed the best host
+        other_worker_host = fakes.FakeHostState('host0', 'node0', {})
+        other_worker_host.generation = 0
+        self.assertTrue(host_claims.claim(other_worker_host))
+
+        self.assertEqual(weighed_hosts[1],
+                         sched._choose_host(weighed_hosts))
+        self.assertEqual(3, len(weighed_hosts))
+
+    def test_choose_host_all_hosts_claimed(self):
+        host_claims.init(slots=1024)
+        self.addCleanup(host_claims.reset)
+        sched = fakes.FakeFilterScheduler()
+        weighed_hosts = self._weighed_hosts(2)
+        for weighed_host in weighed_hosts:
+            weighed_host.obj.generation = -1
+
+        # The claim on the compute node will decide
+        self.assertEqual(weighed_hosts[0],
+                         sched._choose_host(weighed_hosts))
+
     def test_select_destinations(self):
         """select_destinations is basically a wrapper around _schedule().
 
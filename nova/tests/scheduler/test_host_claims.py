@@ -0,0 +1,59 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the optimistic host claims.
+"""
+
+from nova.scheduler import host_claims
+from nova import test
+from nova.tests.scheduler import fakes
+
+
+class HostClaimsTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(HostClaimsTestCase, self).setUp()
+        host_claims.init(slots=16)
+        self.addCleanup(host_claims.reset)
+
+    def _host_state(self):
+        host_state = fakes.FakeHostState('host1', 'node1', {})
+        host_state.generation = host_claims.get_generation('host1', 'node1')
+        return host_state
+
+    def test_disabled(self):
+        host_claims.reset()
+        self.assertFalse(host_claims.is_enabled())
+        self.assertIsNone(host_claims.get_generation('host1', 'node1'))
+        self.assertTrue(host_claims.claim(self._host_state()))
+
+    def test_claim(self):
+        host_state = self._host_state()
+        self.assertEqual(0, host_state.generation)
+        self.assertTrue(host_claims.claim(host_state))
+        self.assertEqual(1, host_state.generation)
+        self.assertEqual(1, host_claims.get_generation('host1', 'node1'))
+        # A worker can claim a host again if nobody else did
+        self.assertTrue(host_claims.claim(host_state))
+        self.assertEqual(2, host_claims.get_generation('host1', 'node1'))
+
+    def test_claim_conflict(self):
+        host_state1 = self._host_state()
+        host_state2 = self._host_state()
+        self.assertTrue(host_claims.claim(host_state1))
+        self.assertFalse(host_claims.claim(host_state2))
+        # The loser now knows about the other claim
+        self.assertEqual(1, host_state2.generation)
+        self.assertTrue(host_claims.claim(host_state2))
+        self.assertEqual(2, host_claims.get_generation('host1', 'node1'))
@@ -0,0 +1,144 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the vectorized host filtering and weighing.
+"""
+
+from oslo.config import cfg
+import testtools
+
+from nova.scheduler import filters
+from nova.scheduler import host_columns
+from nova.scheduler import host_manager
+from nova.scheduler import weights
+from nova import test
+from nova.tests.scheduler import fakes
+
+CONF = cfg.CONF
+CONF.import_opt('disk_allocation_ratio', 'nova.scheduler.filters.disk_filter')
+CONF.import_opt('ram_weight_multiplier', 'nova.scheduler.weights.ram')
+CONF.import_group('metrics', 'nova.scheduler.weights.metrics')
+
+
+class PassAllFilter(filters.BaseHostFilter):
+    def host_passes(self, host_state, filter_properties):
+        return True
+
+
+class RejectHost2Filter(filters.BaseHostFilter):
+    def host_passes(self, host_state, filter_properties):
+        return host_state.host != 'host2'
+
+
+@testtools.skipIf(host_columns.numpy is None, "numpy is not installed")
+class HostColumnsTestCase(test.NoDBTestCase):
+    """Test case for the vectorized filters and weighers."""
+
+    def setUp(self):
+        super(HostColumnsTestCase, self).setUp()
+        self.filter_handler = filters.HostFilterHandler()
+        self.weight_handler = weights.HostWeightHandler()
+        self.instance_type = dict(memory_mb=1024, root_gb=512,
+                                  ephemeral_gb=0, swap=0, vcpus=2)
+
+    def _get_host_states(self, compute_nodes=None):
+        host_states = []
+        for compute in compute_nodes or fakes.COMPUTE_NODES[:4]:
+            host_state = host_manager.HostState(compute['service']['host'],
+                                                compute['hypervisor_hostname'])
+            host_state.update_from_compute_node(compute)
+            host_states.append(host_state)
+        return host_states
+
+    def _filter(self, filter_names, vectorized):
+        self.flags(scheduler_use_vectorized_filters=vectorized)
+        filter_classes = self.filter_handler.get_matching_classes(
+                filter_names)
+        host_states = self._get_host_states()
+        filter_properties = {'instance_type': self.instance_type}
+        result = self.filter_handler.get_filtered_objects(filter_classes,
+                host_states, filter_properties)
+        return ([(h.host, h.nodename) for h in result],
+                [h.limits for h in host_states])
+
+    def _assert_same_filtering(self, filter_names):
+        expected = self._filter(filter_names, False)
+        self.assertEqual(expected, self._filter(filter_names, True))
+        return expected
+
+    def test_resource_filters(self):
+        self.flags(cpu_allocation_ratio=1.0, ram_allocation_ratio=1.0,
+                   disk_allocation_ratio=1.0, max_instances_per_host=1,
+                   max_io_ops_per_host=1)
+        hosts, limits = self._assert_same_filtering(
+                ['nova.scheduler.filters.ram_filter.RamFilter',
+                 'nova.scheduler.filters.core_filter.CoreFilter',
+                 'nova.scheduler.filters.disk_filter.DiskFilter',
+                 'nova.scheduler.filters.io_ops_filter.IoOpsFilter',
+                 'nova.scheduler.filters.num_instances_filter.'
+                 'NumInstancesFilter'])
+        self.assertEqual([('host3', 'node3'), ('host4', 'node4')], hosts)
+        self.assertEqual({}, limits[0])
+        self.assertEqual({'memory_mb': 4096.0, 'vcpu': 4.0,
+                          'disk_gb': 4096.0}, limits[2])
+
+    def test_mixed_filters(self):
+        self._assert_same_filtering(
+                ['nova.tests.scheduler.test_host_columns.PassAllFilter',
+                 'nova.scheduler.filters.ram_filter.RamFilter',
+                 'nova.tests.scheduler.test_host_columns.RejectHost2Filter',
+                 'nova.scheduler.filters.core_filter.CoreFilter'])
+
+    def test_no_host_left(self):
+        self.instance_type['memory_mb'] = 1024 * 1024
+        hosts, limits = self._assert_same_filtering(
+                ['nova.scheduler.filters.ram_filter.RamFilter',
+                 'nova.tests.scheduler.test_host_columns.RejectHost2Filter'])
+        self.assertEqual([], hosts)
+
+    def _weigh(self, weigher_names, compute_nodes, vectorized):
+        self.flags(scheduler_use_vectorized_filters=vectorized)
+        weigher_classes = self.weight_handler.get_matching_classes(
+                weigher_names)
+        host_states = self._get_host_states(compute_nodes)
+        result = self.weight_handler.get_weighed_objects(weigher_classes,
+                host_states, {})
+        return [(h.obj.host, h.weight) for h in result]
+
+    def _assert_same_weighing(self, weigher_names, compute_nodes=None):
+        expected = self._weigh(weigher_names, compute_nodes, False)
+        self.assertEqual(expected,
+                         self._weigh(weigher_names, compute_nodes, True))
+        return expected
+
+    def test_ram_weigher(self):
+        self.flags(ram_weight_multiplier=2.0)
+        result = self._assert_same_weighing(
+                ['nova.scheduler.weights.ram.RAMWeigher'])
+        self.assertEqual(('host4', 2.0), result[0])
+
+    def test_metrics_weigher(self):
+        self.flags(weight_setting=['foo=1.0', 'bar=-2.0'], group='metrics')
+        self._assert_same_weighing(
+                ['nova.scheduler.weights.ram.RAMWeigher',
+                 'nova.scheduler.weights.metrics.MetricsWeigher'],
+                fakes.COMPUTE_NODES_METRICS)
+
+    def test_metrics_weigher_unavailable_metric(self):
+        self.flags(weight_setting=['zot=1.0'], required=False,
+                   group='metrics')
+        self._assert_same_weighing(
+                ['nova.scheduler.weights.metrics.MetricsWeigher'],
+                fakes.COMPUTE_NODES_METRICS)
@@ -1468,6 +1468,39 @@ class HostFiltersTestCase(test.NoDBTestCase):
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
         self.assertEqual(4 * 2, host.limits['vcpu'])
 
+    def test_aggregate_core_filter_uses_host_aggregates_metadata(self):
+        filt_cls = self.class_map['AggregateCoreFilter']()
+        filter_properties = {'context': self.context,
+                             'instance_type': {'vcpus': 1}}
+        self.flags(cpu_allocation_ratio=1)
+        self.mox.StubOutWithMock(db, 'aggregate_metadata_get_by_host')
+        self.mox.ReplayAll()
+        host = fakes.FakeHostState('host1', 'node1',
+                {'vcpus_total': 4, 'vcpus_used': 8,
+                 'aggregates_metadata': {
+                     'cpu_allocation_ratio': set(['2', '3'])}})
+        # use the minimum ratio from the preloaded aggregate metadata
+        self.assertFalse(filt_cls.host_passes(host, filter_properties))
+        self.assertEqual(4 * 2, host.limits['vcpu'])
+
+    def test_aggregate_type_filter_uses_host_aggregates_metadata(self):
+        filt_cls = self.class_map['AggregateTypeAffinityFilter']()
+        self.mox.StubOutWithMock(db, 'aggregate_metadata_get_by_host')
+        self.mox.ReplayAll()
+        filter_properties = {'context': self.context,
+                             'instance_type': {'name': 'fake1'}}
+        filter2_properties = {'context': self.context,
+                             'instance_type': {'name': 'fake2'}}
+        host = fakes.FakeHostState('host1', 'node1',
+                {'aggregates_metadata': {'instance_type': set(['fake1']),
+                                         'other': set(['value'])}})
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+        self.assertFalse(filt_cls.host_passes(host, filter2_properties))
+        # No aggregates at all
+        host = fakes.FakeHostState('host2', 'node2',
+                {'aggregates_metadata': {}})
+        self.assertTrue(filt_cls.host_passes(host, filter2_properties))
+
     @staticmethod
     def _make_zone_request(zone, is_admin=False):
         ctxt = context.RequestContext('fake', 'fake', is_admin=is_admin)
@@ -1496,6 +1529,20 @@ class HostFiltersTestCase(test.NoDBTestCase):
                                    {'service': service})
         self.assertFalse(filt_cls.host_passes(host, request))
 
+    def test_availability_zone_filter_uses_host_aggregates_metadata(self):
+        filt_cls = self.class_map['AvailabilityZoneFilter']()
+        self.mox.StubOutWithMock(db, 'aggregate_metadata_get_by_host')
+        self.mox.ReplayAll()
+        request = self._make_zone_request('zone1')
+        host = fakes.FakeHostState('host1', 'node1',
+                {'aggregates_metadata': {
+                    'availability_zone': set(['zone1'])}})
+        self.assertTrue(filt_cls.host_passes(host, request))
+        host = fakes.FakeHostState('host2', 'node2',
+                {'aggregates_metadata': {
+                    'availability_zone': set(['zone2'])}})
+        self.assertFalse(filt_cls.host_passes(host, request))
+
     def test_retry_filter_disabled(self):
         # Test case where retry/re-scheduling is disabled.
         filt_cls = self.class_map['RetryFilter']()
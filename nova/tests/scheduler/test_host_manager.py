@@ -15,6 +15,9 @@
 """
 Tests For HostManager
 """
+import mock
+import mox
+
 from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
@@ -271,9 +274,11 @@ class HostManagerTestCase(test.NoDBTestCase):
         context = 'fake_context'
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'aggregate_get_all')
         self.mox.StubOutWithMock(host_manager.LOG, 'warn')
 
         db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.aggregate_get_all(context).AndReturn(fakes.AGGREGATES)
         # node 3 host physical disk space is greater than database
         host_manager.LOG.warn("Host has more disk space than database expected"
                               " (3333gb > 3072gb)")
@@ -313,6 +318,17 @@ class HostManagerTestCase(test.NoDBTestCase):
         # 8191GB
         self.assertEqual(host_states_map[('host4', 'node4')].free_disk_mb,
                          8388608)
+        # Check that the aggregate metadata is indexed by host
+        self.assertEqual(
+            host_states_map[('host1', 'node1')].aggregates_metadata,
+            {'availability_zone': set(['zone1']),
+             'cpu_allocation_ratio': set(['2.0'])})
+        self.assertEqual(
+            host_states_map[('host2', 'node2')].aggregates_metadata,
+            {'availability_zone': set(['zone1']),
+             'cpu_allocation_ratio': set(['2.0', '4.0'])})
+        self.assertEqual(
+            host_states_map[('host3', 'node3')].aggregates_metadata, {})
 
 
 class HostManagerChangedNodesTestCase(test.NoDBTestCase):
@@ -328,6 +344,8 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
               host_manager.HostState('host4', 'node4')
             ]
         self.addCleanup(timeutils.clear_time_override)
+        self.mox.StubOutWithMock(db, 'aggregate_get_all')
+        db.aggregate_get_all(mox.IgnoreArg()).MultipleTimes().AndReturn([])
 
     def test_get_all_host_states(self):
         context = 'fake_context'
@@ -372,6 +390,110 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 0)
 
+    def _compute_node_summary(self, compute):
+        return dict(id=compute['id'], service_id=compute['id'],
+                    hypervisor_hostname=compute['hypervisor_hostname'],
+                    service=compute['service'])
+
+    def test_get_all_host_states_incremental(self):
+        self.flags(scheduler_incremental_host_refresh=True)
+        context = 'fake_context'
+        timeutils.set_time_override()
+        first_refresh = timeutils.utcnow()
+
+        changed_node = dict(fakes.COMPUTE_NODES[2], free_ram_mb=1024)
+        # node4 is gone, node1 and node2 did not change
+        unchanged_nodes = [self._compute_node_summary(n)
+                           for n in fakes.COMPUTE_NODES[:2]]
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_changes')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.compute_node_get_changes(context, first_refresh).AndReturn(
+                ([changed_node], unchanged_nodes))
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        host_state3 = host_states_map[('host3', 'node3')]
+        timeutils.advance_time_seconds(60)
+        real_update = host_manager.HostState.update_from_compute_node
+        with mock.patch.object(host_manager.HostState,
+                               'update_from_compute_node', autospec=True,
+                               side_effect=real_update) as update:
+            self.host_manager.get_all_host_states(context)
+        # Only the changed node was updated
+        update.assert_called_once_with(host_state3, changed_node)
+
+        self.assertEqual(len(host_states_map), 3)
+        self.assertNotIn(('host4', 'node4'), host_states_map)
+        self.assertEqual(1024,
+                         host_states_map[('host3', 'node3')].free_ram_mb)
+        self.assertEqual(512,
+                         host_states_map[('host1', 'node1')].free_ram_mb)
+
+    def test_get_all_host_states_incremental_full_refresh(self):
+        self.flags(scheduler_incremental_host_refresh=True,
+                   scheduler_full_host_refresh_interval=600)
+        context = 'fake_context'
+        timeutils.set_time_override()
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_changes')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.compute_node_get_changes(context, mox.IgnoreArg()).AndReturn(
+                ([], [self._compute_node_summary(n)
+                      for n in fakes.COMPUTE_NODES[:4]]))
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        timeutils.advance_time_seconds(60)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(len(self.host_manager.host_state_map), 4)
+        timeutils.advance_time_seconds(600)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(len(self.host_manager.host_state_map), 4)
+
+    def test_update_compute_node_resources(self):
+        context = 'fake_context'
+        timeutils.set_time_override()
+        now = timeutils.utcnow()
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        self.mox.ReplayAll()
+        self.host_manager.get_all_host_states(context)
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+
+        self.assertTrue(self.host_manager.update_compute_node_resources(
+                'host1', 'node1',
+                {'free_ram_mb': 256, 'updated_at': timeutils.strtime(now)}))
+        self.assertEqual(256, host_state.free_ram_mb)
+        self.assertEqual(now, host_state.updated)
+        # The other resources are kept from the last full record
+        self.assertEqual(524288, host_state.free_disk_mb)
+
+        # Updates older than the host state are ignored
+        timeutils.advance_time_seconds(-60)
+        self.assertTrue(self.host_manager.update_compute_node_resources(
+                'host1', 'node1',
+                {'free_ram_mb': 128,
+                 'updated_at': timeutils.strtime(timeutils.utcnow())}))
+        self.assertEqual(256, host_state.free_ram_mb)
+        self.assertEqual(now, host_state.updated)
+
+    def test_update_compute_node_resources_unknown_node(self):
+        context = 'fake_context'
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        self.mox.ReplayAll()
+        self.host_manager.get_all_host_states(context)
+
+        self.assertFalse(self.host_manager.update_compute_node_resources(
+                'host5', 'node5', {'free_ram_mb': 256}))
+
 
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
@@ -500,3 +622,68 @@ class HostStateTestCase(test.NoDBTestCase):
         self.assertEqual('source1', host.metrics['res1'].source)
         self.assertEqual('string2', host.metrics['res2'].value)
         self.assertEqual('source2', host.metrics['res2'].source)
+
+    def _compute_with_stats(self, **kwargs):
+        compute = dict(memory_mb=0, free_disk_gb=0, local_gb=0,
+                       local_gb_used=0, free_ram_mb=0, vcpus=0, vcpus_used=0,
+                       updated_at=None, host_ip='127.0.0.1',
+                       hypervisor_version=1)
+        compute.update(kwargs)
+        return compute
+
+    def test_blobs_decoded_on_first_access(self):
+        compute = self._compute_with_stats(
+                stats=jsonutils.dumps({'num_instances': '2'}),
+                metrics=jsonutils.dumps([dict(name='res1', value=1.0,
+                                              source='source1',
+                                              timestamp=None)]),
+                supported_instances=jsonutils.dumps([['x86_64', 'kvm',
+                                                      'hvm']]))
+        host = host_manager.HostState("fakehost", "fakenode")
+
+        with mock.patch.object(jsonutils, 'loads',
+                               wraps=jsonutils.loads) as loads:
+            host.update_from_compute_node(compute)
+            self.assertFalse(loads.called)
+
+            self.assertEqual(2, host.num_instances)
+            self.assertEqual(1.0, host.metrics['res1'].value)
+            self.assertEqual([['x86_64', 'kvm', 'hvm']],
+                             host.supported_instances)
+            self.assertEqual(3, loads.call_count)
+
+            # Decoded only once
+            self.assertEqual({'num_instances': '2'}, host.stats)
+            self.assertEqual(1, len(host.metrics))
+            self.assertEqual(3, loads.call_count)
+
+    def test_consumption_after_update_from_compute_node(self):
+        stats = jsonutils.dumps({'num_instances': '5',
+                                 'num_proj_12345': '3',
+                                 'io_workload': '1'})
+        host = host_manager.HostState("fakehost", "fakenode")
+        host.update_from_compute_node(self._compute_with_stats(stats=stats))
+
+        instance = dict(root_gb=0, ephemeral_gb=0, memory_mb=0, vcpus=0,
+                        project_id='12345', vm_state=vm_states.BUILDING,
+                        task_state=None, os_type='Linux')
+        host.consume_from_instance(instance)
+
+        self.assertEqual(6, host.num_instances)
+        self.assertEqual(4, host.num_instances_by_project['12345'])
+        self.assertEqual(2, host.num_io_ops)
+
+    def test_stats_keys_interned(self):
+        stats = jsonutils.dumps({'num_proj_12345': '1'})
+        host1 = host_manager.HostState("host1", "node1")
+        host1.update_from_compute_node(self._compute_with_stats(stats=stats))
+        host2 = host_manager.HostState("host2", "node2")
+        host2.update_from_compute_node(self._compute_with_stats(stats=stats))
+
+        key1 = host1.num_instances_by_project.keys()[0]
+        key2 = host2.num_instances_by_project.keys()[0]
+        self.assertIs(key1, key2)
+
+    def test_no_instance_dict(self):
+        host = host_manager.HostState("fakehost", "fakenode")
+        self.assertFalse(hasattr(host, '__dict__'))
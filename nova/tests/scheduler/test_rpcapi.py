@@ -82,3 +82,12 @@ class SchedulerRpcAPITestCase(test.NoDBTestCase):
         self._test_scheduler_api('select_destinations', rpc_method='call',
                 request_spec='fake_request_spec',
                 filter_properties='fake_prop')
+
+    def test_get_profiling_stats(self):
+        self._test_scheduler_api('get_profiling_stats', rpc_method='call',
+                reset=True, version='3.1')
+
+    def test_update_compute_node_resources(self):
+        self._test_scheduler_api('update_compute_node_resources',
+                rpc_method='cast', host='fake_host', nodename='fake_node',
+                values={'free_ram_mb': 1024}, fanout=True, version='3.2')
@@ -34,6 +34,7 @@ from nova import db
 from nova import exception
 from nova.image import glance
 from nova.objects import instance as instance_obj
+from nova import profiler
 from nova import rpc
 from nova.scheduler import driver
 from nova.scheduler import manager
@@ -403,6 +404,24 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
         self.manager._set_vm_state_and_notify('foo', {'vm_state': 'foo'},
                                               self.context, None, request)
 
+    def test_get_profiling_stats(self):
+        self.mox.StubOutWithMock(profiler, 'get_stats')
+        profiler.get_stats(reset=True).AndReturn('fake_stats')
+        self.mox.ReplayAll()
+        self.assertEqual('fake_stats',
+                         self.manager.get_profiling_stats(self.context,
+                                                          reset=True))
+
+    def test_update_compute_node_resources(self):
+        self.mox.StubOutWithMock(self.manager.driver,
+                                 'update_compute_node_resources')
+        self.manager.driver.update_compute_node_resources(self.context,
+                'host', 'node', {'free_ram_mb': 1024})
+        self.mox.ReplayAll()
+        self.manager.update_compute_node_resources(self.context, 'host',
+                                                   'node',
+                                                   {'free_ram_mb': 1024})
+
     def test_select_hosts_throws_rpc_clientexception(self):
         self.mox.StubOutWithMock(self.manager.driver, 'select_destinations')
 
@@ -582,3 +601,16 @@ class SchedulerV3PassthroughTestCase(test.TestCase):
                 ) as prep_resize:
             self.proxy.prep_resize(None, None, None, None, None, None, None)
             prep_resize.assert_called_once()
+
+    def test_get_profiling_stats(self):
+        with mock.patch.object(self.manager, 'get_profiling_stats'
+                ) as get_profiling_stats:
+            self.proxy.get_profiling_stats(None, True)
+            get_profiling_stats.assert_called_once_with(None, reset=True)
+
+    def test_update_compute_node_resources(self):
+        with mock.patch.object(self.manager, 'update_compute_node_resources'
+                ) as update_compute_node_resources:
+            self.proxy.update_compute_node_resources(None, 'host', 'node', {})
+            update_compute_node_resources.assert_called_once_with(None,
+                    host='host', nodename='node', values={})
@@ -47,6 +47,8 @@ class RamWeigherTestCase(test.NoDBTestCase):
         self.useFixture(mockpatch.Patch(
             'nova.db.compute_node_get_all',
              return_value=fakes.COMPUTE_NODES))
+        self.useFixture(mockpatch.Patch(
+            'nova.db.aggregate_get_all', return_value=[]))
         self.host_manager = fakes.FakeHostManager()
         self.weight_handler = weights.HostWeightHandler()
         self.weight_classes = self.weight_handler.get_matching_classes(
@@ -135,6 +137,8 @@ class MetricsWeigherTestCase(test.NoDBTestCase):
         self.useFixture(mockpatch.Patch(
             'nova.db.compute_node_get_all',
              return_value=fakes.COMPUTE_NODES_METRICS))
+        self.useFixture(mockpatch.Patch(
+            'nova.db.aggregate_get_all', return_value=[]))
         self.host_manager = fakes.FakeHostManager()
         self.weight_handler = weights.HostWeightHandler()
         self.weight_classes = self.weight_handler.get_matching_classes(
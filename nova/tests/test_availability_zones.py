@@ -17,6 +17,7 @@
 Tests for availability zones
 """
 
+import mox
 from oslo.config import cfg
 
 from nova import availability_zones as az
@@ -245,3 +246,31 @@ class AvailabilityZoneTestCases(test.TestCase):
 
         self.assertEqual(self.availability_zone,
                 az.get_instance_availability_zone(self.context, fake_inst))
+
+    def test_get_instances_availability_zones(self):
+        az.reset_cache()
+        host = 'host170'
+        service = self._create_service_with_topic('compute', host)
+        self._add_to_aggregate(service, self.agg)
+        az._get_cache().set(az._make_cache_key('cached-host'), 'cached-az')
+
+        fake_insts = [
+            fakes.stub_instance(1, uuid='uuid1', host=host),
+            fakes.stub_instance(2, uuid='uuid2', host=host),
+            fakes.stub_instance(3, uuid='uuid3', host='other-host'),
+            fakes.stub_instance(4, uuid='uuid4', host='cached-host')]
+        self.mox.StubOutWithMock(db, 'aggregate_host_get_by_metadata_key')
+        db.aggregate_host_get_by_metadata_key(
+                mox.IgnoreArg(), key='availability_zone').AndReturn(
+                        {host: set([self.availability_zone])})
+        self.mox.ReplayAll()
+
+        self.assertEqual({'uuid1': self.availability_zone,
+                          'uuid2': self.availability_zone,
+                          'uuid3': self.default_az,
+                          'uuid4': 'cached-az'},
+                         az.get_instances_availability_zones(self.context,
+                                                             fake_insts))
+        # The zones looked up are cached.
+        self.assertEqual(self.availability_zone, az._get_cache().get(
+                az._make_cache_key(host)))
@@ -15,6 +15,11 @@
 #    under the License.
 """Unit Tests for network code."""
 
+import time
+
+from eventlet import greenthread
+import mock
+
 from nova.network import linux_net
 from nova import test
 
@@ -276,3 +281,147 @@ class IptablesManagerTestCase(test.NoDBTestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+    def test_remove_rules_flushed(self):
+        table = self.manager.ipv4['filter']
+        table.add_chain('top-chain', wrap=False)
+        table.add_rule('top-chain', '-j DROP', wrap=False)
+        table.add_rule('top-chain', '-j ACCEPT', wrap=False)
+        table.add_rule('FORWARD', '-j top-chain', wrap=False)
+        table.remove_chain('top-chain', wrap=False)
+        self.assertEqual(3, len(table.remove_rules))
+
+        current_lines = list(self.sample_filter)
+        current_lines[7:7] = [':top-chain - [0:0]']
+        current_lines[13:13] = ['[0:0] -A top-chain -j DROP',
+                                '[0:0] -A top-chain -j ACCEPT',
+                                '[0:0] -A FORWARD -j top-chain']
+        new_lines = self.manager._modify_rules(current_lines, table,
+                                               'filter')
+
+        for line in new_lines:
+            self.assertNotIn('top-chain', line)
+        self.assertEqual([], table.remove_rules)
+        self.assertEqual(set(), table.remove_chains)
+
+    def _test_apply(self):
+        self.flags(use_ipv6=True)
+        for table in self.manager.ipv4.itervalues():
+            table.dirty = False
+        for table in self.manager.ipv6.itervalues():
+            table.dirty = False
+        self.manager.ipv4['filter'].add_rule('FORWARD', '-j DROP')
+
+        calls = []
+
+        def fake_execute(*args, **kwargs):
+            calls.append((args[0], kwargs.get('process_input')))
+            return '\n'.join(self.sample_filter + self.sample_nat), ''
+
+        self.manager.execute = fake_execute
+        self.manager.apply()
+        return calls
+
+    def test_apply_all_tables(self):
+        calls = self._test_apply()
+        self.assertEqual(['iptables-save', 'iptables-restore',
+                          'ip6tables-save', 'ip6tables-restore'],
+                         [cmd for cmd, _input in calls])
+        self.assertIn('*nat', calls[1][1])
+
+    def test_apply_dirty_tables_only(self):
+        self.flags(iptables_apply_dirty_tables_only=True)
+        calls = self._test_apply()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         [cmd for cmd, _input in calls])
+        restore_input = calls[1][1]
+        self.assertIn('*filter', restore_input)
+        self.assertIn('-A %s-FORWARD -j DROP' % self.binary_name,
+                      restore_input)
+        self.assertNotIn('*nat', restore_input)
+        self.assertFalse(self.manager.dirty())
+
+    def test_schedule_apply_without_delay(self):
+        with mock.patch.object(self.manager, 'apply') as apply:
+            self.manager.schedule_apply()
+            apply.assert_called_once_with()
+        self.assertEqual(0, self.manager.queued_generation)
+
+    @mock.patch.object(greenthread, 'sleep')
+    @mock.patch.object(greenthread, 'spawn')
+    @mock.patch.object(time, 'time')
+    def test_schedule_apply_coalesces(self, mock_time, mock_spawn,
+                                      mock_sleep):
+        self.flags(iptables_apply_delay=1, iptables_apply_max_latency=2.5)
+        mock_time.return_value = 100
+        self.manager.schedule_apply()
+        mock_time.return_value = 101
+        self.manager.schedule_apply()
+        mock_time.return_value = 102
+        self.manager.schedule_apply()
+
+        # Only one applier, and the first call is delayed by at most the
+        # max latency
+        self.assertEqual(1, mock_spawn.call_count)
+        mock_spawn.assert_called_once_with(self.manager._delayed_apply)
+        self.assertEqual(102.5, self.manager._apply_at)
+        self.assertEqual({'queued': 3, 'applied': 0, 'applies': 0},
+                         self.manager.get_apply_stats())
+
+        def fake_sleep(seconds):
+            mock_time.return_value += seconds
+
+        mock_sleep.side_effect = fake_sleep
+        with mock.patch.object(self.manager, 'apply') as apply:
+            self.manager._delayed_apply()
+            apply.assert_called_once_with()
+        mock_sleep.assert_called_once_with(0.5)
+        self.assertEqual({'queued': 3, 'applied': 3, 'applies': 1},
+                         self.manager.get_apply_stats())
+
+        # Later calls schedule a new apply
+        self.manager.schedule_apply()
+        self.assertEqual(2, mock_spawn.call_count)
+        self.assertEqual(103.5, self.manager._apply_at)
+
+    @mock.patch.object(greenthread, 'spawn')
+    @mock.patch.object(time, 'time', return_value=100)
+    def test_delayed_apply_error(self, mock_time, mock_spawn):
+        self.flags(iptables_apply_delay=1)
+        self.manager.schedule_apply()
+        self.manager._apply_at = 0
+        for table in self.manager.ipv4.values():
+            table.dirty = False
+        with mock.patch.object(self.manager, 'apply',
+                               side_effect=test.TestingException):
+            self.manager._delayed_apply()
+        self.assertEqual({'queued': 1, 'applied': 0, 'applies': 0},
+                         self.manager.get_apply_stats())
+        # The failed generation is queued again, with all tables dirty
+        self.assertEqual(2, mock_spawn.call_count)
+        self.assertIsNotNone(self.manager._applier)
+        self.assertTrue(self.manager.dirty())
+        self.assertEqual(102, self.manager._apply_at)
+
+        # The retries back off, up to a maximum delay
+        with mock.patch.object(self.manager, 'apply',
+                               side_effect=test.TestingException):
+            with mock.patch.object(linux_net.LOG,
+                                   'exception') as log_exception:
+                self.manager._apply_at = 0
+                self.manager._delayed_apply()
+                self.assertEqual(104, self.manager._apply_at)
+                for i in range(10):
+                    self.manager._apply_at = 0
+                    self.manager._delayed_apply()
+                self.assertEqual(100 + linux_net._MAX_APPLY_RETRY_DELAY,
+                                 self.manager._apply_at)
+                # The traceback is only logged for the first failure
+                self.assertFalse(log_exception.called)
+
+        with mock.patch.object(self.manager, 'apply'):
+            self.manager._apply_at = 0
+            self.manager._delayed_apply()
+        self.assertEqual(0, self.manager._apply_failures)
+        self.assertEqual({'queued': 1, 'applied': 1, 'applies': 1},
+                         self.manager.get_apply_stats())
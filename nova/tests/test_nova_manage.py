@@ -14,6 +14,7 @@
 #    under the License.
 
 import fixtures
+import mock
 import StringIO
 import sys
 
@@ -22,6 +23,7 @@ from nova import context
 from nova import db
 from nova import exception
 from nova.openstack.common.gettextutils import _
+from nova.scheduler import rpcapi as scheduler_rpcapi
 from nova import test
 from nova.tests.db import fakes as db_fakes
 from nova.tests.objects import test_network
@@ -404,3 +406,38 @@ class ServiceCommandsTestCase(test.TestCase):
 
     def test_service_disable_invalid_params(self):
         self.assertEqual(2, self.commands.disable('nohost', 'noservice'))
+
+
+class SchedulerCommandsTestCase(test.TestCase):
+    def setUp(self):
+        super(SchedulerCommandsTestCase, self).setUp()
+        self.commands = manage.SchedulerCommands()
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout',
+                                             StringIO.StringIO()))
+
+    def test_stats(self):
+        stats = {'filter': {'RamFilter': {'count': 2,
+                                          'total_time': 0.004,
+                                          'max_time': 0.003,
+                                          'objs_in': 20,
+                                          'objs_out': 10,
+                                          'db_queries': 0,
+                                          'histogram': [0, 0, 1, 1, 0, 0,
+                                                        0, 0, 0, 0, 0]}}}
+        with mock.patch.object(scheduler_rpcapi.SchedulerAPI,
+                               'get_profiling_stats',
+                               return_value=stats) as get_profiling_stats:
+            self.commands.stats(reset=True)
+            get_profiling_stats.assert_called_once_with(mock.ANY,
+                                                        reset=True)
+        result = sys.stdout.getvalue().splitlines()
+        self.assertEqual(2, len(result))
+        self.assertEqual(['filter', 'RamFilter', '2', '2.00', '1.00', '5.00',
+                          '3.00', '10.0', '5.0', '0.0'], result[1].split())
+
+    def test_stats_empty(self):
+        with mock.patch.object(scheduler_rpcapi.SchedulerAPI,
+                               'get_profiling_stats', return_value={}):
+            self.commands.stats()
+        self.assertEqual(_('No statistics recorded.') + '\n',
+                         sys.stdout.getvalue())
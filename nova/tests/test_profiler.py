@@ -0,0 +1,101 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the filter and weigher profiler.
+"""
+
+from nova import profiler
+from nova.scheduler import filters
+from nova.scheduler import weights
+from nova import test
+
+
+class EvenFilter(filters.BaseHostFilter):
+    def _filter_one(self, obj, filter_properties):
+        # Pretend the filter needs a database query per object
+        profiler._count_query(None, None, None, None, None, False)
+        return obj % 2 == 0
+
+
+class StopFilter(filters.BaseHostFilter):
+    def filter_all(self, filter_obj_list, filter_properties):
+        return None
+
+
+class IdentityWeigher(weights.BaseHostWeigher):
+    def _weigh_object(self, obj, weight_properties):
+        return obj
+
+
+class ProfilerTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ProfilerTestCase, self).setUp()
+        profiler._stats.clear()
+        self.addCleanup(profiler._stats.clear)
+        self.flags(filter_profiling_sample_rate=1.0,
+                   scheduler_use_vectorized_filters=False)
+        self.filter_handler = filters.HostFilterHandler()
+        self.weight_handler = weights.HostWeightHandler()
+
+    def test_sample_disabled(self):
+        self.flags(filter_profiling_sample_rate=0.0)
+        self.assertIsNone(profiler.sample('filter'))
+        self.filter_handler.get_filtered_objects([EvenFilter], range(4), {})
+        self.assertEqual({}, profiler.get_stats())
+
+    def test_filter_stats(self):
+        result = self.filter_handler.get_filtered_objects(
+                [EvenFilter, EvenFilter], range(10), {})
+        self.assertEqual([0, 2, 4, 6, 8], result)
+
+        stats = profiler.get_stats()['filter']['EvenFilter']
+        self.assertEqual(2, stats['count'])
+        self.assertEqual(15, stats['objs_in'])
+        self.assertEqual(10, stats['objs_out'])
+        self.assertEqual(15, stats['db_queries'])
+        self.assertEqual(2, sum(stats['histogram']))
+
+    def test_filter_stops_filtering(self):
+        self.assertIsNone(self.filter_handler.get_filtered_objects(
+                [StopFilter], range(3), {}))
+        stats = profiler.get_stats()['filter']['StopFilter']
+        self.assertEqual(1, stats['count'])
+        self.assertEqual(3, stats['objs_in'])
+        self.assertEqual(0, stats['objs_out'])
+
+    def test_weigher_stats(self):
+        result = self.weight_handler.get_weighed_objects([IdentityWeigher],
+                                                         range(3), {})
+        self.assertEqual([2, 1, 0], [w.obj for w in result])
+        stats = profiler.get_stats()['weigher']['IdentityWeigher']
+        self.assertEqual(1, stats['count'])
+        self.assertEqual(3, stats['objs_in'])
+        self.assertEqual(3, stats['objs_out'])
+        self.assertEqual(0, stats['db_queries'])
+
+    def test_get_stats_reset(self):
+        self.filter_handler.get_filtered_objects([EvenFilter], range(4), {})
+        self.assertIn('filter', profiler.get_stats(reset=True))
+        self.assertEqual({}, profiler.get_stats())
+
+    def test_histogram(self):
+        stats = profiler.Stats()
+        for elapsed in (0.00005, 0.0003, 0.0003, 0.002, 60):
+            stats.add(elapsed, 1, 1, 0)
+        self.assertEqual([1, 2, 0, 1, 0, 0, 0, 0, 0, 0, 1], stats.histogram)
+        self.assertEqual(60, stats.max_time)
+        self.assertEqual(0.5, profiler.percentile(stats.histogram, 50))
+        self.assertEqual(5, profiler.percentile(stats.histogram, 80))
+        self.assertIsNone(profiler.percentile(stats.histogram, 99))
@@ -157,6 +157,27 @@ class RawTestCase(_ImageTestCase, test.NoDBTestCase):
 
         self.mox.VerifyAll()
 
+    def test_cache_stores_checksum(self):
+        self.flags(checksum_base_images=True, group='libvirt')
+        self.mox.StubOutWithMock(os.path, 'exists')
+        if self.OLD_STYLE_INSTANCE_PATH:
+            os.path.exists(self.OLD_STYLE_INSTANCE_PATH).AndReturn(False)
+        os.path.exists(self.TEMPLATE_DIR).AndReturn(True)
+        os.path.exists(self.PATH).AndReturn(False)
+        fn = self.mox.CreateMockAnything()
+        fn(target=self.TEMPLATE_PATH).AndReturn('fake-sha1')
+        self.mox.StubOutWithMock(imagebackend.imagecache, 'write_stored_info')
+        imagebackend.imagecache.write_stored_info(self.TEMPLATE_PATH,
+                                                  field='sha1',
+                                                  value='fake-sha1')
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        self.mock_create_image(image)
+        image.cache(fn, self.TEMPLATE)
+
+        self.mox.VerifyAll()
+
     def test_cache_image_exists(self):
         self.mox.StubOutWithMock(os.path, 'exists')
         if self.OLD_STYLE_INSTANCE_PATH:
@@ -929,3 +950,29 @@ class BackendTestCase(test.NoDBTestCase):
 
     def test_image_default(self):
         self._test_image('default', imagebackend.Raw, imagebackend.Qcow2)
+
+
+class CacheBaseImageTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(CacheBaseImageTestCase, self).setUp()
+        self.INSTANCES_PATH = self.useFixture(fixtures.TempDir()).path
+        self.flags(disable_process_locking=True,
+                   instances_path=self.INSTANCES_PATH)
+        self.TEMPLATE_PATH = os.path.join(self.INSTANCES_PATH, '_base',
+                                          'template')
+
+    def test_cache_base_image(self):
+        fetched = []
+
+        def fake_fetch(target, image_id):
+            fetched.append(image_id)
+            with open(target, 'w') as f:
+                f.write('fake image')
+
+        for i in range(2):
+            base = imagebackend.cache_base_image(fake_fetch, 'template',
+                                                 image_id='fake-image')
+            self.assertEqual(self.TEMPLATE_PATH, base)
+        self.assertEqual(['fake-image'], fetched)
+        self.assertTrue(imagebackend.imagecache.read_stored_info(
+            base, field='precached'))
@@ -489,6 +489,39 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             self.assertEqual(image_cache_manager.removable_base_files, [])
             self.assertEqual(image_cache_manager.corrupt_base_files, [])
 
+    def test_handle_base_image_precached(self):
+        self.stubs.Set(virtutils, 'chown', lambda x, y: None)
+        img = '123'
+
+        with self._make_base_file() as fname:
+            os.utime(fname, (-1, time.time() - 3601))
+            imagecache.write_stored_info(fname, field='precached', value=True)
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.unexplained_images = [fname]
+            image_cache_manager._handle_base_image(img, fname)
+
+            self.assertEqual(image_cache_manager.active_base_files, [fname])
+            self.assertEqual(image_cache_manager.removable_base_files, [])
+
+    def test_handle_base_image_precached_expired(self):
+        img = '123'
+        self.flags(precached_image_ttl=60, group='libvirt')
+
+        with self._make_base_file() as fname:
+            os.utime(fname, (-1, time.time() - 3601))
+            imagecache.write_stored_info(fname, field='precached', value=True)
+            now = time.time()
+            self.stubs.Set(time, 'time', lambda: now + 61)
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.unexplained_images = [fname]
+            image_cache_manager._handle_base_image(img, fname)
+
+            self.assertEqual(image_cache_manager.active_base_files, [])
+            self.assertEqual(image_cache_manager.removable_base_files,
+                             [fname])
+
     def test_handle_base_image_checksum_fails(self):
         self.flags(checksum_base_images=True, group='libvirt')
         self.stubs.Set(virtutils, 'chown', lambda x, y: None)
@@ -640,6 +673,8 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
         # Fake out verifying checksums, as that is tested elsewhere
         self.stubs.Set(image_cache_manager, '_verify_checksum',
                        lambda x, y: True)
+        self.stubs.Set(image_cache_manager, '_is_precached',
+                       lambda x: False)
 
         # Fake getmtime as well
         orig_getmtime = os.path.getmtime
@@ -0,0 +1,117 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import struct
+
+import fixtures
+
+from nova import test
+from nova.virt import imageinfo
+from nova.virt import images
+
+
+def _qcow2_header(version=2, size=1 << 30, cluster_bits=16,
+                  backing_file=None, crypt_method=0, nb_snapshots=0,
+                  incompatible_features=0):
+    header_length = 72 if version == 2 else 104
+    if backing_file:
+        backing_file_offset = header_length
+        backing_file_size = len(backing_file)
+    else:
+        backing_file_offset = backing_file_size = 0
+    header = struct.pack('>4sIQIIQIIQQIIQ', 'QFI\xfb', version,
+                         backing_file_offset, backing_file_size,
+                         cluster_bits, size, crypt_method, 0, 0, 0, 0,
+                         nb_snapshots, 0)
+    if version == 3:
+        header += struct.pack('>QQQII', incompatible_features, 0, 0, 4,
+                              header_length)
+    return header + (backing_file or '')
+
+
+class ImageInfoTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ImageInfoTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        imageinfo.reset_cache()
+        self.addCleanup(imageinfo.reset_cache)
+
+    def _write(self, data, name='disk'):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_qcow2(self):
+        path = self._write(_qcow2_header(backing_file='/base/abcd'))
+        info = imageinfo.get_info(path)
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual(1 << 30, info.virtual_size)
+        self.assertEqual(65536, info.cluster_size)
+        self.assertEqual('/base/abcd', info.backing_file)
+        self.assertEqual(path, info.image)
+
+    def test_qcow2_v3_relative_backing_file(self):
+        path = self._write(_qcow2_header(version=3, backing_file='base',
+                                         incompatible_features=1))
+        info = imageinfo.get_info(path)
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual(os.path.join(self.tmpdir, 'base'),
+                         info.backing_file)
+
+    def test_qcow2_unsupported(self):
+        for header in (_qcow2_header(version=1),
+                       _qcow2_header(crypt_method=1),
+                       _qcow2_header(nb_snapshots=1),
+                       _qcow2_header(version=3, incompatible_features=2),
+                       _qcow2_header()[:40]):
+            path = self._write(header)
+            imageinfo.reset_cache()
+            self.assertIsNone(imageinfo.get_info(path))
+
+    def test_raw(self):
+        path = self._write('\0' * 4096)
+        info = imageinfo.get_info(path)
+        self.assertEqual('raw', info.file_format)
+        self.assertEqual(4096, info.virtual_size)
+        self.assertIsNone(info.backing_file)
+
+    def test_other_formats(self):
+        for data in ('KDMV' + '\0' * 1020,
+                     '\0' * 64 + '\x7f\x10\xda\xbe' + '\0' * 956,
+                     '\0' * 512 + 'conectix' + '\0' * 504):
+            path = self._write(data)
+            imageinfo.reset_cache()
+            self.assertIsNone(imageinfo.get_info(path))
+
+    def test_not_a_file(self):
+        self.assertIsNone(imageinfo.get_info(self.tmpdir))
+        self.assertIsNone(imageinfo.get_info('/path/that/does/not/exist'))
+
+    def test_cache(self):
+        path = self._write('\0' * 1024)
+        info = imageinfo.get_info(path)
+        self.assertIs(info, imageinfo.get_info(path))
+
+        self._write(_qcow2_header())
+        self.assertEqual('qcow2', imageinfo.get_info(path).file_format)
+
+    def test_disk_info_falls_back_to_qemu_img(self):
+        path = self._write('KDMV' + '\0' * 1020)
+        self.mox.StubOutWithMock(images, 'qemu_img_info')
+        images.qemu_img_info(path).AndReturn('fake info')
+        self.mox.ReplayAll()
+        self.assertEqual('fake info', images.disk_info(path))
@@ -12,7 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import os
+import struct
 
+import fixtures
+
+from nova import exception
+from nova.image import glance
 from nova import test
 from nova.virt import images
 
@@ -22,3 +29,86 @@ class QemuTestCase(test.NoDBTestCase):
         image_info = images.qemu_img_info("/path/that/does/not/exist")
         self.assertTrue(image_info)
         self.assertTrue(str(image_info))
+
+
+class FetchTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(FetchTestCase, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'image.part')
+        self.image_service = self.mox.CreateMockAnything()
+        self.stubs.Set(glance, 'get_remote_image_service',
+                       lambda context, image_href: (self.image_service,
+                                                    image_href))
+        self.chunks_read = 0
+
+    def _chunks(self, chunks):
+        for chunk in chunks:
+            self.chunks_read += 1
+            yield chunk
+
+    def _expect_download(self, chunks, checksum=None):
+        self.image_service.show('ctxt', 'fake-image').AndReturn(
+            {'checksum': checksum or hashlib.md5(''.join(chunks)).hexdigest()})
+        self.image_service.download('ctxt', 'fake-image').AndReturn(
+            self._chunks(chunks))
+        self.mox.ReplayAll()
+
+    def test_fetch(self):
+        chunks = ['\0' * 1024, 'abc']
+        self._expect_download(chunks)
+        checksum = images.fetch('ctxt', 'fake-image', self.path, 'user',
+                                'project')
+        self.assertEqual(hashlib.sha1(''.join(chunks)).hexdigest(), checksum)
+        with open(self.path) as f:
+            self.assertEqual(''.join(chunks), f.read())
+
+    def test_fetch_checksum_mismatch(self):
+        self._expect_download(['\0' * 1024], checksum='bad')
+        self.assertRaises(exception.ImageUnacceptable, images.fetch,
+                          'ctxt', 'fake-image', self.path, 'user', 'project')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_fetch_qcow2_too_large(self):
+        header = struct.pack('>4sIQIIQ', 'QFI\xfb', 2, 0, 0, 16, 4096)
+        chunks = [header + '\0' * 512, '\0' * 512]
+        self._expect_download(chunks)
+        self.assertRaises(exception.FlavorDiskTooSmall, images.fetch,
+                          'ctxt', 'fake-image', self.path, 'user', 'project',
+                          max_size=1024)
+        self.assertEqual(1, self.chunks_read)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_fetch_raw_too_large(self):
+        chunks = ['\0' * 1024] * 4
+        self._expect_download(chunks)
+        self.assertRaises(exception.FlavorDiskTooSmall, images.fetch,
+                          'ctxt', 'fake-image', self.path, 'user', 'project',
+                          max_size=1024)
+        self.assertEqual(2, self.chunks_read)
+
+    def test_fetch_direct_url(self):
+        self.flags(allowed_direct_url_schemes=['file'])
+        self.image_service.download('ctxt', 'fake-image',
+                                    dst_path=self.path)
+        self.mox.ReplayAll()
+        self.assertIsNone(images.fetch('ctxt', 'fake-image', self.path,
+                                       'user', 'project'))
+
+    def test_fetch_ranges(self):
+        self.flags(glance_download_concurrency=2)
+        data = '\0' * 1024
+
+        def fake_download(context, image_id, dst_path):
+            with open(dst_path, 'wb') as f:
+                f.write(data)
+
+        self.image_service.show('ctxt', 'fake-image').AndReturn(
+            {'checksum': hashlib.md5(data).hexdigest()})
+        self.image_service.download('ctxt', 'fake-image',
+                                    dst_path=self.path).WithSideEffects(
+                                        fake_download)
+        self.mox.ReplayAll()
+        checksum = images.fetch('ctxt', 'fake-image', self.path, 'user',
+                                'project')
+        self.assertEqual(hashlib.sha1(data).hexdigest(), checksum)
@@ -2138,6 +2138,28 @@ class CreateVmRecordTestCase(VMUtilsTestBase):
 
         self.assertIn(vm_ref, result_keys)
 
+    def test_list_nova_vms(self):
+        self.flags(disable_process_locking=True,
+                   instance_name_template='%d',
+                   firewall_driver='nova.virt.xenapi.firewall.'
+                                   'Dom0IptablesFirewallDriver')
+        self.flags(connection_url='test_url',
+                   connection_password='test_pass',
+                   group='xenserver')
+
+        halted_ref = fake.create_vm("foo1", "Halted",
+                                    other_config={'nova_uuid': 'uuid1'})
+        running_ref = fake.create_vm("foo2", "Running",
+                                     other_config={'nova_uuid': 'uuid2'})
+        fake.create_vm("foo3", "Running", other_config={})
+
+        stubs.stubout_session(self.stubs, fake.SessionBase)
+        driver = xenapi_conn.XenAPIDriver(False)
+
+        result = dict(vm_utils.list_nova_vms(driver._session))
+
+        self.assertEqual(set([halted_ref, running_ref]), set(result))
+
 
 class ResizeFunctionTestCase(test.NoDBTestCase):
     def _call_get_resize_func_name(self, brand, version):
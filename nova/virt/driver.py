@@ -228,6 +228,16 @@ class ComputeDriver(object):
         """
         raise NotImplementedError()
 
+    def get_power_states(self):
+        """Return the power states of all the instances known to the
+        virtualization layer, as a dict of power_state codes by instance
+        uuid.
+
+        This allows the compute manager to sync the power states of all the
+        instances without querying the hypervisor once per instance.
+        """
+        raise NotImplementedError()
+
     def rebuild(self, context, instance, image_meta, injected_files,
                 admin_password, bdms, detach_block_devices,
                 attach_block_devices, network_info=None,
@@ -1105,6 +1115,19 @@ class ComputeDriver(object):
         """
         pass
 
+    def cache_image(self, context, image_id):
+        """Fetch an image into the driver's local image cache.
+
+        Used to warm the cache ahead of the boot of many instances from the
+        same image.  The image is fetched the way spawn would fetch it,
+        and kept by the image cache management for a while even though no
+        instance uses it yet.
+
+        :param context: security context
+        :param image_id: id of the image in the image service
+        """
+        raise NotImplementedError()
+
     def add_to_aggregate(self, context, aggregate, host, **kwargs):
         """Add a compute host to an aggregate."""
         #NOTE(jogo) Currently only used for XenAPI-Pool
@@ -433,15 +433,15 @@ class IptablesFirewallDriver(FirewallDriver):
 
     def refresh_security_group_members(self, security_group):
         self.do_refresh_security_group_rules(security_group)
-        self.iptables.apply()
+        self.iptables.schedule_apply()
 
     def refresh_security_group_rules(self, security_group):
         self.do_refresh_security_group_rules(security_group)
-        self.iptables.apply()
+        self.iptables.schedule_apply()
 
     def refresh_instance_security_rules(self, instance):
         self.do_refresh_instance_rules(instance)
-        self.iptables.apply()
+        self.iptables.schedule_apply()
 
     @utils.synchronized('iptables', external=True)
     def _inner_do_refresh_rules(self, instance, ipv4_rules,
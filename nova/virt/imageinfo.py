@@ -0,0 +1,216 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Reading of qcow2 and raw disk image headers without qemu-img.
+
+Running qemu-img info forks a process per image, which adds up on hosts with
+many instances, e.g. when the image cache manager looks for the backing file
+of every instance disk.  get_info() reads the formats nova creates itself,
+qcow2 and raw, from their headers, and caches the results until the file
+changes.  It returns None for anything it does not fully understand, in which
+case the caller falls back to qemu-img.
+"""
+
+import os
+import stat
+import struct
+
+from nova.openstack.common import imageutils
+
+QCOW2_MAGIC = 'QFI\xfb'
+
+# magic, version, backing_file_offset, backing_file_size, cluster_bits, size,
+# crypt_method, l1_size, l1_table_offset, refcount_table_offset,
+# refcount_table_clusters, nb_snapshots, snapshots_offset
+_QCOW2_HEADER = struct.Struct('>4sIQIIQIIQQIIQ')
+# Version 3 additions: incompatible_features, compatible_features,
+# autoclear_features, refcount_order, header_length
+_QCOW2_V3_HEADER = struct.Struct('>QQQII')
+
+# The only incompatible feature which does not change how the image is read:
+# the refcounts of the image may be out of date.
+_QCOW2_DIRTY = 1
+
+# The spec limits the backing file name to 1023 bytes.
+_QCOW2_MAX_BACKING_FILE = 1023
+
+# Signatures of the formats known to qemu other than qcow, as (offset,
+# bytes).  A file matching none of them is raw.
+_HEAD_SIGNATURES = (
+    (0, 'QED\x00'),
+    (0, 'KDMV'),                     # vmdk
+    (0, 'COWD'),                     # vmdk3
+    (0, '# Disk DescriptorFile'),    # vmdk descriptor
+    (0, 'conectix'),                 # vpc
+    (0, 'vhdxfile'),
+    (0, 'Bochs Virtual HD Image'),
+    (0, 'WithoutFreeSpace'),         # parallels
+    (0, 'WithouFreSpacExt'),         # parallels
+    (0, 'LUKS\xba\xbe'),
+    (0, '#!/bin/sh\n#V2.0 Format'),  # cloop
+    (64, '\x7f\x10\xda\xbe'),        # vdi
+    )
+_TAIL_SIGNATURES = ('conectix', 'koly')    # fixed vpc, dmg
+
+# Number of bytes sniff() needs to recognize an image.
+HEAD_LENGTH = 512
+TAIL_LENGTH = 512
+
+# Entries are dropped all at once past this number, which only costs
+# reading the headers again.
+_CACHE_SIZE = 1024
+
+_cache = {}
+
+
+def reset_cache():
+    _cache.clear()
+
+
+def _make_info(path, st, file_format, virtual_size, cluster_size=None,
+               backing_file=None):
+    info = imageutils.QemuImgInfo()
+    info.image = path
+    info.file_format = file_format
+    info.virtual_size = virtual_size
+    info.cluster_size = cluster_size
+    info.disk_size = st.st_blocks * 512
+    info.backing_file = backing_file
+    return info
+
+
+def _parse_qcow2(head):
+    """Return (size, cluster_bits, backing_file_offset, backing_file_size)
+    from a qcow2 header, or None if the image is not fully supported.
+    """
+    if len(head) < _QCOW2_HEADER.size:
+        return None
+    (_magic, version, backing_file_offset, backing_file_size, cluster_bits,
+     size, crypt_method, _l1_size, _l1_table_offset, _refcount_table_offset,
+     _refcount_table_clusters, nb_snapshots,
+     _snapshots_offset) = _QCOW2_HEADER.unpack_from(head)
+    if version not in (2, 3):
+        return None
+    if version == 3:
+        if len(head) < _QCOW2_HEADER.size + _QCOW2_V3_HEADER.size:
+            return None
+        incompatible_features = _QCOW2_V3_HEADER.unpack_from(
+            head, _QCOW2_HEADER.size)[0]
+        if incompatible_features & ~_QCOW2_DIRTY:
+            return None
+    # NOTE: qemu-img also reports encryption and snapshots, leave those
+    # images to it rather than reading the rest of the metadata here.
+    if crypt_method or nb_snapshots:
+        return None
+    if backing_file_size > _QCOW2_MAX_BACKING_FILE:
+        return None
+    return size, cluster_bits, backing_file_offset, backing_file_size
+
+
+def _is_raw(head):
+    for offset, signature in _HEAD_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return False
+    # vmdk descriptor with a different header comment
+    return 'createType' not in head
+
+
+def _read_qcow2(f, path, st, head):
+    header = _parse_qcow2(head)
+    if header is None:
+        return None
+    size, cluster_bits, backing_file_offset, backing_file_size = header
+
+    backing_file = None
+    if backing_file_offset:
+        f.seek(backing_file_offset)
+        backing_file = f.read(backing_file_size)
+        if len(backing_file) != backing_file_size:
+            return None
+        # Like qemu-img, report the path of relative backing files.
+        backing_file = os.path.join(os.path.dirname(path), backing_file)
+
+    return _make_info(path, st, 'qcow2', size,
+                      cluster_size=1 << cluster_bits,
+                      backing_file=backing_file)
+
+
+def _read_raw(f, path, st, head):
+    if not _is_raw(head):
+        return None
+    if st.st_size >= TAIL_LENGTH:
+        f.seek(st.st_size - TAIL_LENGTH)
+        tail = f.read(TAIL_LENGTH)
+        for signature in _TAIL_SIGNATURES:
+            if tail.startswith(signature):
+                return None
+    return _make_info(path, st, 'raw', st.st_size)
+
+
+def _read_info(path, st):
+    with open(path, 'rb') as f:
+        head = f.read(HEAD_LENGTH)
+        if head.startswith(QCOW2_MAGIC):
+            return _read_qcow2(f, path, st, head)
+        return _read_raw(f, path, st, head)
+
+
+def sniff(head):
+    """Guess the format of an image from its first HEAD_LENGTH bytes.
+
+    Returns ('qcow2', virtual size) for the qcow2 images get_info()
+    supports, ('raw', None) when head has none of the signatures known to
+    qemu, and (None, None) otherwise.  As the signatures at the end of the
+    file are not checked, a raw result is only a hint.
+    """
+    if head.startswith(QCOW2_MAGIC):
+        header = _parse_qcow2(head)
+        if header is None:
+            return None, None
+        return 'qcow2', header[0]
+    if _is_raw(head):
+        return 'raw', None
+    return None, None
+
+
+def get_info(path):
+    """Return a QemuImgInfo read from the header of a qcow2 or raw image.
+
+    Returns None when the file does not exist, is not a regular file, or is
+    not an image this module can fully describe.  The result is cached until
+    the inode, size or modification time of the file change.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+
+    key = (st.st_ino, st.st_size, st.st_mtime)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    try:
+        info = _read_info(path, st)
+    except (IOError, OSError, struct.error):
+        return None
+
+    if len(_cache) >= _CACHE_SIZE:
+        _cache.clear()
+    _cache[path] = (key, info)
+    return info
@@ -19,6 +19,7 @@
 Handling of VM disk images.
 """
 
+import hashlib
 import os
 
 from oslo.config import cfg
@@ -30,6 +31,7 @@ from nova.openstack.common.gettextutils import _
 from nova.openstack.common import imageutils
 from nova.openstack.common import log as logging
 from nova import utils
+from nova.virt import imageinfo
 
 LOG = logging.getLogger(__name__)
 
@@ -41,6 +43,8 @@ image_opts = [
 
 CONF = cfg.CONF
 CONF.register_opts(image_opts)
+CONF.import_opt('allowed_direct_url_schemes', 'nova.image.glance')
+CONF.import_opt('glance_download_concurrency', 'nova.image.glance')
 
 
 def qemu_img_info(path):
@@ -55,13 +59,96 @@ def qemu_img_info(path):
     return imageutils.QemuImgInfo(out)
 
 
+def disk_info(path):
+    """Return information about a local disk image, like qemu_img_info.
+
+    qcow2 and raw images are read directly from their headers, without
+    running qemu-img.  This is meant for the images written by nova, the
+    images downloaded from glance are checked by qemu-img.
+    """
+    return imageinfo.get_info(path) or qemu_img_info(path)
+
+
 def convert_image(source, dest, out_format, run_as_root=False):
     """Convert image to other format."""
     cmd = ('qemu-img', 'convert', '-O', out_format, source, dest)
     utils.execute(*cmd, run_as_root=run_as_root)
 
 
+def _check_disk_size(path, disk_size, max_size):
+    # We can't generally shrink incoming images, so disallow
+    # images > size of the flavor we're booting.  Checking here avoids
+    # an immediate DoS where we convert large qcow images to raw
+    # (which may compress well but not be sparse).
+    # TODO(p-draigbrady): loop through all flavor sizes, so that
+    # we might continue here and not discard the download.
+    # If we did that we'd have to do the higher level size checks
+    # irrespective of whether the base image was prepared or not.
+    if max_size and max_size < disk_size:
+        msg = _('%(base)s virtual size %(disk_size)s '
+                'larger than flavor root disk size %(size)s')
+        LOG.error(msg % {'base': path,
+                         'disk_size': disk_size,
+                         'size': max_size})
+        raise exception.FlavorDiskTooSmall()
+
+
+def _check_image(image_href, image_chunks, path, max_size=0,
+                 checksum=None, dst=None):
+    """Check the data of an image, writing it to dst if given.
+
+    The format and virtual size of the image are guessed from its first
+    bytes, so that images too large for max_size are rejected as soon as
+    possible.  The md5 of the data is compared with checksum, if any.
+
+    Returns the sha1 of the data.
+    """
+    md5 = hashlib.md5()
+    sha1 = hashlib.sha1()
+    head = ''
+    is_raw = False
+    read = 0
+    for chunk in image_chunks:
+        if dst is not None:
+            dst.write(chunk)
+        md5.update(chunk)
+        sha1.update(chunk)
+        read += len(chunk)
+
+        if head is not None:
+            head += chunk
+            if len(head) >= imageinfo.HEAD_LENGTH:
+                fmt, virtual_size = imageinfo.sniff(head)
+                if virtual_size is not None:
+                    _check_disk_size(path, virtual_size, max_size)
+                is_raw = fmt == 'raw'
+                head = None
+
+        # NOTE: the virtual size of a raw looking image is the size of its
+        # data, less the footer of a fixed size vpc image.
+        if is_raw and max_size:
+            _check_disk_size(path, read - imageinfo.TAIL_LENGTH, max_size)
+
+    if checksum and md5.hexdigest() != checksum:
+        raise exception.ImageUnacceptable(image_id=image_href,
+            reason=(_("checksum %(actual)s does not match the expected "
+                      "checksum %(expected)s") %
+                    {'actual': md5.hexdigest(), 'expected': checksum}))
+    return sha1.hexdigest()
+
+
+def _read_chunks(path, chunk_size=65536):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            yield chunk
+
+
 def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
+    """Download an image to path.
+
+    Returns the sha1 of the image, or None if it was transferred by a
+    direct URL download handler.
+    """
     # TODO(vish): Improve context handling and add owner and auth data
     #             when it is added to glance.  Right now there is no
     #             auth checking in glance, so we assume that access was
@@ -69,13 +156,35 @@ def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
     (image_service, image_id) = glance.get_remote_image_service(context,
                                                                 image_href)
     with fileutils.remove_path_on_error(path):
-        image_service.download(context, image_id, dst_path=path)
+        if CONF.allowed_direct_url_schemes:
+            image_service.download(context, image_id, dst_path=path)
+            return None
+
+        image_meta = image_service.show(context, image_id)
+        if CONF.glance_download_concurrency > 1:
+            # The ranges are downloaded out of order, the image is checked
+            # once it is complete.
+            image_service.download(context, image_id, dst_path=path)
+            return _check_image(image_href, _read_chunks(path), path,
+                                max_size=max_size,
+                                checksum=image_meta.get('checksum'))
+
+        image_chunks = image_service.download(context, image_id)
+        with open(path, 'wb') as f:
+            return _check_image(image_href, image_chunks, path,
+                                max_size=max_size,
+                                checksum=image_meta.get('checksum'),
+                                dst=f)
 
 
 def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
+    """Download an image to path, converting it to raw if needed.
+
+    Returns the sha1 of the file written to path, or None if unknown.
+    """
     path_tmp = "%s.part" % path
-    fetch(context, image_href, path_tmp, user_id, project_id,
-          max_size=max_size)
+    checksum = fetch(context, image_href, path_tmp, user_id, project_id,
+                     max_size=max_size)
 
     with fileutils.remove_path_on_error(path_tmp):
         data = qemu_img_info(path_tmp)
@@ -92,22 +201,7 @@ def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
                 reason=(_("fmt=%(fmt)s backed by: %(backing_file)s") %
                         {'fmt': fmt, 'backing_file': backing_file}))
 
-        # We can't generally shrink incoming images, so disallow
-        # images > size of the flavor we're booting.  Checking here avoids
-        # an immediate DoS where we convert large qcow images to raw
-        # (which may compress well but not be sparse).
-        # TODO(p-draigbrady): loop through all flavor sizes, so that
-        # we might continue here and not discard the download.
-        # If we did that we'd have to do the higher level size checks
-        # irrespective of whether the base image was prepared or not.
-        disk_size = data.virtual_size
-        if max_size and max_size < disk_size:
-            msg = _('%(base)s virtual size %(disk_size)s '
-                    'larger than flavor root disk size %(size)s')
-            LOG.error(msg % {'base': path,
-                             'disk_size': disk_size,
-                             'size': max_size})
-            raise exception.FlavorDiskTooSmall()
+        _check_disk_size(path, data.virtual_size, max_size)
 
         if fmt != "raw" and CONF.force_raw_images:
             staged = "%s.converted" % path
@@ -123,5 +217,7 @@ def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
                         data.file_format)
 
                 os.rename(staged, path)
+                return None
         else:
             os.rename(path_tmp, path)
+            return checksum
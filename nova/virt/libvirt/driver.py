@@ -847,6 +847,27 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return list(uuids)
 
+    def get_power_states(self):
+        """Efficient override of base get_power_states method."""
+        try:
+            domains = self._conn.listAllDomains(0)
+        except AttributeError:
+            # listAllDomains() needs libvirt 0.9.13 or later
+            raise NotImplementedError()
+
+        power_states = {}
+        for domain in domains:
+            try:
+                # We skip domains with ID 0 (hypervisors).
+                if domain.ID() == 0:
+                    continue
+                state = domain.info()[0]
+                power_states[domain.UUIDString()] = LIBVIRT_POWER_STATE[state]
+            except libvirt.libvirtError:
+                # Ignore deleted instance while listing
+                continue
+        return power_states
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for vif in network_info:
@@ -4819,6 +4840,15 @@ class LibvirtDriver(driver.ComputeDriver):
         """Manage the local cache of images."""
         self.image_cache_manager.update(context, all_instances)
 
+    def cache_image(self, context, image_id):
+        """Fetch an image into the local cache of images."""
+        fname = imagecache.get_cache_fname({'image_id': image_id}, 'image_id')
+        imagebackend.cache_base_image(libvirt_utils.fetch_image, fname,
+                                      context=context,
+                                      image_id=image_id,
+                                      user_id=context.user_id,
+                                      project_id=context.project_id)
+
     def _cleanup_remote_migration(self, dest, inst_base, inst_base_resize,
                                   shared_storage=False):
         """Used only for cleanup in case migrate_disk_and_power_off fails."""
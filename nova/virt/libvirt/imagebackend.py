@@ -32,6 +32,7 @@ from nova import utils
 from nova.virt.disk import api as disk
 from nova.virt import images
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import utils as libvirt_utils
 
 
@@ -85,10 +86,58 @@ CONF = cfg.CONF
 CONF.register_opts(__imagebackend_opts, 'libvirt')
 CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
 CONF.import_opt('preallocate_images', 'nova.virt.driver')
+CONF.import_opt('checksum_base_images', 'nova.virt.libvirt.imagecache',
+                group='libvirt')
 
 LOG = logging.getLogger(__name__)
 
 
+def _get_base_path(filename):
+    base_dir = os.path.join(CONF.instances_path,
+                            CONF.image_cache_subdirectory_name)
+    if not os.path.exists(base_dir):
+        fileutils.ensure_tree(base_dir)
+    return os.path.join(base_dir, filename)
+
+
+def _synchronized_fetch(fetch_func, filename, lock_path):
+    @utils.synchronized(filename, external=True, lock_path=lock_path)
+    def fetch_func_sync(target, *args, **kwargs):
+        checksum = fetch_func(target=target, *args, **kwargs)
+        if CONF.libvirt.checksum_base_images and checksum:
+            imagecache.write_stored_info(target, field='sha1',
+                                         value=checksum)
+    return fetch_func_sync
+
+
+def cache_base_image(fetch_func, filename, *args, **kwargs):
+    """Creates a base image without creating an instance disk from it.
+
+    Used to fill the image cache ahead of boot, under the same lock as
+    Image.cache().  The base image is recorded as pre-cached for the image
+    cache manager, whether it was fetched or already present.
+
+    :fetch_func: Function that creates the base image, like for
+                 Image.cache()
+    :filename: Name of the file in the image directory
+    :returns: Path of the base image
+    """
+    def fetch_if_missing(target, *args, **kwargs):
+        # Another request may have fetched the image while we waited for
+        # the lock.
+        if not os.path.exists(target):
+            return fetch_func(target=target, *args, **kwargs)
+
+    base = _get_base_path(filename)
+    if not os.path.exists(base):
+        lock_path = os.path.join(CONF.instances_path, 'locks')
+        fetch_func_sync = _synchronized_fetch(fetch_if_missing, filename,
+                                              lock_path)
+        fetch_func_sync(target=base, *args, **kwargs)
+    imagecache.write_stored_info(base, field='precached', value=True)
+    return base
+
+
 @six.add_metaclass(abc.ABCMeta)
 class Image(object):
 
@@ -173,19 +222,15 @@ class Image(object):
         Synchronizes on template fetching.
 
         :fetch_func: Function that creates the base image
-                     Should accept `target` argument.
+                     Should accept `target` argument.  May return the
+                     sha1 of the base image, which is then stored for
+                     the image cache manager.
         :filename: Name of the file in the image directory
         :size: Size of created image in bytes (optional)
         """
-        @utils.synchronized(filename, external=True, lock_path=self.lock_path)
-        def fetch_func_sync(target, *args, **kwargs):
-            fetch_func(target=target, *args, **kwargs)
-
-        base_dir = os.path.join(CONF.instances_path,
-                                CONF.image_cache_subdirectory_name)
-        if not os.path.exists(base_dir):
-            fileutils.ensure_tree(base_dir)
-        base = os.path.join(base_dir, filename)
+        fetch_func_sync = _synchronized_fetch(fetch_func, filename,
+                                              self.lock_path)
+        base = _get_base_path(filename)
 
         if not self.check_image_exists() or not os.path.exists(base):
             self.create_image(fetch_func_sync, base, size,
@@ -318,7 +363,7 @@ class Raw(Image):
         self.correct_format()
 
     def _get_driver_format(self):
-        data = images.qemu_img_info(self.path)
+        data = images.disk_info(self.path)
         return data.file_format or 'raw'
 
     def correct_format(self):
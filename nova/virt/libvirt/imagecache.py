@@ -66,6 +66,11 @@ imagecache_opts = [
                default=3600,
                help='How frequently to checksum base images',
                deprecated_group='DEFAULT'),
+    cfg.IntOpt('precached_image_ttl',
+               default=(24 * 3600),
+               help='Number of seconds during which images fetched ahead of '
+                    'boot by the cache_images aggregate action are kept as '
+                    'in use'),
     ]
 
 CONF = cfg.CONF
@@ -452,6 +457,14 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                           {'base_file': base_file,
                            'error': e})
 
+    def _is_precached(self, base_file):
+        """Check whether a base file was recently fetched ahead of boot."""
+        precached, timestamp = read_stored_info(base_file, field='precached',
+                                                timestamped=True)
+        if not precached or not timestamp:
+            return False
+        return time.time() - timestamp < CONF.libvirt.precached_image_ttl
+
     def _handle_base_image(self, img_id, base_file):
         """Handle the checks for a single base image."""
 
@@ -504,6 +517,13 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         if image_bad:
             self.corrupt_base_files.append(base_file)
 
+        if base_file and not image_in_use and self._is_precached(base_file):
+            LOG.info(_('image %(id)s at (%(base_file)s): pre-cached'),
+                     {'id': img_id,
+                      'base_file': base_file})
+            image_in_use = True
+            self.active_base_files.append(base_file)
+
         if base_file:
             if not image_in_use:
                 LOG.debug(_('image %(id)s at (%(base_file)s): image is not in '
@@ -542,8 +562,13 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             if backing_path not in self.active_base_files:
                 self.active_base_files.append(backing_path)
 
-        # Anything left is an unknown base image
+        # Anything left is an unknown base image, unless it was pre-cached
+        # for instances yet to be booted
         for img in self.unexplained_images:
+            if self._is_precached(img):
+                LOG.info(_('Pre-cached base file: %s'), img)
+                self.active_base_files.append(img)
+                continue
             LOG.warning(_('Unknown base file: %s'), img)
             self.removable_base_files.append(img)
 
@@ -181,7 +181,7 @@ def create_cow_image(backing_file, path, size=None):
     cow_opts = []
     if backing_file:
         cow_opts += ['backing_file=%s' % backing_file]
-        base_details = images.qemu_img_info(backing_file)
+        base_details = images.disk_info(backing_file)
     else:
         base_details = None
     # This doesn't seem to get inherited so force it to...
@@ -464,7 +464,7 @@ def get_disk_size(path):
     :returns: Size (in bytes) of the given disk image as it would be seen
               by a virtual machine.
     """
-    size = images.qemu_img_info(path).virtual_size
+    size = images.disk_info(path).virtual_size
     return int(size)
 
 
@@ -474,7 +474,7 @@ def get_disk_backing_file(path, basename=True):
     :param path: Path to the disk image
     :returns: a path to the image's backing store
     """
-    backing_file = images.qemu_img_info(path).backing_file
+    backing_file = images.disk_info(path).backing_file
     if backing_file and basename:
         backing_file = os.path.basename(backing_file)
 
@@ -625,7 +625,7 @@ def get_disk_type(path):
     elif path.startswith('rbd:'):
         return 'rbd'
 
-    return images.qemu_img_info(path).file_format
+    return images.disk_info(path).file_format
 
 
 def get_fs_info(path):
@@ -648,9 +648,12 @@ def get_fs_info(path):
 
 
 def fetch_image(context, target, image_id, user_id, project_id, max_size=0):
-    """Grab image."""
-    images.fetch_to_raw(context, image_id, target, user_id, project_id,
-                        max_size=max_size)
+    """Grab image.
+
+    Returns the sha1 of target, or None if unknown.
+    """
+    return images.fetch_to_raw(context, image_id, target, user_id,
+                               project_id, max_size=max_size)
 
 
 def get_instance_path(instance, forceold=False, relative=False):
@@ -1705,6 +1705,20 @@ def list_vms(session):
         yield vm_ref, vms[vm_ref]
 
 
+def list_nova_vms(session):
+    """List the VMs of nova instances, whatever their power state.
+
+    Unlike list_vms(), the VMs which are not resident on any host, like
+    halted and suspended VMs, are included.
+    """
+    vms = session.call_xenapi("VM.get_all_records_where",
+                              'field "is_control_domain"="false" and '
+                              'field "is_a_template"="false"')
+    for vm_ref, vm_rec in vms.iteritems():
+        if vm_rec['other_config'].get('nova_uuid'):
+            yield vm_ref, vm_rec
+
+
 def lookup_vm_vdis(session, vm_ref):
     """Look for the VDIs that are attached to the VM."""
     # Firstly we get the VBDs, then the VDIs.
@@ -209,6 +209,23 @@ class VMOps(object):
                 nova_uuids.append(nova_uuid)
         return nova_uuids
 
+    def get_power_states(self):
+        """Get the power states of the nova instances found on the
+        hypervisor, by instance uuid.
+        """
+        power_states = {}
+        for vm_ref, vm_rec in vm_utils.list_nova_vms(self._session):
+            nova_uuid = vm_rec['other_config']['nova_uuid']
+            # The VMs kept during a resize or a rescue have the uuid of the
+            # instance too, but not its power state.
+            name_label = vm_rec['name_label']
+            if (name_label.endswith('-orig') or
+                    name_label.endswith('-rescue')):
+                continue
+            power_states[nova_uuid] = vm_utils.XENAPI_POWER_STATE[
+                    vm_rec['power_state']]
+        return power_states
+
     def confirm_migration(self, migration, instance, network_info):
         self._destroy_orig_vm(instance, network_info)
 
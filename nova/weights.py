@@ -22,6 +22,7 @@ import abc
 import six
 
 from nova import loadables
+from nova import profiler
 
 
 def normalize(weight_list, minval=None, maxval=None):
@@ -129,8 +130,11 @@ class BaseWeightHandler(loadables.BaseLoader):
             return []
 
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
+        sample = profiler.sample('weigher')
         for weigher_cls in weigher_classes:
             weigher = weigher_cls()
+            if sample:
+                sample.start(weigher_cls.__name__, len(weighed_objs))
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
             # Normalize the weights
@@ -141,5 +145,7 @@ class BaseWeightHandler(loadables.BaseLoader):
             for i, weight in enumerate(weights):
                 obj = weighed_objs[i]
                 obj.weight += weigher.weight_multiplier() * weight
+            if sample:
+                sample.stop(len(weighed_objs))
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
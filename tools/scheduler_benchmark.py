@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the scheduler drivers against a synthetic cloud.
+
+A database, an in-memory sqlite one by default, is filled with compute
+nodes, availability zones, host aggregates, instance groups and PCI device
+pools, then select_destinations() of the FilterScheduler or of the
+CachingScheduler is called for a mix of requests.  The throughput, the
+latency percentiles and the number of database queries per request are
+reported, so that regressions in the host manager, filters and weighers
+show up before they reach a deployment.
+
+Any nova option can be set in a configuration file passed with
+--config-file, e.g. scheduler_default_filters or the [database]
+connection.  Run like:
+
+    ./tools/with_venv.sh python tools/scheduler_benchmark.py \\
+        --hosts 10000 --requests 500 --driver caching \\
+        --request_mix small:6,large:3,pci:1 --profile
+"""
+
+from __future__ import print_function
+
+import random
+import sys
+import time
+import uuid
+
+from oslo.config import cfg
+from oslo.messaging import conffixture as messaging_conffixture
+from sqlalchemy.engine import Engine
+from sqlalchemy import event
+
+from nova import context
+from nova.db import migration
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import models
+from nova import exception
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
+from nova import profiler
+from nova import rpc
+from nova.scheduler import caching_scheduler
+from nova.scheduler import filter_scheduler
+
+CONF = cfg.CONF
+CONF.import_opt('service_down_time', 'nova.service')
+
+benchmark_opts = [
+    cfg.StrOpt('driver',
+               default='filter',
+               help='Scheduler driver to benchmark: "filter" or "caching"'),
+    cfg.IntOpt('hosts',
+               default=10000,
+               help='Number of compute nodes'),
+    cfg.IntOpt('availability_zones',
+               default=4,
+               help='Number of availability zones the hosts are spread in'),
+    cfg.IntOpt('aggregates',
+               default=20,
+               help='Number of host aggregates with metadata, in addition '
+                    'to the availability zones'),
+    cfg.IntOpt('aggregate_size',
+               default=500,
+               help='Number of hosts in each host aggregate'),
+    cfg.FloatOpt('pci_host_ratio',
+                 default=0.1,
+                 help='Fraction of the hosts with PCI devices'),
+    cfg.IntOpt('instance_groups',
+               default=50,
+               help='Number of instance groups'),
+    cfg.IntOpt('group_size',
+               default=10,
+               help='Number of instances already in each instance group'),
+    cfg.IntOpt('requests',
+               default=1000,
+               help='Number of scheduling requests'),
+    cfg.IntOpt('instances_per_request',
+               default=1,
+               help='Number of instances in each request'),
+    cfg.DictOpt('request_mix',
+                default={'small': '6', 'medium': '3', 'large': '1'},
+                help='Relative frequency of each flavor in the requests. '
+                     'The flavors are tiny, small, medium, large, xlarge '
+                     'and pci'),
+    cfg.FloatOpt('group_request_ratio',
+                 default=0.0,
+                 help='Fraction of the requests for an instance group. The '
+                      'group filters need to be enabled for them to have '
+                      'an effect.'),
+    cfg.ListOpt('filters',
+                help='Filters to use instead of scheduler_default_filters'),
+    cfg.ListOpt('weighers',
+                help='Weighers to use instead of scheduler_weight_classes'),
+    cfg.BoolOpt('profile',
+                default=False,
+                help='Show the time spent in each filter and weigher'),
+    cfg.IntOpt('seed',
+               default=0,
+               help='Seed of the random generator'),
+]
+
+FLAVORS = {
+    'tiny': dict(memory_mb=512, vcpus=1, root_gb=1, ephemeral_gb=0),
+    'small': dict(memory_mb=2048, vcpus=1, root_gb=20, ephemeral_gb=0),
+    'medium': dict(memory_mb=4096, vcpus=2, root_gb=40, ephemeral_gb=0),
+    'large': dict(memory_mb=8192, vcpus=4, root_gb=80, ephemeral_gb=0),
+    'xlarge': dict(memory_mb=16384, vcpus=8, root_gb=160, ephemeral_gb=0),
+    'pci': dict(memory_mb=4096, vcpus=2, root_gb=40, ephemeral_gb=0,
+                extra_specs={'pci_passthrough:alias': 'bench_nic:1'}),
+}
+
+PCI_ALIAS = {'name': 'bench_nic', 'vendor_id': '8086', 'product_id': '10fb'}
+
+PROJECTS = ['bench-project-%d' % i for i in range(20)]
+
+_db_queries = [0]
+
+
+def _count_query(conn, cursor, statement, parameters, context,
+                 executemany):
+    _db_queries[0] += 1
+
+
+def _percentile(sorted_values, percent):
+    index = int(round((len(sorted_values) - 1) * percent / 100.0))
+    return sorted_values[index]
+
+
+def _base_row(now):
+    return {'created_at': now, 'updated_at': now, 'deleted': 0}
+
+
+def _insert(engine, model, rows):
+    if rows:
+        engine.execute(model.__table__.insert(), rows)
+
+
+def build_cloud(engine):
+    """Fill the database with the synthetic cloud.
+
+    Returns the uuids of the instance groups.
+    """
+    now = timeutils.utcnow()
+    hosts = ['bench-host-%05d' % i for i in range(CONF.hosts)]
+
+    services = []
+    compute_nodes = []
+    for i, host in enumerate(hosts):
+        service = _base_row(now)
+        service.update(id=i + 1, host=host, binary='nova-compute',
+                       topic='compute', report_count=1, disabled=False)
+        services.append(service)
+
+        vcpus = random.choice([16, 24, 32, 48])
+        memory_mb = random.choice([65536, 131072, 262144])
+        local_gb = random.choice([500, 1000, 2000])
+        usage = random.random() * 0.8
+        num_instances = int(vcpus * usage)
+        compute = _base_row(now)
+        compute.update(
+                id=i + 1, service_id=i + 1,
+                vcpus=vcpus, vcpus_used=int(vcpus * usage),
+                memory_mb=memory_mb, memory_mb_used=int(memory_mb * usage),
+                local_gb=local_gb, local_gb_used=int(local_gb * usage),
+                free_ram_mb=memory_mb - int(memory_mb * usage),
+                free_disk_gb=local_gb - int(local_gb * usage),
+                disk_available_least=local_gb - int(local_gb * usage),
+                current_workload=random.randint(0, 4),
+                running_vms=num_instances,
+                hypervisor_type='QEMU', hypervisor_version=1005003,
+                hypervisor_hostname=host, cpu_info='{}',
+                host_ip='10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255),
+                supported_instances=jsonutils.dumps(
+                        [['x86_64', 'qemu', 'hvm']]),
+                stats=jsonutils.dumps(
+                        {'num_instances': num_instances,
+                         'io_workload': random.randint(0, 4)}),
+                pci_stats=None)
+        if random.random() < CONF.pci_host_ratio:
+            pool = dict(PCI_ALIAS, extra_info={},
+                        count=random.randint(1, 8))
+            del pool['name']
+            compute['pci_stats'] = jsonutils.dumps([pool])
+        compute_nodes.append(compute)
+    _insert(engine, models.Service, services)
+    _insert(engine, models.ComputeNode, compute_nodes)
+
+    aggregates = []
+    aggregate_hosts = []
+    aggregate_metadata = []
+    num_zones = CONF.availability_zones
+    for i in range(num_zones):
+        aggregate = _base_row(now)
+        aggregate.update(id=i + 1, name='bench-az-%d' % i)
+        aggregates.append(aggregate)
+        metadata = _base_row(now)
+        metadata.update(aggregate_id=i + 1, key='availability_zone',
+                        value='bench-az-%d' % i)
+        aggregate_metadata.append(metadata)
+    for i, host in enumerate(hosts):
+        if num_zones:
+            aggregate_host = _base_row(now)
+            aggregate_host.update(aggregate_id=i % num_zones + 1, host=host)
+            aggregate_hosts.append(aggregate_host)
+    for i in range(CONF.aggregates):
+        aggregate_id = num_zones + i + 1
+        aggregate = _base_row(now)
+        aggregate.update(id=aggregate_id, name='bench-aggregate-%d' % i)
+        aggregates.append(aggregate)
+        for key, value in (('bench_key_%d' % i, 'true'),
+                           ('cpu_allocation_ratio',
+                            random.choice(['4.0', '8.0', '16.0'])),
+                           ('ram_allocation_ratio',
+                            random.choice(['1.0', '1.5']))):
+            metadata = _base_row(now)
+            metadata.update(aggregate_id=aggregate_id, key=key, value=value)
+            aggregate_metadata.append(metadata)
+        size = min(CONF.aggregate_size, len(hosts))
+        for host in random.sample(hosts, size):
+            aggregate_host = _base_row(now)
+            aggregate_host.update(aggregate_id=aggregate_id, host=host)
+            aggregate_hosts.append(aggregate_host)
+    _insert(engine, models.Aggregate, aggregates)
+    _insert(engine, models.AggregateHost, aggregate_hosts)
+    _insert(engine, models.AggregateMetadata, aggregate_metadata)
+
+    groups = []
+    group_policies = []
+    group_members = []
+    instances = []
+    for i in range(CONF.instance_groups):
+        group_uuid = str(uuid.uuid4())
+        project_id = random.choice(PROJECTS)
+        group = _base_row(now)
+        group.update(id=i + 1, uuid=group_uuid, name='bench-group-%d' % i,
+                     user_id='bench-user', project_id=project_id)
+        groups.append(group)
+        policy = _base_row(now)
+        policy.update(group_id=i + 1,
+                      policy=random.choice(['affinity', 'anti-affinity']))
+        group_policies.append(policy)
+        for host in random.sample(hosts, min(CONF.group_size,
+                                             len(hosts))):
+            instance_uuid = str(uuid.uuid4())
+            instance = _base_row(now)
+            instance.update(uuid=instance_uuid, host=host, node=host,
+                            project_id=project_id, user_id='bench-user',
+                            vm_state='active')
+            instances.append(instance)
+            member = _base_row(now)
+            member.update(group_id=i + 1, instance_id=instance_uuid)
+            group_members.append(member)
+    _insert(engine, models.InstanceGroup, groups)
+    _insert(engine, models.InstanceGroupPolicy, group_policies)
+    _insert(engine, models.Instance, instances)
+    _insert(engine, models.InstanceGroupMember, group_members)
+    return [group['uuid'] for group in groups]
+
+
+def build_requests(group_uuids):
+    """Return a list of (request_spec, filter_properties) to schedule."""
+    mix = []
+    for name, weight in CONF.request_mix.items():
+        if name not in FLAVORS:
+            raise exception.NovaException('Unknown flavor %s' % name)
+        mix.extend([name] * int(weight))
+
+    requests = []
+    for i in range(CONF.requests):
+        name = random.choice(mix)
+        instance_type = dict(FLAVORS[name], name=name,
+                             flavorid=name, swap=0)
+        instance_type.setdefault('extra_specs', {})
+        num_instances = CONF.instances_per_request
+        instance_uuids = [str(uuid.uuid4()) for n in range(num_instances)]
+        instance_properties = dict(FLAVORS[name],
+                                   project_id=random.choice(PROJECTS),
+                                   os_type='linux',
+                                   vm_state='building',
+                                   task_state='scheduling',
+                                   availability_zone=None)
+        if 'extra_specs' in instance_properties:
+            del instance_properties['extra_specs']
+            pci_requests = [{'count': 1, 'alias_name': PCI_ALIAS['name'],
+                             'spec': [{'vendor_id': PCI_ALIAS['vendor_id'],
+                                       'product_id':
+                                           PCI_ALIAS['product_id']}]}]
+            instance_properties['system_metadata'] = {
+                    'pci_requests': jsonutils.dumps(pci_requests)}
+        if CONF.availability_zones and random.random() < 0.5:
+            instance_properties['availability_zone'] = 'bench-az-%d' % (
+                    random.randrange(CONF.availability_zones))
+        request_spec = {'instance_properties': instance_properties,
+                        'instance_type': instance_type,
+                        'image': {'properties': {}},
+                        'num_instances': num_instances,
+                        'instance_uuids': instance_uuids}
+        scheduler_hints = {}
+        if group_uuids and random.random() < CONF.group_request_ratio:
+            scheduler_hints['group'] = random.choice(group_uuids)
+        filter_properties = {'scheduler_hints': scheduler_hints}
+        requests.append((request_spec, filter_properties))
+    return requests
+
+
+def print_profile():
+    stats = profiler.get_stats()
+    print_format = "%-8s %-36s %-8s %-10s %-10s %-10s %-10s"
+    print(print_format % ('Kind', 'Name', 'Runs', 'Avg_ms', 'Avg_In',
+                          'Avg_Out', 'Avg_DB'))
+    for kind in sorted(stats):
+        for name, stat in sorted(stats[kind].items()):
+            count = float(stat['count'])
+            print(print_format % (
+                    kind, name, stat['count'],
+                    '%.3f' % (stat['total_time'] * 1000 / count),
+                    '%.1f' % (stat['objs_in'] / count),
+                    '%.1f' % (stat['objs_out'] / count),
+                    '%.2f' % (stat['db_queries'] / count)))
+
+
+def run(scheduler, requests):
+    ctxt = context.get_admin_context()
+    if CONF.driver == 'caching':
+        start = time.time()
+        scheduler.run_periodic_tasks(ctxt)
+        print('Cache loaded in %.3fs' % (time.time() - start))
+
+    latencies = []
+    failures = 0
+    _db_queries[0] = 0
+    start = time.time()
+    for request_spec, filter_properties in requests:
+        request_start = time.time()
+        try:
+            scheduler.select_destinations(ctxt, request_spec,
+                                          filter_properties)
+        except exception.NoValidHost:
+            failures += 1
+        latencies.append(time.time() - request_start)
+    elapsed = time.time() - start
+
+    latencies.sort()
+    print('Requests:         %d (%d without a valid host)' % (
+            len(requests), failures))
+    print('Requests/sec:     %.2f' % (len(requests) / elapsed))
+    print('Latency p50:      %.2fms' % (_percentile(latencies, 50) * 1000))
+    print('Latency p99:      %.2fms' % (_percentile(latencies, 99) * 1000))
+    print('Latency max:      %.2fms' % (latencies[-1] * 1000))
+    print('DB queries/req:   %.2f' % (float(_db_queries[0]) / len(requests)))
+
+
+def main():
+    CONF.register_cli_opts(benchmark_opts)
+    CONF.set_default('connection', 'sqlite://', group='database')
+    CONF.set_default('sqlite_synchronous', False, group='database')
+    messaging_conf = messaging_conffixture.ConfFixture(CONF)
+    messaging_conf.setUp()
+    messaging_conf.transport_driver = 'fake'
+    CONF(sys.argv[1:], project='nova', default_config_files=[])
+    rpc.init(CONF)
+
+    # The synthetic services never report, keep them up for the whole run
+    CONF.set_override('service_down_time', 24 * 3600)
+    CONF.set_override('pci_alias', [jsonutils.dumps(PCI_ALIAS)])
+    if CONF.filters is not None:
+        CONF.set_override('scheduler_default_filters', CONF.filters)
+    if CONF.weighers is not None:
+        CONF.set_override('scheduler_weight_classes', CONF.weighers)
+    if CONF.profile:
+        CONF.set_override('filter_profiling_sample_rate', 1.0)
+
+    if CONF.driver == 'filter':
+        scheduler_cls = filter_scheduler.FilterScheduler
+    elif CONF.driver == 'caching':
+        scheduler_cls = caching_scheduler.CachingScheduler
+    else:
+        print('Unknown driver %s' % CONF.driver)
+        return 1
+
+    random.seed(CONF.seed)
+    start = time.time()
+    migration.db_sync()
+    engine = sqlalchemy_api.get_engine()
+    group_uuids = build_cloud(engine)
+    requests = build_requests(group_uuids)
+    print('Built a cloud of %d hosts in %.3fs' % (CONF.hosts,
+                                                   time.time() - start))
+
+    event.listen(Engine, 'before_cursor_execute', _count_query)
+    run(scheduler_cls(), requests)
+    if CONF.profile:
+        print_profile()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())